@@ -1,9 +1,20 @@
 import google.generativeai as genai
 import os
 import json
-import tempfile
+import shutil
 import time
+import wave
+from typing import List, Optional
 from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError
+from profiling import timed_ai
+from metrics import track_ai, AI_CALLS
+from tracing import span, traced
+from model_images import prepare_for_model, prepare_many
+from ai_client import AIClient, AIUnavailable
+from model_backends import GeminiBackend, StubBackend
+from file_reaper import scratch_path, discard, schedule_delete, UPLOAD_PREFIX
+from vad import trim_samples, NoSpeechDetected
 
 try:
     from PIL import Image
@@ -13,11 +24,24 @@ except ImportError:
 load_dotenv()
 
 api_key = os.getenv('GEMINI_API_KEY')
-if api_key:
-    genai.configure(api_key=api_key)
+api_endpoint = os.getenv('GEMINI_API_ENDPOINT')
+AI_BACKEND = os.getenv('AI_BACKEND', 'gemini')
+if AI_BACKEND == 'stub':
+    # Local deterministic answers with simulated latency and faults (model_backends.py)
+    model = StubBackend.from_env()
+    client = AIClient(model)
+    print('[INFO] AI_BACKEND=stub: AI features use the local stub model.')
+elif api_key:
+    if api_endpoint:
+        genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': api_endpoint})
+    else:
+        genai.configure(api_key=api_key)
     model = genai.GenerativeModel('gemini-2.5-flash')
+    # Every Gemini call goes through this: concurrency cap, timeouts, retries, circuit breaker
+    client = AIClient(GeminiBackend(model, genai))
 else:
     model = None
+    client = None
     print('[WARNING] GEMINI_API_KEY not set. AI features will return fallback responses.')
 
 # Language code map for langdetect (ISO 639-1)
@@ -33,49 +57,92 @@ LANG_ISO = {
 }
 
 
-def _preprocess_audio(audio_file_path: str) -> str:
+def _decode_audio(audio_file_path: str):
     """
-    Load audio with librosa → convert to mono 16 kHz WAV → normalize.
-    Returns path to the processed WAV file (caller must delete it).
-    Browser WebM/Opus recordings are handled via pydub + ffmpeg if available,
-    with a plain-copy fallback so Gemini can still attempt transcription.
+    Decode a recording to mono float samples at its own rate, untrimmed and
+    unnormalised: (samples, rate), or None if nothing here can decode it.
+    16-bit WAVs are read directly. Browser WebM/Opus recordings go through
+    librosa, then pydub + ffmpeg if available.
     """
     import numpy as np
-    import soundfile as sf
-    import librosa
-
-    out_tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    out_path = out_tmp.name
-    out_tmp.close()
 
+    try:
+        with wave.open(audio_file_path, 'rb') as w:
+            if w.getsampwidth() == 2:
+                pcm = np.frombuffer(w.readframes(w.getnframes()), dtype='<i2')
+                samples = pcm.reshape(-1, w.getnchannels()).mean(axis=1) / 32768.0
+                return samples.astype(np.float32), w.getframerate()
+    except (wave.Error, EOFError):
+        pass
     try:
         # librosa.load handles wav/flac/ogg/mp3; webm needs ffmpeg via audioread
-        y, sr = librosa.load(audio_file_path, sr=16000, mono=True, res_type='soxr_hq')
+        import librosa
+        return librosa.load(audio_file_path, sr=None, mono=True)
+    except Exception:
+        pass
+    try:
+        from pydub import AudioSegment
+        audio = AudioSegment.from_file(audio_file_path).set_channels(1).set_sample_width(2)
+        return np.frombuffer(audio.raw_data, dtype='<i2').astype(np.float32) / 32768.0, audio.frame_rate
+    except Exception:
+        return None
 
-        # Remove silence from start/end
-        y, _ = librosa.effects.trim(y, top_db=20)
 
-        # Normalize to [-1, 1]
-        max_val = np.max(np.abs(y))
-        if max_val > 0:
-            y = y / max_val * 0.95
+@traced('ai.preprocess_audio')
+def _preprocess_audio(samples, rate: int) -> str:
+    """
+    Resample decoded audio to 16 kHz → normalize → write a 16-bit WAV.
+    Returns path to the processed WAV file (caller must delete it).
+    Without librosa the audio keeps its own rate; Gemini accepts any.
+    """
+    import numpy as np
 
-        sf.write(out_path, y, 16000, subtype='PCM_16')
-        return out_path
+    # In the managed scratch directory, so a crash mid-request leaves nothing behind for long
+    out_path = scratch_path('.wav')
 
-    except Exception as librosa_err:
-        # Fallback: try pydub (needs ffmpeg) to convert to wav
+    if rate != 16000:
         try:
-            from pydub import AudioSegment
-            audio = AudioSegment.from_file(audio_file_path)
-            audio = audio.set_channels(1).set_frame_rate(16000)
-            audio.export(out_path, format='wav')
-            return out_path
-        except Exception as pydub_err:
-            # Last resort: just copy the file and let Gemini try
-            import shutil
-            shutil.copy2(audio_file_path, out_path)
-            return out_path
+            import librosa
+            samples = librosa.resample(samples, orig_sr=rate, target_sr=16000, res_type='soxr_hq')
+            rate = 16000
+        except ImportError:
+            pass
+
+    # Normalize to [-1, 1]
+    max_val = np.max(np.abs(samples)) if len(samples) else 0
+    if max_val > 0:
+        samples = samples / max_val * 0.95
+
+    with wave.open(out_path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((samples * 32767).astype('<i2').tobytes())
+    return out_path
+
+
+UNAVAILABLE_MESSAGE = 'AI service unavailable. Please set GEMINI_API_KEY.'
+OUTAGE_MESSAGE = 'AI service unavailable. Please try again later.'
+
+
+def _profile_fallback(transcript: str) -> dict:
+    return {
+        'skill_type': 'Other',
+        'experience_years': 0,
+        'work_areas': [],
+        'specializations': [],
+        'daily_rate': None,
+        'bio_english': transcript[:200]
+    }
+
+
+def _complaint_fallback(description: str) -> dict:
+    return {
+        'issue_type': 'other',
+        'confidence_score': 0.5,
+        'suggested_worker_skill': 'General',
+        'description_for_worker': description
+    }
 
 
 def _detect_language(text: str) -> dict:
@@ -95,72 +162,118 @@ def _detect_language(text: str) -> dict:
         return {'detected_code': 'unknown', 'probabilities': {}}
 
 
-def voice_to_text(audio_file_path: str, language: str) -> str:
+def _upload_audio(audio_file_path: str, source: str):
     """
-    Full pipeline:
-      1. librosa  — preprocess audio (mono, 16 kHz, normalise, trim silence)
-      2. Gemini   — transcribe the cleaned WAV
-      3. langdetect — verify transcript language matches expected language
-    Returns the transcribed text string.
+    Preprocess and upload a recording; returns the Gemini file once it is
+    ACTIVE. Raises NoSpeechDetected, before any upload, for silent clips.
+    The VAD runs on the decoded audio as recorded, so resampling and
+    normalisation are only paid for speech.
     """
-    if not model:
-        return 'AI service unavailable. Please set GEMINI_API_KEY.'
+    decoded = _decode_audio(audio_file_path)
+    if decoded is None:
+        # Last resort: send the file as it is and let Gemini try
+        processed_path = scratch_path(os.path.splitext(audio_file_path)[1])
+        shutil.copy2(audio_file_path, processed_path)
+    else:
+        samples, rate = decoded
+        with span('vad.trim'):
+            samples = trim_samples(samples, source, rate)
+        processed_path = _preprocess_audio(samples, rate)
+    try:
+        with span('gemini.upload_file'):
+            uploaded_file = client.upload_file(processed_path, display_name=UPLOAD_PREFIX + 'voice')
+    finally:
+        discard(processed_path)
 
-    processed_path = None
-    uploaded_file  = None
+    # Wait for file to be ACTIVE (may take a moment)
     try:
-        # ── Step 1: preprocess ───────────────────────────────────────────────
-        processed_path = _preprocess_audio(audio_file_path)
-
-        # ── Step 2: upload + transcribe via Gemini ───────────────────────────
-        uploaded_file = genai.upload_file(path=processed_path)
-
-        # Wait for file to be ACTIVE (may take a moment)
-        for _ in range(10):
-            status = genai.get_file(uploaded_file.name)
-            if status.state.name == 'ACTIVE':
-                break
-            time.sleep(1)
-
-        prompt = (
-            f'This audio recording is in {language}. '
-            f'Transcribe exactly what is spoken and translate it into clear English. '
-            f'Return ONLY the English translation. '
-            f'Do not include the original language text. Do not add any explanation.'
-        )
-        response = model.generate_content(
-            [uploaded_file, prompt],
+        with span('gemini.wait_file_active') as wait:
+            for attempt in range(10):
+                status = client.get_file(uploaded_file.name)
+                if status.state.name == 'ACTIVE':
+                    break
+                time.sleep(1)
+            if wait:
+                wait.set('polls', attempt + 1)
+    except Exception:
+        schedule_delete(uploaded_file.name)
+        raise
+    return uploaded_file
+
+
+def _transcribe_prompt(language: str) -> str:
+    return (
+        f'This audio recording is in {language}. '
+        f'Transcribe exactly what is spoken and translate it into clear English. '
+        f'Return ONLY the English translation. '
+        f'Do not include the original language text. Do not add any explanation.'
+    )
+
+
+def _transcribe(audio, language: str) -> str:
+    # audio is an uploaded Gemini file or an inline {'mime_type', 'data'} part
+    with span('gemini.generate_content', task='transcribe'):
+        response = client.generate_content(
+            [audio, _transcribe_prompt(language)],
             generation_config=genai.GenerationConfig(
                 response_mime_type='text/plain',
                 temperature=0.1,
             ),
         )
-        transcript = response.text.strip()
-        return transcript
+    return response.text.strip()
+
+
+@timed_ai
+@track_ai
+@traced('ai.voice_to_text')
+def voice_to_text(audio_file_path: str, language: str) -> str:
+    """
+    Full pipeline:
+      1. librosa  — preprocess audio (mono, 16 kHz, normalise, trim silence)
+      2. vad      — raise NoSpeechDetected for silent clips, cut the rest to speech
+      3. Gemini   — transcribe the cleaned WAV
+      4. langdetect — verify transcript language matches expected language
+    Returns the transcribed text string.
+    """
+    if not model:
+        return UNAVAILABLE_MESSAGE
 
+    uploaded_file = None
+    try:
+        uploaded_file = _upload_audio(audio_file_path, 'voice_to_text')
+        return _transcribe(uploaded_file, language)
+    except NoSpeechDetected:
+        raise
+    except AIUnavailable as e:
+        print(f'[WARNING] voice_to_text fell back: {e}')
+        return OUTAGE_MESSAGE
     except Exception as e:
         raise RuntimeError(f'voice_to_text failed: {str(e)}')
     finally:
-        # Clean up temp preprocessed file
-        if processed_path:
-            try:
-                os.unlink(processed_path)
-            except Exception:
-                pass
-        # Delete uploaded Gemini file to save quota
+        # Deleting the Gemini upload is a network round trip; the reaper does it off the request path
         if uploaded_file:
-            try:
-                genai.delete_file(uploaded_file.name)
-            except Exception:
-                pass
+            schedule_delete(uploaded_file.name)
+
+@timed_ai
+@track_ai
+@traced('ai.transcribe_segment')
+def transcribe_segment(wav: bytes, language: str) -> str:
+    """
+    Transcribe one short WAV clip from a streamed answer
+    (streaming_transcription.py). The clip goes inline with the request, so
+    there is no Files API upload, polling or cleanup. AIUnavailable is
+    raised to the caller, which reports it on the stream.
+    """
+    if not model:
+        raise AIUnavailable(UNAVAILABLE_MESSAGE)
+    return _transcribe({'mime_type': 'audio/wav', 'data': wav}, language)
 
+@timed_ai
+@track_ai
+@traced('ai.extract_profile')
 def extract_profile(transcript: str, language: str) -> dict:
     if not model:
-        return {
-            'skill_type': 'Other', 'experience_years': 0,
-            'work_areas': [], 'specializations': [],
-            'daily_rate': None, 'bio_english': transcript[:200]
-        }
+        return _profile_fallback(transcript)
     try:
         prompt = f'''From this voice transcript of an Indian informal worker, extract and return a JSON object with these exact keys:
 "skill_type" (string: Plumber/Electrician/Carpenter/Mason/Painter/Welder/Other),
@@ -170,7 +283,7 @@ def extract_profile(transcript: str, language: str) -> dict:
 "daily_rate" (integer or null),
 "bio_english" (2 professional sentences in English about the worker).
 Transcript: {transcript}'''
-        response = model.generate_content(
+        response = client.generate_content(
             prompt,
             generation_config=genai.GenerationConfig(
                 response_mime_type='application/json',
@@ -180,33 +293,126 @@ Transcript: {transcript}'''
         return json.loads(response.text)
     except json.JSONDecodeError:
         # Return safe defaults if JSON parse fails
-        return {
-            'skill_type': 'Other',
-            'experience_years': 0,
-            'work_areas': [],
-            'specializations': [],
-            'daily_rate': None,
-            'bio_english': transcript[:200]
-        }
+        return _profile_fallback(transcript)
+    except AIUnavailable as e:
+        print(f'[WARNING] extract_profile fell back: {e}')
+        return _profile_fallback(transcript)
     except Exception as e:
         raise RuntimeError(f'extract_profile failed: {str(e)}')
 
+# ── Voice bio in one call ────────────────────────────────────────────────────
+
+VOICE_PROFILE_MODE = os.getenv('VOICE_PROFILE_MODE', 'fused')
+
+
+class WorkerProfile(BaseModel):
+    skill_type: str = 'Other'
+    experience_years: Optional[int] = 0
+    work_areas: List[str] = []
+    specializations: List[str] = []
+    daily_rate: Optional[int] = None
+    bio_english: str = ''
+
+
+class VoiceProfile(BaseModel):
+    transcript: str
+    profile: WorkerProfile
+
+
+# The same shape as a Gemini response_schema, so the model is constrained to it
+VOICE_PROFILE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'transcript': {'type': 'string'},
+        'profile': {
+            'type': 'object',
+            'properties': {
+                'skill_type': {'type': 'string'},
+                'experience_years': {'type': 'integer'},
+                'work_areas': {'type': 'array', 'items': {'type': 'string'}},
+                'specializations': {'type': 'array', 'items': {'type': 'string'}},
+                'daily_rate': {'type': 'integer', 'nullable': True},
+                'bio_english': {'type': 'string'},
+            },
+            'required': ['skill_type', 'experience_years', 'work_areas', 'specializations', 'bio_english'],
+        },
+    },
+    'required': ['transcript', 'profile'],
+}
+
+
+@timed_ai
+@track_ai
+@traced('ai.voice_to_profile')
+def voice_to_profile(audio_file_path: str, language: str) -> dict:
+    """
+    Transcript and worker profile from one voice bio: {'transcript', 'profile'}.
+
+    With VOICE_PROFILE_MODE=fused (the default) the model returns both in a
+    single structured-output call instead of voice_to_text followed by
+    extract_profile. A reply that does not validate against VoiceProfile
+    falls back to those two steps, reusing the file already uploaded.
+    """
+    if not model or VOICE_PROFILE_MODE != 'fused':
+        transcript = voice_to_text(audio_file_path, language)
+        return {'transcript': transcript, 'profile': extract_profile(transcript, language)}
+
+    uploaded_file = None
+    try:
+        uploaded_file = _upload_audio(audio_file_path, 'voice_to_profile')
+        prompt = f'''This audio recording is an Indian informal worker describing their work, in {language}.
+Return a JSON object with these exact keys:
+"transcript" (what is spoken, translated into clear English; the English translation only),
+"profile" (an object with these exact keys, taken from what is spoken:
+  "skill_type" (string: Plumber/Electrician/Carpenter/Mason/Painter/Welder/Other),
+  "experience_years" (integer),
+  "work_areas" (list of strings),
+  "specializations" (list of strings),
+  "daily_rate" (integer or null),
+  "bio_english" (2 professional sentences in English about the worker)).'''
+        with span('gemini.generate_content', task='transcribe_and_extract'):
+            response = client.generate_content(
+                [uploaded_file, prompt],
+                generation_config=genai.GenerationConfig(
+                    response_mime_type='application/json',
+                    response_schema=VOICE_PROFILE_SCHEMA,
+                    temperature=0.1,
+                ),
+            )
+        try:
+            result = VoiceProfile.model_validate_json(response.text)
+            return {'transcript': result.transcript.strip(), 'profile': result.profile.model_dump()}
+        except ValidationError as e:
+            print(f'[WARNING] voice_to_profile reply did not validate, using two calls: {e.error_count()} errors')
+            AI_CALLS.inc('voice_to_profile', 'two_step_fallback')
+        transcript = _transcribe(uploaded_file, language)
+        return {'transcript': transcript, 'profile': extract_profile(transcript, language)}
+    except NoSpeechDetected:
+        raise
+    except AIUnavailable as e:
+        print(f'[WARNING] voice_to_profile fell back: {e}')
+        return {'transcript': OUTAGE_MESSAGE, 'profile': _profile_fallback(OUTAGE_MESSAGE)}
+    except Exception as e:
+        raise RuntimeError(f'voice_to_profile failed: {str(e)}')
+    finally:
+        if uploaded_file:
+            schedule_delete(uploaded_file.name)
+
+@timed_ai
+@track_ai
+@traced('ai.analyze_complaint_photo')
 def analyze_complaint_photo(image_path: str) -> dict:
     if not model or Image is None:
-        return {
-            'issue_type': 'other',
-            'confidence_score': 0.5,
-            'suggested_worker_skill': 'General',
-            'description_for_worker': 'AI service unavailable. Please set GEMINI_API_KEY.'
-        }
+        return _complaint_fallback(UNAVAILABLE_MESSAGE)
     try:
         prompt = '''Look at this home repair problem photo. Return a JSON object with these exact keys:
 "issue_type" (one of: plumbing_leak/pipe_burst/electrical_fault/wiring_issue/wall_crack/ceiling_damage/tile_broken/painting_needed/other),
 "confidence_score" (float 0-1),
 "suggested_worker_skill" (string),
 "description_for_worker" (one clear sentence describing the problem)'''
-        img = Image.open(image_path)
-        response = model.generate_content(
+        with span('ai.prepare_image'):
+            img = prepare_for_model(image_path)
+        response = client.generate_content(
             [img, prompt],
             generation_config=genai.GenerationConfig(
                 response_mime_type='application/json',
@@ -215,11 +421,62 @@ def analyze_complaint_photo(image_path: str) -> dict:
         )
         return json.loads(response.text)
     except json.JSONDecodeError:
-        return {
-            'issue_type': 'other',
-            'confidence_score': 0.5,
-            'suggested_worker_skill': 'General',
-            'description_for_worker': 'Home repair issue detected'
-        }
+        return _complaint_fallback('Home repair issue detected')
+    except AIUnavailable as e:
+        print(f'[WARNING] analyze_complaint_photo fell back: {e}')
+        return _complaint_fallback('Home repair issue detected')
+    except Exception as e:
+        raise RuntimeError(f'analyze_complaint_photo failed: {str(e)}')
+
+PHOTO_BATCH_PROMPTS = {
+    'portfolio': '''These are {n} photos from an Indian tradesperson's work portfolio, labelled Photo 1 to Photo {n}.
+Return a JSON array with exactly {n} objects, one per photo in the same order, each with these exact keys:
+"index" (the photo number),
+"tags" (3 to 6 short lowercase tags: the trade, the work shown, the room or place, materials; e.g. "plumbing", "bathroom", "pipe fitting")''',
+    'complaint': '''These are {n} home repair problem photos, labelled Photo 1 to Photo {n}.
+Return a JSON array with exactly {n} objects, one per photo in the same order, each with these exact keys:
+"index" (the photo number),
+"issue_type" (one of: plumbing_leak/pipe_burst/electrical_fault/wiring_issue/wall_crack/ceiling_damage/tile_broken/painting_needed/other),
+"confidence_score" (float 0-1),
+"suggested_worker_skill" (string),
+"description_for_worker" (one clear sentence describing the problem)''',
+}
+
+@timed_ai
+@track_ai
+@traced('ai.analyze_photo_batch')
+def analyze_photo_batch(image_paths: list, task: str) -> list:
+    """
+    Analyse several photos in one Gemini request; task is 'portfolio' or
+    'complaint'. Returns one dict per path, in order. The prompt and the
+    round trip are paid once per batch instead of once per photo.
+    """
+    if not model or Image is None:
+        raise RuntimeError(UNAVAILABLE_MESSAGE)
+    with span('ai.prepare_image', images=len(image_paths)):
+        images = prepare_many(image_paths)
+    parts = []
+    for i, image in enumerate(images, 1):
+        parts += [f'Photo {i}:', image]
+    parts.append(PHOTO_BATCH_PROMPTS[task].format(n=len(image_paths)))
+    try:
+        response = client.generate_content(
+            parts,
+            generation_config=genai.GenerationConfig(
+                response_mime_type='application/json',
+                temperature=0.1,
+            ),
+        )
+        results = json.loads(response.text)
+    except AIUnavailable:
+        # Raised as is: an outage is not the photos' fault, so their rows stay pending without using an attempt
+        raise
     except Exception as e:
-        raise RuntimeError(f'analyze_complaint_photo failed: {str(e)}')
\ No newline at end of file
+        raise RuntimeError(f'analyze_photo_batch failed: {str(e)}')
+    if not isinstance(results, list) or len(results) != len(image_paths):
+        raise RuntimeError(f'analyze_photo_batch: expected a list of {len(image_paths)} results')
+    # Trust the model's own numbering over its ordering when it gives one
+    by_index = {r.get('index'): r for r in results if isinstance(r, dict)}
+    if sorted(k for k in by_index if isinstance(k, int)) == list(range(1, len(image_paths) + 1)):
+        results = [by_index[i] for i in range(1, len(image_paths) + 1)]
+    return results
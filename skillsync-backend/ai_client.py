@@ -0,0 +1,207 @@
+"""
+One guarded path to the Gemini API.
+
+Every generate_content / upload_file / get_file / delete_file / list_files call
+in ai.py and file_reaper.py goes through AIClient.call() to a model backend (model_backends.py: the
+Gemini SDK, or a local stub). The client adds:
+
+- Bounded concurrency. At most AI_MAX_CONCURRENCY calls are in flight per
+  process. A caller waits up to AI_QUEUE_TIMEOUT seconds for a slot and is
+  then refused with AIBusy, so a slow model cannot pile up request threads
+  until the whole API stalls. A slot is held until the underlying call
+  really returns, not just until its caller gives up.
+- Per-call timeouts. generate_content also passes the timeout to the HTTP
+  request itself.
+- Retries. Up to AI_RETRIES retries for transient errors (429, 5xx,
+  timeouts, connection errors), with full-jitter exponential backoff.
+  Other errors (bad request, permission denied) are raised at once.
+- A circuit breaker. After AI_BREAKER_FAILURES consecutive transient
+  failures, calls fail immediately with AIUnavailable for
+  AI_BREAKER_RESET seconds. Then a single trial call decides whether to
+  close the circuit again. ai.py turns AIUnavailable into its existing
+  default responses, so users get the fallback at once instead of after
+  a timeout.
+- Metrics. skillsync_ai_client_calls_total{op,outcome},
+  skillsync_ai_client_call_duration_seconds{op},
+  skillsync_ai_client_slots_in_use and skillsync_ai_circuit_open.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dotenv import load_dotenv
+from metrics import AI_CLIENT_CALLS, AI_CLIENT_LATENCY, AI_CLIENT_SLOTS, AI_CIRCUIT_OPEN
+
+load_dotenv()
+
+MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '4'))
+QUEUE_TIMEOUT = float(os.getenv('AI_QUEUE_TIMEOUT', '2'))
+GENERATE_TIMEOUT = float(os.getenv('AI_TIMEOUT', '30'))
+FILE_TIMEOUT = float(os.getenv('AI_FILE_TIMEOUT', '60'))
+RETRIES = int(os.getenv('AI_RETRIES', '2'))
+BACKOFF_BASE = 0.5  # seconds; attempt n sleeps uniform(0, base * 2**n)
+BACKOFF_MAX = 4.0
+BREAKER_FAILURES = int(os.getenv('AI_BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('AI_BREAKER_RESET', '30'))
+
+TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class AIUnavailable(RuntimeError):
+    """The model cannot be used right now; callers should fall back."""
+
+
+class AIBusy(AIUnavailable):
+    """No free call slot within the queue timeout."""
+
+
+class AITimeout(AIUnavailable):
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, FutureTimeout, ConnectionError)):
+        return True
+    # google.api_core exceptions carry the HTTP status as .code
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in TRANSIENT_CODES
+    # requests / urllib3 connection problems surfacing from the REST transport
+    return type(error).__name__ in ('ConnectionError', 'ReadTimeout', 'ConnectTimeout', 'ProtocolError')
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def before_call(self):
+        """Raise AIUnavailable while open; let exactly one trial call through once the reset time has passed."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'open' or self.trial_running:
+                raise AIUnavailable('AI circuit open')
+            self.trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+        AI_CIRCUIT_OPEN.set(value=0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f'[WARNING] AI circuit opened after {self.failures} consecutive failures')
+                self.opened_at = time.monotonic()
+                self.trial_running = False
+        if self.opened_at is not None:
+            AI_CIRCUIT_OPEN.set(value=1)
+
+    def release_trial(self):
+        # A trial that ended in a non-transient error says nothing about availability
+        with self._lock:
+            self.trial_running = False
+
+
+class AIClient:
+    def __init__(self, backend, max_concurrency: int = MAX_CONCURRENCY,
+                 queue_timeout: float = QUEUE_TIMEOUT, retries: int = RETRIES,
+                 breaker: CircuitBreaker = None):
+        self.backend = backend
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ai-client')
+
+    # ── Gemini operations ────────────────────────────────────────────────────
+
+    def generate_content(self, contents, timeout: float = GENERATE_TIMEOUT, **kwargs):
+        # retry=None: the SDK's own retry of 503s would hide failures from the breaker and stack up delays
+        kwargs.setdefault('request_options', {'timeout': timeout, 'retry': None})
+        return self.call('generate_content', self.backend.generate_content, contents, timeout=timeout, **kwargs)
+
+    def upload_file(self, path: str, display_name: str = None, timeout: float = FILE_TIMEOUT):
+        return self.call('upload_file', self.backend.upload_file, path, display_name, timeout=timeout)
+
+    def get_file(self, name: str, timeout: float = FILE_TIMEOUT):
+        return self.call('get_file', self.backend.get_file, name, timeout=timeout)
+
+    def delete_file(self, name: str, timeout: float = FILE_TIMEOUT, retries: int = None):
+        return self.call('delete_file', self.backend.delete_file, name, timeout=timeout, retries=retries)
+
+    def list_files(self, timeout: float = FILE_TIMEOUT) -> list:
+        return self.call('list_files', self.backend.list_files, timeout=timeout)
+
+    # ── Guarded call ─────────────────────────────────────────────────────────
+
+    def _run(self, fn, args, kwargs, timeout: float):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise AIBusy(f'No AI call slot free within {self.queue_timeout}s')
+        AI_CLIENT_SLOTS.inc()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            AI_CLIENT_SLOTS.dec()
+            self._slots.release()
+            raise
+
+        def release(_):
+            AI_CLIENT_SLOTS.dec()
+            self._slots.release()
+        future.add_done_callback(release)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise AITimeout(f'AI call timed out after {timeout}s')
+
+    def call(self, op: str, fn, *args, timeout: float = GENERATE_TIMEOUT, retries: int = None, **kwargs):
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                self.breaker.before_call()
+            except AIUnavailable:
+                AI_CLIENT_CALLS.inc(op, 'circuit_open')
+                raise
+            started = time.perf_counter()
+            try:
+                result = self._run(fn, args, kwargs, timeout)
+            except AIBusy:
+                self.breaker.release_trial()
+                AI_CLIENT_CALLS.inc(op, 'rejected')
+                raise
+            except Exception as e:
+                AI_CLIENT_LATENCY.observe(op, value=time.perf_counter() - started)
+                if not is_transient(e):
+                    self.breaker.release_trial()
+                    AI_CLIENT_CALLS.inc(op, 'error')
+                    raise
+                self.breaker.record_failure()
+                AI_CLIENT_CALLS.inc(op, 'timeout' if isinstance(e, AITimeout) else 'transient')
+                if attempt == retries or self.breaker.state != 'closed':
+                    if isinstance(e, AIUnavailable):
+                        raise
+                    raise AIUnavailable(f'{op} failed after {attempt + 1} attempts: {e}') from e
+                time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+            else:
+                AI_CLIENT_LATENCY.observe(op, value=time.perf_counter() - started)
+                self.breaker.record_success()
+                AI_CLIENT_CALLS.inc(op, 'ok')
+                return result
@@ -0,0 +1,253 @@
+"""
+Opus renditions of voice bios.
+
+Voice bios used to be stored exactly as the browser sent them (WebM/Opus
+at 64-128 kbps from Chrome, AAC in MP4 from Safari) under a `.mp3` name,
+whatever the real format was. Uploads are now named by their sniffed
+container (audio_extension), and after the upload commits a small
+background pool transcodes each one with ffmpeg. The output is mono Opus
+in Ogg at VOICE_OPUS_KBPS (16 kbps by default, with the VoIP tuning for
+speech), roughly a sixth to a tenth of the size of a typical upload.
+
+The same ffmpeg pass decodes the audio to 16 kHz mono PCM, the format
+ai._preprocess_audio produces for Gemini. That PCM is used to measure
+duration, RMS loudness and peak level (in dBFS) without a second decode.
+The results go into the audio_renditions table, keyed by the source
+blob's sha256.
+
+The Opus file is itself a blob (blob_store.py), so it is deduplicated,
+served as immutable by media.py, and kept alive by its rendition row.
+With KEEP_ORIGINAL_AUDIO=1 (the default) the original stays on the
+worker and can be transcoded again later. With 0, the worker is
+repointed to the Opus file and the next blob GC deletes the original.
+The rendition row is then keyed by the Opus file's own sha256, so it
+outlives the original along with its duration and loudness. A voice bio
+that is already a rendition is never transcoded again.
+
+Without ffmpeg on PATH, uploads are kept as-is and nothing is queued.
+
+Run from the skillsync-backend directory:
+    python audio_transcode.py backfill    # transcode existing voice bios
+"""
+import argparse
+import hashlib
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from database import SessionLocal, dialect_insert
+from models import AudioRendition, Worker
+from blob_store import BLOB_ROOT, blob_sha, blob_path, add_ref, release
+from file_uploads import safe_extension
+
+load_dotenv()
+
+FFMPEG = shutil.which('ffmpeg')
+OPUS_KBPS = int(os.getenv('VOICE_OPUS_KBPS', '16'))
+KEEP_ORIGINAL_AUDIO = os.getenv('KEEP_ORIGINAL_AUDIO', '1') == '1'
+TRANSCODE_TIMEOUT = 120  # seconds; a 25 MB upload takes a few seconds
+PCM_RATE = 16000
+
+if FFMPEG is None:
+    print('[WARNING] ffmpeg not found - voice bios will be stored without an Opus rendition')
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv('AUDIO_TRANSCODE_WORKERS', '1')),
+                           thread_name_prefix='audio-transcode')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+# ── Format sniffing ──────────────────────────────────────────────────────────
+
+def sniff_audio_format(head: bytes):
+    """Container of an audio file from its first bytes, as a file extension, or None."""
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm'
+    if head.startswith(b'OggS'):
+        return 'ogg'
+    if head.startswith(b'RIFF') and head[8:12] == b'WAVE':
+        return 'wav'
+    if head.startswith(b'fLaC'):
+        return 'flac'
+    if head[4:8] == b'ftyp':
+        return 'm4a'
+    if head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+
+def audio_extension(upload, default: str = 'mp3') -> str:
+    """Extension for a stored audio upload: the sniffed container, else the client's filename."""
+    upload.file.seek(0)
+    head = upload.file.read(12)
+    upload.file.seek(0)
+    return sniff_audio_format(head) or safe_extension(upload.filename, default)
+
+
+# ── Transcoding ──────────────────────────────────────────────────────────────
+
+def pcm_stats(pcm: bytes, rate: int = PCM_RATE) -> dict:
+    """Duration, RMS loudness and peak (dBFS) of signed 16-bit mono PCM."""
+    samples = array('h')
+    samples.frombytes(pcm[:len(pcm) // 2 * 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    stats = {'duration_seconds': round(len(samples) / rate, 3), 'loudness_dbfs': None, 'peak_dbfs': None}
+    if not samples:
+        return stats
+    peak = max(max(samples), -min(samples))
+    rms = math.sqrt(sum(s * s for s in samples) / len(samples))
+    if peak:
+        stats['peak_dbfs'] = round(20 * math.log10(peak / 32768), 1)
+    if rms:
+        stats['loudness_dbfs'] = round(20 * math.log10(rms / 32768), 1)
+    return stats
+
+
+def transcode(source_path: str, out_path: str, kbps: int = OPUS_KBPS) -> dict:
+    """Write an Opus rendition of source_path to out_path and measure it, in a single ffmpeg run."""
+    cmd = [
+        FFMPEG, '-nostdin', '-v', 'error', '-y', '-i', source_path,
+        '-map', '0:a:0', '-ac', '1', '-c:a', 'libopus', '-b:a', f'{kbps}k',
+        '-application', 'voip', '-vbr', 'on', '-f', 'ogg', out_path,
+        '-map', '0:a:0', '-ac', '1', '-ar', str(PCM_RATE), '-f', 's16le', 'pipe:1',
+    ]
+    result = subprocess.run(cmd, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors='replace').strip()[-300:] or 'ffmpeg failed')
+    return pcm_stats(result.stdout)
+
+
+def generate_rendition(db: Session, source_path: str):
+    """Transcode one stored voice bio unless it already has a rendition; returns the AudioRendition."""
+    sha256 = blob_sha(source_path)
+    if FFMPEG is None or sha256 is None or not os.path.exists(source_path):
+        return None
+    existing = db.query(AudioRendition).filter(AudioRendition.source_sha256 == sha256).first()
+    if existing and os.path.exists(existing.path):
+        return existing
+    # Already a rendition (a voice bio repointed to its Opus file): transcoding it again only loses quality
+    own = db.query(AudioRendition).filter(AudioRendition.path == source_path).first()
+    if own:
+        return own
+
+    os.makedirs(BLOB_ROOT, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=BLOB_ROOT, prefix='.transcode-', suffix='.part')
+    os.close(fd)
+    try:
+        stats = transcode(source_path, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            opus_sha = hashlib.sha256(f.read()).hexdigest()
+        path = blob_path(opus_sha, 'opus')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    size = os.path.getsize(path)
+
+    add_ref(db, opus_sha, path, size)
+    repointed = [] if KEEP_ORIGINAL_AUDIO else db.query(Worker).filter(Worker.voice_bio_path == source_path).all()
+    # Once the original is dropped, the row is keyed by the Opus file itself, so GC of the original keeps it
+    key = opus_sha if repointed else sha256
+    row = dict(source_sha256=key, path=path, codec='opus', bitrate_kbps=OPUS_KBPS,
+               size=size, source_size=os.path.getsize(source_path), **stats)
+    insert = dialect_insert(db)
+    stmt = insert(AudioRendition.__table__).values(**row)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=['source_sha256'],
+        set_={c: getattr(stmt.excluded, c) for c in row if c != 'source_sha256'}
+    ))
+    for worker in repointed:
+        release(db, source_path)
+        add_ref(db, opus_sha, path, size)
+        worker.voice_bio_path = path
+    db.commit()
+    return db.query(AudioRendition).filter(AudioRendition.source_sha256 == key).first()
+
+
+def _transcode_in_background(source_path: str):
+    db = SessionLocal()
+    try:
+        rendition = generate_rendition(db, source_path)
+        if rendition:
+            print(f'[OK] Voice bio transcoded: {rendition.source_size:,} -> {rendition.size:,} bytes, '
+                  f'{rendition.duration_seconds:.1f}s, {rendition.loudness_dbfs} dBFS')
+    except Exception as e:
+        db.rollback()
+        print(f'[WARNING] Voice bio transcode failed for {source_path}: {e}')
+    finally:
+        db.close()
+        with _pending_lock:
+            _pending.discard(source_path)
+
+
+def schedule_transcode(paths: list) -> list:
+    """Queue Opus renditions for stored voice bios after their upload has committed; returns the futures."""
+    if FFMPEG is None:
+        return []
+    futures = []
+    for path in paths:
+        if blob_sha(path) is None:
+            continue
+        with _pending_lock:
+            if path in _pending:
+                continue
+            _pending.add(path)
+        futures.append(_pool.submit(_transcode_in_background, path))
+    return futures
+
+
+def playback_url(db: Session, path: str):
+    """URL clients should play for a voice bio: its Opus rendition once ready, else the upload."""
+    if not path:
+        return None
+    rendition = None
+    sha256 = blob_sha(path)
+    if sha256:
+        rendition = db.query(AudioRendition).filter(AudioRendition.source_sha256 == sha256).first()
+    return '/' + (rendition.path if rendition else path)
+
+
+def backfill(db: Session) -> dict:
+    stats = {'voice_bios': 0, 'transcoded': 0, 'bytes_before': 0, 'bytes_after': 0, 'failed': 0}
+    paths = sorted({p for (p,) in db.query(Worker.voice_bio_path).filter(Worker.voice_bio_path.isnot(None))})
+    for path in paths:
+        stats['voice_bios'] += 1
+        try:
+            rendition = generate_rendition(db, path)
+        except Exception as e:
+            db.rollback()
+            stats['failed'] += 1
+            print(f'[WARNING] {path}: {e}')
+            continue
+        if rendition:
+            stats['transcoded'] += 1
+            stats['bytes_before'] += rendition.source_size
+            stats['bytes_after'] += rendition.size
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Opus renditions of voice bios')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('backfill', help='transcode voice bios that have no rendition')
+    args = parser.parse_args()
+
+    if FFMPEG is None:
+        raise SystemExit('[ERROR] ffmpeg is required on PATH')
+    from database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        stats = backfill(db)
+    finally:
+        db.close()
+    print('Done. ' + ', '.join(f'{k}: {v:,}' for k, v in stats.items()))
@@ -1,21 +1,41 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import NamedTuple
 from jose import jwt, JWTError
-from fastapi import HTTPException, status
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import os
 import random
+import threading
+import time
+import otp_store
+from metrics import CACHE_REQUESTS, OTP_SENT
 
-OTP_STORE = {}
 JWT_SECRET = 'skillsync-hackathon-secret'
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRE_MINUTES = 60 * 24
+# Verified tokens kept in memory until they expire, so a client's repeat requests skip the decode and HMAC
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '4096'))
+
+_verified = OrderedDict()  # token -> (claims, exp as a timestamp), least recently used first
+_verified_lock = threading.Lock()
+bearer = HTTPBearer()
+
+
+class Principal(NamedTuple):
+    """The caller of a protected endpoint, as named by their token."""
+    id: str
+    role: str
 
 def send_otp(phone: str) -> bool:
     otp = str(random.randint(100000, 999999))
-    OTP_STORE[phone] = otp
+    otp_store.put('login', phone, otp)
+    OTP_SENT.inc('sms')
     print(f'[OTP] Phone: {phone} => OTP: {otp}')  # Visible in server logs
     return True
 
 def verify_otp(phone: str, otp: str) -> bool:
-    return OTP_STORE.get(phone) == otp
+    return otp_store.verify('login', phone, otp)
 
 def create_token(user_id: str, role: str) -> str:
     payload = {
@@ -26,16 +46,38 @@ def create_token(user_id: str, role: str) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def verify_token(token: str) -> dict:
+    now = time.time()
+    with _verified_lock:
+        cached = _verified.get(token)
+        if cached is not None and cached[1] > now:
+            _verified.move_to_end(token)
+            CACHE_REQUESTS.inc('jwt', 'hit')
+            return dict(cached[0])
+        _verified.pop(token, None)
+    CACHE_REQUESTS.inc('jwt', 'miss')
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Invalid or expired token'
         )
+    if isinstance(payload.get('exp'), (int, float)) and TOKEN_CACHE_SIZE > 0:
+        with _verified_lock:
+            _verified[token] = (payload, float(payload['exp']))
+            while len(_verified) > TOKEN_CACHE_SIZE:
+                _verified.popitem(last=False)
+    return dict(payload)
+
+async def current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer)) -> Principal:
+    """FastAPI dependency for protected endpoints: 401 without a valid bearer token.
+
+    Async so that it runs on the event loop; a cached check is cheaper than the hop to the threadpool.
+    """
+    payload = verify_token(credentials.credentials)
+    return Principal(id=payload['sub'], role=payload.get('role', ''))
 
-import hashlib, os
+import hashlib
 
 def hash_password(password: str) -> str:
     salt = os.urandom(16).hex()
@@ -0,0 +1,42 @@
+"""
+Shared fixtures for the micro-benchmarks: one in-memory database seeded
+with a small synthetic dataset, built once per session.
+"""
+import random
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from geocoding import load_gazetteer
+
+pytest.importorskip('pytest_benchmark')
+
+SEED_WORKERS = 2000
+SEED_CUSTOMERS = 200
+SEED_JOBS = 4000
+
+
+@pytest.fixture(scope='session')
+def session_factory():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+
+    from synthetic_data import generate
+    db = factory()
+    load_gazetteer(db)
+    generate(db, SEED_WORKERS, SEED_CUSTOMERS, SEED_JOBS, seed=7)
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def db(session_factory):
+    db = session_factory()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def rng():
+    return random.Random(7)
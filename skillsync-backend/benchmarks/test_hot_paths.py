@@ -0,0 +1,187 @@
+"""
+Micro-benchmarks for the hot paths: distance, trust scoring, worker search,
+JWT checks (decoded and cached) and password hashing, the IVR state machine, audio preprocessing, photo
+preparation for Gemini, the per-request cost of metrics recording and of
+the guarded AI client path (against the local stub model).
+Everything runs offline against an in-memory database.
+
+Needs pytest-benchmark (pip install pytest-benchmark). Run from the
+skillsync-backend directory:
+    python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:15%
+
+--benchmark-autosave writes a JSON baseline under .benchmarks/ named after
+the current commit; --benchmark-compare compares against the latest one
+(or pass a run number / id, e.g. --benchmark-compare=0003).
+"""
+import math
+import os
+import struct
+import wave
+from uuid import uuid4
+import pytest
+from starlette.requests import Request
+from models import Worker
+from distance import haversine
+from trust_score import calculate_trust_score, calculate_trust_scores
+import auth
+from auth import create_token, verify_token, hash_password, verify_password
+import otp_store
+import rate_limit
+from routers.workers import search_workers
+from routers.ivr import ivr_start, ivr_respond, IVRStart, IVRRespond
+
+KOZHIKODE = (11.2588, 75.7804)
+
+
+def test_haversine(benchmark, rng):
+    points = [(rng.uniform(8, 13), rng.uniform(74, 78)) for _ in range(1000)]
+
+    def run():
+        return [haversine(*KOZHIKODE, lat, lng) for lat, lng in points]
+
+    assert len(benchmark(run)) == 1000
+
+
+def test_calculate_trust_score(benchmark, db):
+    worker_id = db.query(Worker.id).order_by(Worker.trust_score.desc()).first()[0]
+    result = benchmark(calculate_trust_score, worker_id, db)
+    assert 0 <= result['total_score'] <= 100
+
+
+def test_calculate_trust_scores_batch(benchmark, db):
+    worker_ids = [wid for (wid,) in db.query(Worker.id).limit(500)]
+    results = benchmark(calculate_trust_scores, worker_ids, db, False)
+    assert len(results) == 500
+
+
+@pytest.mark.parametrize('radius_km', [10, 50])
+def test_search_by_distance(benchmark, db, radius_km):
+    def run():
+        return search_workers(lat=KOZHIKODE[0], lng=KOZHIKODE[1], skill='Plumber', skill_type=None,
+                              location=None, radius_km=radius_km, min_trust=0, limit=50, db=db)
+
+    assert benchmark(run)['workers']
+
+
+def test_search_by_area_name(benchmark, db):
+    def run():
+        return search_workers(lat=None, lng=None, skill=None, skill_type=None,
+                              location='calicut bch', radius_km=50, min_trust=0, limit=50, db=db)
+
+    assert benchmark(run)['total'] >= 0
+
+
+def test_create_token(benchmark):
+    assert benchmark(create_token, str(uuid4()), 'customer')
+
+
+@pytest.mark.parametrize('cache_size', [0, 4096], ids=['decoded', 'cached'])
+def test_verify_token(benchmark, monkeypatch, cache_size):
+    monkeypatch.setattr(auth, 'TOKEN_CACHE_SIZE', cache_size)
+    token = create_token('worker-1', 'worker')
+    assert benchmark(verify_token, token)['sub'] == 'worker-1'
+
+
+def test_hash_password(benchmark):
+    hashed = benchmark(hash_password, 'correct horse battery staple')
+    assert verify_password('correct horse battery staple', hashed)
+
+
+def test_ivr_full_session(benchmark, db, rng, session_factory, monkeypatch):
+    monkeypatch.setattr(otp_store, 'SessionLocal', session_factory)
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_ENABLED', False)  # every session comes from the same client
+    request = Request({'type': 'http', 'client': ('127.0.0.1', 0), 'headers': []})
+
+    def run():
+        phone = f'3{rng.randint(0, 10 ** 9 - 1):09d}'
+        session_id = ivr_start(IVRStart(phone=phone), db)['session_id']
+        steps = [{'digit': '5'}, {'voice_text': 'Bench Worker'}, {'digit': '1234'}, None,
+                 {'digit': '1'}, {'digit': '6'}, {'voice_text': 'Calicut Beach'}, {'digit': '700'},
+                 {'digit': '1'}]
+        for step in steps:
+            step = step or {'digit': otp_store.get('login', phone)['code']}
+            result = ivr_respond(IVRRespond(session_id=session_id, **step), request, db)
+        return result
+
+    assert benchmark(run)['completed'] is True
+
+
+@pytest.fixture(scope='module')
+def voice_note(tmp_path_factory):
+    """Five seconds of a 220 Hz tone padded with silence, 44.1 kHz stereo like a phone recording."""
+    path = str(tmp_path_factory.mktemp('audio') / 'note.wav')
+    rate = 44100
+    frames = bytearray()
+    for i in range(rate * 5):
+        t = i / rate
+        sample = int(12000 * math.sin(2 * math.pi * 220 * t)) if 0.5 < t < 4.5 else 0
+        frames += struct.pack('<hh', sample, sample)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(frames))
+    return path
+
+
+def test_preprocess_audio(benchmark, voice_note):
+    pytest.importorskip('librosa')
+    from ai import _decode_audio, _preprocess_audio
+
+    def run():
+        out = _preprocess_audio(*_decode_audio(voice_note))
+        os.unlink(out)
+        return out
+
+    assert benchmark(run).endswith('.wav')
+
+
+@pytest.fixture(scope='module')
+def phone_photo(tmp_path_factory):
+    """A 12 MP camera-sized JPEG with some texture, so it does not compress to nothing."""
+    Image = pytest.importorskip('PIL.Image')
+    path = str(tmp_path_factory.mktemp('photos') / 'phone.jpg')
+    noise = Image.effect_noise((1000, 750), 30).convert('RGB').resize((4000, 3000))
+    noise.save(path, 'JPEG', quality=92)
+    return path
+
+
+def test_photo_full_size_for_model(benchmark, phone_photo):
+    """Baseline: what the Gemini SDK sent for Image.open() of the raw photo."""
+    from model_images import _full_decode
+    benchmark(_full_decode, phone_photo)
+
+
+def test_photo_prepare_for_model(benchmark, phone_photo):
+    from model_images import prepare_for_model
+    part = benchmark(prepare_for_model, phone_photo)
+    assert len(part['data']) < os.path.getsize(phone_photo) / 10
+
+
+def test_metrics_request_overhead(benchmark):
+    """What MetricsMiddleware adds to one request: two gauge moves, a counter and a histogram."""
+    from metrics import HTTP_IN_FLIGHT, HTTP_REQUESTS, HTTP_LATENCY
+
+    def run():
+        HTTP_IN_FLIGHT.inc()
+        HTTP_IN_FLIGHT.dec()
+        HTTP_REQUESTS.inc('GET', '/api/workers/search', 200)
+        HTTP_LATENCY.observe('GET', '/api/workers/search', value=0.042)
+
+    benchmark(run)
+    if benchmark.stats:  # None under --benchmark-disable
+        assert benchmark.stats['mean'] < 50e-6
+
+
+def test_ai_client_overhead(benchmark, monkeypatch):
+    """ai.extract_profile through AIClient against a zero-latency stub: the cost of the guarded call path itself."""
+    import ai
+    from ai_client import AIClient
+    from model_backends import StubBackend
+    backend = StubBackend(latency_ms=0, image_ms=0, jitter_ms=0)
+    monkeypatch.setattr(ai, 'model', backend)
+    monkeypatch.setattr(ai, 'client', AIClient(backend))
+
+    result = benchmark(ai.extract_profile, 'I am a plumber with 8 years of experience in Andheri.', 'Hindi')
+    assert result['skill_type'] == 'Plumber'
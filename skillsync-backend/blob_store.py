@@ -0,0 +1,305 @@
+"""
+Content-addressed storage for uploaded media.
+
+Photos and voice bios are stored once per distinct content, at
+uploads/blobs/<aa>/<bb>/<sha256>.<ext>. Retried uploads, or the same
+photo attached to many complaints, point at the same file. The upload is
+hashed from Starlette's spooled copy before anything is written, so a
+duplicate costs no disk writes at all. The stored path goes into the
+existing columns (WorkerPhoto.file_path, JobRequest.complaint_photo_path,
+Worker.voice_bio_path) and is still served by the /uploads static mount.
+
+The `blobs` table keeps one row per hash (path, size, ref_count) so a
+blob can be looked up by hash. ref_count is bumped on every store and
+dropped when a voice bio is replaced. Garbage collection first recounts
+references from the columns pointing at blobs, which are the source of truth. It
+then deletes blobs with no references that nothing has referenced for a
+grace period, along with their resized variants (image_variants.py) and
+stray files that never made it into the table. Opus renditions of voice
+bios (audio_transcode.py) are blobs referenced from audio_renditions.
+
+GC and concurrent uploads:
+
+- add_ref refreshes last_referenced_at, and the grace period counts from
+  it. An old blob that someone has just uploaded again is therefore safe.
+- store_uploads commits its references straight away, in a short
+  transaction of their own. The request then runs its AI calls with no
+  write pending, because SQLite would otherwise hold its database-wide
+  write lock for the whole call. A request that fails before saving the
+  paths gives the references back (release_unused). One that dies in
+  between leaves ref_count high until the next recount; the grace period
+  covers the time until the handler commits its column.
+- Recounts and deletes are conditional statements (SET ref_count ...
+  WHERE ref_count = <value read>, DELETE ... WHERE ref_count = 0), so an
+  add_ref that commits between GC's read and its write keeps its effect.
+- GC unlinks a blob's files before it commits the row's delete. After
+  add_ref, store_uploads checks again that each file exists and writes it
+  back if a collection won the race.
+
+Run from the skillsync-backend directory:
+    python blob_store.py migrate          # move legacy uploads/photos, uploads/audio into the store
+    python blob_store.py gc [--dry-run]   # delete unreferenced blobs
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from fastapi import UploadFile, HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import dialect_insert
+from models import Blob, PhotoVariant, AudioRendition, WorkerPhoto, JobRequest, Worker
+from file_uploads import SavedUpload, save_uploads, too_large, CHUNK_SIZE
+
+BLOB_ROOT = 'uploads/blobs'
+GC_GRACE_SECONDS = 3600  # never collect blobs referenced more recently than this; an upload may not be committed yet
+
+
+def blob_path(sha256: str, ext: str) -> str:
+    return f'{BLOB_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}'
+
+
+def is_blob_path(path: str) -> bool:
+    return bool(path) and path.startswith(BLOB_ROOT + '/')
+
+
+def blob_sha(path: str):
+    """The sha256 a blob path is named by, or None for a legacy path."""
+    if not is_blob_path(path):
+        return None
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _hash_stream(src, max_bytes: int) -> tuple:
+    digest = hashlib.sha256()
+    size = 0
+    src.seek(0)
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large(max_bytes)
+        digest.update(chunk)
+    if size == 0:
+        raise HTTPException(status_code=400, detail='Empty file')
+    return digest.hexdigest(), size
+
+
+def find_blob(db: Session, sha256: str):
+    return db.query(Blob).filter(Blob.sha256 == sha256).first()
+
+
+def add_ref(db: Session, sha256: str, path: str, size: int):
+    insert = dialect_insert(db)
+    now = datetime.utcnow()
+    stmt = insert(Blob.__table__).values(
+        sha256=sha256, path=path, size=size, ref_count=1, created_at=now, last_referenced_at=now
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=['sha256'],
+        set_={'ref_count': Blob.__table__.c.ref_count + 1, 'path': stmt.excluded.path,
+              'last_referenced_at': stmt.excluded.last_referenced_at}
+    ))
+
+
+def release(db: Session, path: str):
+    """Drop one reference to a blob path (a no-op for legacy paths); GC removes the file later."""
+    sha256 = blob_sha(path)
+    if sha256 is None:
+        return
+    db.query(Blob).filter(Blob.sha256 == sha256, Blob.ref_count > 0).update(
+        {'ref_count': Blob.ref_count - 1}, synchronize_session=False
+    )
+
+
+def release_unused(db: Session, paths: list):
+    """Give back references from store_uploads whose paths were never saved, e.g. after a failed AI call."""
+    db.rollback()
+    for path in paths:
+        release(db, path)
+    db.commit()
+
+
+async def store_uploads(db: Session, uploads: list, ext_for, max_bytes: int) -> list:
+    """
+    Store a batch of uploads by content and take a reference to each;
+    ext_for(upload) picks the extension of a new blob. Hashing and the
+    writes of new blobs run concurrently off the event loop. Returns
+    SavedUpload per upload. The references are committed here; the caller
+    saves the paths and commits, or calls release_unused if it fails first.
+    """
+    for upload in uploads:
+        if upload.size is not None and upload.size > max_bytes:
+            raise too_large(max_bytes)
+    hashes = await asyncio.gather(*(run_in_threadpool(_hash_stream, u.file, max_bytes) for u in uploads))
+
+    results, to_write = [], {}
+    for upload, (sha256, size) in zip(uploads, hashes):
+        existing = find_blob(db, sha256)
+        if existing and os.path.exists(existing.path):
+            path = existing.path
+        else:
+            path = blob_path(sha256, ext_for(upload))
+            if not os.path.exists(path):
+                to_write.setdefault(path, upload)
+        results.append(SavedUpload(path, sha256, size))
+
+    await save_uploads([(upload, path) for path, upload in to_write.items()], max_bytes)
+    for saved in results:
+        add_ref(db, saved.sha256, saved.path, saved.size)
+    db.commit()
+    # A GC that collected one of the existing blobs before add_ref reached its row has unlinked the file
+    lost = {saved.path: upload for upload, saved in zip(uploads, results) if not os.path.exists(saved.path)}
+    if lost:
+        await save_uploads([(upload, path) for path, upload in lost.items()], max_bytes)
+    return results
+
+
+async def store_upload(db: Session, upload: UploadFile, ext: str, max_bytes: int) -> SavedUpload:
+    return (await store_uploads(db, [upload], lambda _: ext, max_bytes))[0]
+
+
+# ── Maintenance ──────────────────────────────────────────────────────────────
+
+def count_references(db: Session) -> Counter:
+    """{path: references} over every column that can point at a blob."""
+    counts = Counter()
+    columns = (WorkerPhoto.file_path, JobRequest.complaint_photo_path, Worker.voice_bio_path, AudioRendition.path)
+    for column in columns:
+        for (path,) in db.query(column).filter(column.isnot(None)):
+            counts[path] += 1
+    return counts
+
+
+def _variants_of(db: Session, sha256: str):
+    return db.query(PhotoVariant).filter(PhotoVariant.source_sha256 == sha256)
+
+
+def collect_garbage(db: Session, grace_seconds: int = GC_GRACE_SECONDS, dry_run: bool = False) -> dict:
+    blobs = db.query(Blob).all()  # read before the references, so an upload committing in between is counted
+    refs = count_references(db)
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    stats = {'blobs': 0, 'recounted': 0, 'deleted': 0, 'bytes_freed': 0, 'stray_files': 0}
+    known = set()
+
+    for blob in blobs:
+        stats['blobs'] += 1
+        known.add(blob.path)
+        count = refs.get(blob.path, 0)
+        if blob.ref_count != count:
+            # Only if ref_count is still what was read: an add_ref since then keeps its increment
+            if not db.query(Blob).filter(Blob.sha256 == blob.sha256, Blob.ref_count == blob.ref_count).update(
+                    {'ref_count': count}, synchronize_session=False):
+                continue
+            stats['recounted'] += 1
+        last_referenced = blob.last_referenced_at or blob.created_at
+        if count != 0 or not last_referenced or last_referenced >= cutoff:
+            continue
+        unreferenced = db.query(Blob).filter(
+            Blob.sha256 == blob.sha256, Blob.ref_count == 0,
+            func.coalesce(Blob.last_referenced_at, Blob.created_at) < cutoff
+        )
+        if not unreferenced.delete(synchronize_session=False):
+            continue
+        stats['deleted'] += 1
+        stats['bytes_freed'] += blob.size or 0
+        if not dry_run:
+            # Unlinked before the commit: an upload of this content blocks on the deleted row until then
+            for path in [blob.path] + [v.path for v in _variants_of(db, blob.sha256)]:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            _variants_of(db, blob.sha256).delete(synchronize_session=False)
+            # Its Opus rendition loses its last reference and goes on a later run
+            db.query(AudioRendition).filter(AudioRendition.source_sha256 == blob.sha256).delete(
+                synchronize_session=False)
+
+    # Files without a row: a crash between the rename and the commit, or a leftover .part
+    if os.path.isdir(BLOB_ROOT):
+        now = time.time()
+        for dirpath, _, filenames in os.walk(BLOB_ROOT):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename).replace(os.sep, '/')
+                if path in known or path in refs or now - os.path.getmtime(path) < grace_seconds:
+                    continue
+                stats['stray_files'] += 1
+                stats['bytes_freed'] += os.path.getsize(path)
+                if not dry_run:
+                    os.unlink(path)
+
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+    return stats
+
+
+def migrate_legacy(db: Session, dirs: tuple = ('uploads/photos', 'uploads/audio')) -> dict:
+    """Move files under the old uuid/timestamp paths into the store and repoint the columns."""
+    stats = {'files': 0, 'duplicates': 0, 'bytes_saved': 0}
+    moved = {}
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            old = f'{directory}/{filename}'
+            if not os.path.isfile(old) or filename.startswith('.'):
+                continue
+            with open(old, 'rb') as f:
+                try:
+                    sha256, size = _hash_stream(f, float('inf'))
+                except HTTPException:
+                    continue
+            ext = os.path.splitext(filename)[1].lstrip('.').lower() or 'bin'
+            existing = find_blob(db, sha256)
+            new = existing.path if existing else blob_path(sha256, ext)
+            stats['files'] += 1
+            if os.path.exists(new):
+                stats['duplicates'] += 1
+                stats['bytes_saved'] += size
+                os.unlink(old)
+            else:
+                os.makedirs(os.path.dirname(new), exist_ok=True)
+                os.replace(old, new)
+            if not existing:
+                db.add(Blob(sha256=sha256, path=new, size=size, ref_count=0))
+                db.flush()
+            moved[old] = new
+
+    for model, column in ((WorkerPhoto, 'file_path'), (JobRequest, 'complaint_photo_path'), (Worker, 'voice_bio_path')):
+        for old, new in moved.items():
+            db.query(model).filter(getattr(model, column) == old).update({column: new}, synchronize_session=False)
+    refs = count_references(db)
+    for blob in db.query(Blob).all():
+        blob.ref_count = refs.get(blob.path, 0)
+    db.commit()
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Content-addressed upload storage')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('migrate', help='move legacy uploads into the blob store')
+    gc = commands.add_parser('gc', help='delete unreferenced blobs')
+    gc.add_argument('--dry-run', action='store_true')
+    gc.add_argument('--grace', type=int, default=GC_GRACE_SECONDS, help='seconds before an unreferenced blob may go')
+    args = parser.parse_args()
+
+    from database import SessionLocal, Base, engine
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.command == 'migrate':
+            stats = migrate_legacy(db)
+        else:
+            stats = collect_garbage(db, args.grace, args.dry_run)
+    finally:
+        db.close()
+    print('Done. ' + ', '.join(f'{k}: {v}' for k, v in stats.items()))
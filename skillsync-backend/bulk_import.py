@@ -0,0 +1,332 @@
+"""
+Bulk worker import for partner onboarding.
+
+Streams workers from a CSV or JSONL file and writes them in chunks with a
+single executemany INSERT ... ON CONFLICT (phone) DO UPDATE per chunk, so
+re-importing a file updates existing workers instead of duplicating them.
+Phones are stored as the bare 10-digit number OTP login uses, so an
+imported worker can log in and is matched on re-import whether or not the
+file carries +91. Rows that fail validation are written, with the reason,
+to a reject file. The demo seed in main.py and src/main.py goes through
+import_rows too.
+Area names are resolved against the gazetteer once per distinct name, and
+trust scores for the chunk are computed with grouped queries.
+
+Run from the skillsync-backend directory:
+    python bulk_import.py workers.csv
+    python bulk_import.py workers.jsonl --chunk-size 5000 --rejects bad_rows.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from datetime import datetime
+from itertools import islice
+from uuid import uuid4
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+from database import dialect_insert
+from models import Worker, WorkerArea
+from gazetteer import normalize_area, resolve_area
+from geocoding import geocode, ensure_gazetteer
+from trust_score import calculate_trust_scores, trust_badge
+
+CHUNK_SIZE = 2000
+
+# column -> (type, max length for strings)
+FIELDS = {
+    'name':             (str, 100),
+    'phone':            (str, 20),
+    'language':         (str, 5),
+    'skill_type':       (str, 50),
+    'sub_skills':       (str, 200),
+    'experience_years': (int, None),
+    'bio_text':         (str, None),
+    'daily_rate':       (float, None),
+    'work_radius_km':   (int, None),
+    'location_lat':     (float, None),
+    'location_lng':     (float, None),
+    'location_area':    (str, 100),
+    'aadhaar_last4':    (str, 4),
+    'aadhaar_verified': (bool, None),
+    'trust_score':      (int, None),
+}
+
+# Values used for new rows when the file leaves a column empty
+DEFAULTS = {
+    'language': 'hi',
+    'work_radius_km': 10,
+    'aadhaar_verified': False,
+    'trust_score': 0,
+}
+
+# Country code and trunk prefixes in front of a mobile number; login works on the 10 digits after them
+PHONE_PREFIXES = ('0', '91', '091', '0091')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def normalize_phone(value: str):
+    """The bare 10-digit mobile number OTP login uses ('+91 98000 00011' -> '9800000011'), or None."""
+    phone = re.sub(r'[\s\-()]', '', value or '').lstrip('+')
+    if len(phone) > 10 and phone[:-10] in PHONE_PREFIXES:
+        phone = phone[-10:]
+    if not phone.isdigit() or len(phone) != 10:
+        return None
+    return phone
+
+
+def read_rows(path: str, fmt: str = None):
+    """Yield (line_no, dict) from a CSV or JSONL file without loading it into memory."""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, encoding='utf-8', newline='') as f:
+        if fmt == 'jsonl':
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {'_error': f'invalid JSON: {e.msg}', '_raw': line.rstrip('\n')}
+        else:
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+
+
+def _convert(key: str, value):
+    kind, max_len = FIELDS[key]
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        if kind is bool:
+            if isinstance(value, bool):
+                return value
+            text = str(value).strip().lower()
+            if text in TRUE_VALUES:
+                return True
+            if text in FALSE_VALUES:
+                return False
+            raise ValueError
+        if kind is int:
+            return int(float(value))
+        if kind is float:
+            return float(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{key}: expected {kind.__name__}, got {value!r}')
+    text = str(value).strip()
+    if max_len and len(text) > max_len:
+        raise RowError(f'{key}: longer than {max_len} characters')
+    return text
+
+
+def validate_row(raw: dict) -> dict:
+    """Return a clean row with every FIELDS key, or raise RowError."""
+    if '_error' in raw:
+        raise RowError(raw['_error'])
+    row = {key: _convert(key, raw.get(key)) for key in FIELDS}
+
+    row['phone'] = normalize_phone(row['phone'])
+    if row['phone'] is None:
+        raise RowError(f'phone: invalid number {raw.get("phone")!r}')
+
+    if (row['location_lat'] is None) != (row['location_lng'] is None):
+        raise RowError('location_lat and location_lng must be given together')
+    if row['location_lat'] is not None and not (-90 <= row['location_lat'] <= 90 and -180 <= row['location_lng'] <= 180):
+        raise RowError('location: coordinates out of range')
+    if row['experience_years'] is not None and not 0 <= row['experience_years'] <= 80:
+        raise RowError('experience_years: must be between 0 and 80')
+    if row['daily_rate'] is not None and row['daily_rate'] < 0:
+        raise RowError('daily_rate: must not be negative')
+    if row['aadhaar_last4'] is not None and not re.fullmatch(r'\d{4}', row['aadhaar_last4']):
+        raise RowError('aadhaar_last4: must be exactly 4 digits')
+    if row['trust_score'] is not None and not 0 <= row['trust_score'] <= 100:
+        raise RowError('trust_score: must be between 0 and 100')
+    if row['skill_type']:
+        row['skill_type'] = row['skill_type'].title()
+    return row
+
+
+class RejectWriter:
+    """Writes rejected rows in the input's own format, plus an `error` column."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._f = None
+        self._csv = None
+
+    def write(self, line_no: int, raw: dict, error: str):
+        if self._f is None:
+            self._f = open(self.path, 'w', encoding='utf-8', newline='')
+        self.count += 1
+        if self.path.endswith(('.jsonl', '.ndjson')):
+            self._f.write(json.dumps({'line': line_no, 'error': error, 'row': raw}, default=str) + '\n')
+            return
+        if self._csv is None:
+            fields = ['line', 'error'] + [k for k in raw if not k.startswith('_')]
+            self._csv = csv.DictWriter(self._f, fieldnames=fields, extrasaction='ignore')
+            self._csv.writeheader()
+        self._csv.writerow({'line': line_no, 'error': error, **raw})
+
+    def close(self):
+        if self._f:
+            self._f.close()
+
+
+def _worker_upsert(db: Session):
+    """
+    INSERT ... ON CONFLICT (phone) DO UPDATE with one bind per column, so a
+    value missing from the file falls back to the default on insert and keeps
+    the stored value on update.
+    """
+    table = Worker.__table__
+    values = {'id': bindparam('p_id'), 'created_at': bindparam('p_created_at'),
+              'account_status': 'active',
+              'profile_complete': func.coalesce(bindparam('p_profile_complete'), False),
+              'trust_badge': func.coalesce(bindparam('p_trust_badge'), 'Red'),
+              'location_source': bindparam('p_location_source')}
+    updates = {'profile_complete': func.coalesce(bindparam('p_profile_complete'), table.c.profile_complete),
+               'trust_badge': func.coalesce(bindparam('p_trust_badge'), table.c.trust_badge),
+               'location_source': func.coalesce(bindparam('p_location_source'), table.c.location_source)}
+    for key in FIELDS:
+        param = bindparam(f'p_{key}')
+        values[key] = func.coalesce(param, DEFAULTS[key]) if key in DEFAULTS else param
+        if key != 'phone':
+            updates[key] = func.coalesce(param, table.c[key])
+    stmt = dialect_insert(db)(table).values(values)
+    return stmt.on_conflict_do_update(index_elements=['phone'], set_=updates)
+
+
+def _resolve_areas(db: Session, rows: list, cache: dict):
+    """Resolve each distinct area name once: fills missing coordinates, returns {phone: area_id}."""
+    area_by_phone = {}
+    for row in rows:
+        if not row['location_area']:
+            continue
+        norm = normalize_area(row['location_area'])
+        if norm not in cache:
+            area = resolve_area(db, row['location_area'])
+            cache[norm] = (area.id if area else None, geocode(db, row['location_area']))
+        area_id, coords = cache[norm]
+        if area_id:
+            area_by_phone[row['phone']] = area_id
+        if row['location_lat'] is None and coords:
+            row['location_lat'], row['location_lng'] = coords
+            row['location_source'] = 'geocoded'
+    return area_by_phone
+
+
+def import_chunk(db: Session, rows: list, area_cache: dict, compute_trust: bool = True) -> dict:
+    """Upsert one chunk of validated rows. Later rows win when a phone repeats."""
+    rows = list({row['phone']: row for row in rows}.values())
+    phones = [row['phone'] for row in rows]
+    existing = {p for (p,) in db.query(Worker.phone).filter(Worker.phone.in_(phones))}
+    area_by_phone = _resolve_areas(db, rows, area_cache)
+
+    now = datetime.utcnow()
+    params = []
+    for row in rows:
+        p = {f'p_{key}': row[key] for key in FIELDS}
+        p['p_id'] = str(uuid4())
+        p['p_created_at'] = now
+        complete = all([row['name'], row['skill_type'], row['location_lat'], row['daily_rate']])
+        p['p_profile_complete'] = True if complete else None
+        p['p_trust_badge'] = trust_badge(row['trust_score']) if row['trust_score'] is not None else None
+        p['p_location_source'] = row.get('location_source') or ('gps' if row['location_lat'] is not None else None)
+        params.append(p)
+    db.execute(_worker_upsert(db), params)
+
+    ids = dict(db.query(Worker.phone, Worker.id).filter(Worker.phone.in_(phones)).all())
+    if area_by_phone:
+        insert = dialect_insert(db)
+        stmt = insert(WorkerArea.__table__)
+        stmt = stmt.on_conflict_do_update(index_elements=['worker_id'], set_={'area_id': stmt.excluded.area_id})
+        db.execute(stmt, [{'worker_id': ids[p], 'area_id': a} for p, a in area_by_phone.items()])
+
+    if compute_trust:
+        # Rows that carry their own trust_score (e.g. migrated from a partner) keep it
+        calculate_trust_scores([ids[r['phone']] for r in rows if r['trust_score'] is None], db)
+    db.commit()
+    return {'inserted': len(rows) - len(existing), 'updated': len(existing)}
+
+
+def import_rows(db: Session, rows, chunk_size: int = CHUNK_SIZE, rejects: RejectWriter = None,
+                compute_trust: bool = True, progress: bool = False) -> dict:
+    """
+    Import an iterable of raw dicts or (line_no, dict) pairs. Returns counts
+    and throughput: {inserted, updated, rejected, seconds, rows_per_sec}.
+    """
+    started = time.perf_counter()
+    totals = {'inserted': 0, 'updated': 0, 'rejected': 0}
+    area_cache = {}
+    it = iter(rows)
+    line_no = 0
+    while True:
+        batch = list(islice(it, chunk_size))
+        if not batch:
+            break
+        valid = []
+        for item in batch:
+            if isinstance(item, tuple):
+                line_no, raw = item
+            else:
+                line_no, raw = line_no + 1, item
+            try:
+                valid.append(validate_row(raw))
+            except RowError as e:
+                totals['rejected'] += 1
+                if rejects:
+                    rejects.write(line_no, raw, str(e))
+        if valid:
+            result = import_chunk(db, valid, area_cache, compute_trust)
+            totals['inserted'] += result['inserted']
+            totals['updated'] += result['updated']
+        if progress:
+            done = totals['inserted'] + totals['updated']
+            elapsed = time.perf_counter() - started
+            print(f'[INFO] {done} rows imported ({done / elapsed:,.0f} rows/sec)')
+
+    elapsed = time.perf_counter() - started
+    done = totals['inserted'] + totals['updated']
+    totals['seconds'] = round(elapsed, 2)
+    totals['rows_per_sec'] = round(done / elapsed) if elapsed > 0 else done
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import workers from CSV or JSONL')
+    parser.add_argument('path', help='input file (.csv or .jsonl)')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='override format detection')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--rejects', help='reject file (default: <input>.rejects.<ext>)')
+    parser.add_argument('--no-trust', action='store_true', help='skip initial trust score computation')
+    args = parser.parse_args()
+
+    from database import SessionLocal, Base, engine
+    Base.metadata.create_all(bind=engine)
+
+    root, ext = os.path.splitext(args.path)
+    rejects = RejectWriter(args.rejects or f'{root}.rejects{ext}')
+    db = SessionLocal()
+    try:
+        ensure_gazetteer(db)
+        result = import_rows(db, read_rows(args.path, args.format), args.chunk_size,
+                             rejects, compute_trust=not args.no_trust, progress=True)
+    finally:
+        rejects.close()
+        db.close()
+    print(f"Done. Added: {result['inserted']}, Updated: {result['updated']}, "
+          f"Rejected: {result['rejected']} in {result['seconds']}s ({result['rows_per_sec']:,} rows/sec)")
+    if rejects.count:
+        print(f'Rejected rows written to {rejects.path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -14,5 +14,13 @@ def get_db():
     finally:
         db.close()
 
+def dialect_insert(db):
+    """insert() of the session's dialect, for INSERT ... ON CONFLICT upserts."""
+    if db.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
 async def init_db():
     Base.metadata.create_all(bind=engine)
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""
+Background cleanup of Gemini file uploads and local scratch files.
+
+voice_to_text uploads a preprocessed WAV to the Gemini Files API and used
+to delete it in its finally block. That added a network round trip to
+every transcription. Now:
+
+- schedule_delete(name) queues the remote name and returns at once. A
+  single reaper thread waits REAPER_BATCH_DELAY seconds so that names
+  queued close together are handled in one pass. It then deletes them a
+  few at a time through its own AIClient over ai.client's backend, with a
+  separate breaker and slot budget, so cleanup never takes a slot from a
+  user request and a run of failed deletes never opens the breaker for
+  foreground calls. The Files API has no batch delete, so
+  a pass means one drain of the queue. Failed deletes go back on the
+  queue with a longer delay, and are dropped after REAPER_MAX_ATTEMPTS.
+  Gemini expires files after 48 hours anyway. A 404 counts as deleted.
+- Uploads carry the display name UPLOAD_PREFIX. sweep_orphans() lists the
+  project's files and deletes ours that are older than
+  ORPHAN_MIN_AGE_SECONDS. These are files left behind when a process died
+  before its reaper ran. The age limit keeps it away from uploads that
+  another worker process is still using.
+- Temporary audio goes into SCRATCH_DIR (scratch_path()) rather than the
+  system temp directory. Callers remove their own files. sweep_scratch()
+  removes leftovers older than SCRATCH_MAX_AGE_SECONDS.
+
+start() runs both sweeps in the background. Both mains call it on startup.
+The reaper and the sweeps run on daemon threads, so interpreter exit never
+waits out a retry delay. Whatever they leave queued, the next startup sweep
+deletes as an orphan.
+
+Run from the skillsync-backend directory:
+    python file_reaper.py sweep            # delete orphaned uploads and stale scratch files now
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from ai_client import AIClient, CircuitBreaker, FILE_TIMEOUT
+from metrics import AI_FILE_CLEANUP
+
+load_dotenv()
+
+SCRATCH_DIR = os.getenv('AI_SCRATCH_DIR') or os.path.join(tempfile.gettempdir(), 'skillsync-ai')
+SCRATCH_MAX_AGE_SECONDS = 3600
+UPLOAD_PREFIX = 'skillsync-'
+ORPHAN_MIN_AGE_SECONDS = 600
+REAPER_BATCH_DELAY = float(os.getenv('REAPER_BATCH_DELAY', '2'))
+REAPER_RETRY_DELAY = 30.0
+REAPER_MAX_ATTEMPTS = 5
+DELETE_CONCURRENCY = 4
+
+_lock = threading.Lock()
+_pending = {}  # remote file name -> failed attempts so far
+_running = False
+_own_client = None
+
+
+def _client():
+    """The reaper's client: ai.client's backend behind its own slots and breaker."""
+    global _own_client
+    # ai imports this module, so look the client up lazily
+    import ai
+    if ai.client is None:
+        return None
+    with _lock:
+        if _own_client is None or _own_client.backend is not ai.client.backend:
+            _own_client = AIClient(ai.client.backend, max_concurrency=DELETE_CONCURRENCY,
+                                   queue_timeout=FILE_TIMEOUT, breaker=CircuitBreaker())
+        return _own_client
+
+
+# ── Local scratch files ──────────────────────────────────────────────────────
+
+def scratch_path(suffix: str = '') -> str:
+    """A new empty file in SCRATCH_DIR; the caller removes it (discard) when done."""
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=SCRATCH_DIR, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def discard(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def sweep_scratch(max_age: float = SCRATCH_MAX_AGE_SECONDS) -> int:
+    if not os.path.isdir(SCRATCH_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(SCRATCH_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# ── Remote uploads ───────────────────────────────────────────────────────────
+
+def _delete(name: str) -> bool:
+    try:
+        _client().delete_file(name, retries=0)
+    except Exception as e:
+        if getattr(e, 'code', None) != 404:
+            return False
+    return True
+
+
+def reap(batch: dict) -> dict:
+    """Delete {name: attempts}; returns the names still to retry, with updated attempt counts."""
+    names = list(batch)
+    with ThreadPoolExecutor(max_workers=DELETE_CONCURRENCY) as pool:
+        results = dict(zip(names, pool.map(_delete, names)))
+    retry = {}
+    for name, deleted in results.items():
+        if deleted:
+            AI_FILE_CLEANUP.inc('deleted')
+        elif batch[name] + 1 >= REAPER_MAX_ATTEMPTS:
+            AI_FILE_CLEANUP.inc('dropped')
+            print(f'[WARNING] Giving up deleting Gemini file {name}; it expires on its own after 48h')
+        else:
+            AI_FILE_CLEANUP.inc('retried')
+            retry[name] = batch[name] + 1
+    return retry
+
+
+def _drain():
+    global _running
+    delay = REAPER_BATCH_DELAY
+    while True:
+        time.sleep(delay)
+        with _lock:
+            batch = dict(_pending)
+            _pending.clear()
+            if not batch:
+                _running = False
+                return
+        try:
+            retry = reap(batch)
+        except Exception as e:
+            print(f'[WARNING] File reaper pass failed: {e}')
+            retry = {name: attempts + 1 for name, attempts in batch.items() if attempts + 1 < REAPER_MAX_ATTEMPTS}
+        with _lock:
+            for name, attempts in retry.items():
+                _pending[name] = max(attempts, _pending.get(name, 0))
+        delay = REAPER_RETRY_DELAY if retry else REAPER_BATCH_DELAY
+
+
+def schedule_delete(name: str):
+    """Delete a Gemini upload in the background."""
+    global _running
+    if _client() is None:
+        return
+    with _lock:
+        _pending.setdefault(name, 0)
+        if _running:
+            return
+        _running = True
+    # A daemon thread, so shutdown never waits out retry delays; the next startup sweep catches leftovers
+    threading.Thread(target=_drain, name='file-reaper', daemon=True).start()
+
+
+def pending() -> list:
+    with _lock:
+        return sorted(_pending)
+
+
+def sweep_orphans(min_age: float = ORPHAN_MIN_AGE_SECONDS) -> int:
+    """Delete our uploads older than min_age that no reaper is going to handle."""
+    client = _client()
+    if client is None:
+        return 0
+    now = datetime.now(timezone.utc)
+    orphans = {}
+    for f in client.list_files():
+        created = getattr(f, 'create_time', None)
+        if not (getattr(f, 'display_name', '') or '').startswith(UPLOAD_PREFIX) or created is None:
+            continue
+        if (now - created).total_seconds() >= min_age and f.name not in _pending:
+            orphans[f.name] = REAPER_MAX_ATTEMPTS - 1  # one try here; the next sweep picks up failures
+    if orphans:
+        reap(orphans)
+        AI_FILE_CLEANUP.inc('orphan', amount=len(orphans))
+    return len(orphans)
+
+
+def _startup_sweep():
+    try:
+        removed = sweep_scratch()
+        orphans = sweep_orphans()
+        if removed or orphans:
+            print(f'[OK] Cleanup: {orphans} orphaned Gemini uploads, {removed} stale scratch files')
+    except Exception as e:
+        print(f'[WARNING] Startup cleanup failed: {e}')
+
+
+def start():
+    """Sweep orphaned uploads and stale scratch files in the background."""
+    threading.Thread(target=_startup_sweep, name='file-reaper-sweep', daemon=True).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gemini upload and scratch file cleanup')
+    commands = parser.add_subparsers(dest='command', required=True)
+    sweep = commands.add_parser('sweep', help='delete orphaned uploads and stale scratch files')
+    sweep.add_argument('--min-age', type=float, default=ORPHAN_MIN_AGE_SECONDS,
+                       help='only uploads at least this many seconds old')
+    args = parser.parse_args()
+
+    removed = sweep_scratch()
+    orphans = sweep_orphans(args.min_age)
+    print(f'Done. orphaned uploads: {orphans}, scratch files: {removed}')
@@ -0,0 +1,161 @@
+"""
+Streaming writes for multipart uploads.
+
+Handlers used to copy UploadFile objects to disk with shutil.copyfileobj
+inside async endpoints, which blocks the event loop for the whole write
+and accepts files of any size. save_upload() instead copies in 1 MB chunks
+on a worker thread, hashes the content (sha256) while copying, enforces a
+per-file limit, and writes to a temporary file in the destination
+directory that is renamed into place only when complete. A crashed or
+rejected upload therefore never leaves a partial file behind.
+
+RequestSizeLimitMiddleware caps the whole request body, counted as it
+streams in, so an oversized multipart body is rejected before it is
+spooled to disk.
+
+Limits (environment or .env, in MB): MAX_PHOTO_MB=10, MAX_AUDIO_MB=25,
+MAX_REQUEST_MB=60.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import NamedTuple
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+MB = 1024 * 1024
+MAX_PHOTO_BYTES = int(float(os.getenv('MAX_PHOTO_MB', '10')) * MB)
+MAX_AUDIO_BYTES = int(float(os.getenv('MAX_AUDIO_MB', '25')) * MB)
+MAX_REQUEST_BYTES = int(float(os.getenv('MAX_REQUEST_MB', '60')) * MB)
+CHUNK_SIZE = MB
+
+
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f'File too large. Maximum size is {max_bytes // MB} MB')
+
+
+def safe_extension(filename: str, default: str) -> str:
+    """Lower-cased extension from a client filename, or default if missing or odd."""
+    ext = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return ext if re.fullmatch(r'[a-z0-9]{1,5}', ext) else default
+
+
+def _copy_to(src, dest_path: str, max_bytes: int) -> tuple:
+    dest_dir = os.path.dirname(dest_path) or '.'
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix='.upload-', suffix='.part')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            src.seek(0)
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large(max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail='Empty file')
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return digest.hexdigest(), size
+
+
+async def save_upload(upload: UploadFile, dest_path: str, max_bytes: int) -> SavedUpload:
+    """Stream an upload to dest_path off the event loop; raises HTTPException 413/400."""
+    if upload.size is not None and upload.size > max_bytes:
+        raise too_large(max_bytes)
+    sha256, size = await run_in_threadpool(_copy_to, upload.file, dest_path, max_bytes)
+    return SavedUpload(dest_path, sha256, size)
+
+
+async def save_uploads(items: list, max_bytes: int) -> list:
+    """save_upload for several (upload, dest_path) pairs at once; all or nothing."""
+    results = await asyncio.gather(
+        *(save_upload(upload, path, max_bytes) for upload, path in items),
+        return_exceptions=True
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        for r in results:
+            if isinstance(r, SavedUpload):
+                try:
+                    os.unlink(r.path)
+                except OSError:
+                    pass
+        raise errors[0]
+    return results
+
+
+class RequestSizeLimitMiddleware:
+    """Reject request bodies over max_bytes with 413, by Content-Length or while streaming."""
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, send):
+        body = json.dumps({'detail': f'Request too large. Maximum size is {self.max_bytes // MB} MB'}).encode()
+        await send({'type': 'http.response.start', 'status': 413, 'headers': [
+            (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        for key, value in scope.get('headers', []):
+            if key == b'content-length' and value.isdigit() and int(value) > self.max_bytes:
+                return await self._reject(send)
+
+        received = 0
+        exceeded = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise HTTPException(status_code=413)
+            return message
+
+        async def guarded_send(message):
+            # Body parsing errors surface as the app's own 400; replace it with our 413
+            nonlocal rejected
+            if not exceeded:
+                return await send(message)
+            if message['type'] == 'http.response.start' and not rejected:
+                rejected = True
+                await self._reject(send)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except HTTPException:
+            if not exceeded:
+                raise
+            if not rejected:
+                await self._reject(send)
@@ -0,0 +1,223 @@
+"""
+Area gazetteer with a trigram index for fuzzy location matching.
+
+Worker areas arrive as free text from voice answers (AI call, IVR), so the
+same place shows up as "Calicut Beach", "Kozhikode beach" or "Calicut bch".
+Every spelling is normalised, mapped to a canonical area and broken into
+trigrams stored in `area_trigrams`, so a fuzzy lookup is an indexed
+`trigram IN (...)` query instead of an `ilike` scan over all workers.
+
+Rebuild the index for existing rows from the skillsync-backend directory:
+    python gazetteer.py
+"""
+import hashlib
+import re
+import unicodedata
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from models import Area, AreaName, AreaTrigram, WorkerArea, Worker
+
+# Same default as PostgreSQL pg_trgm.similarity_threshold
+SIMILARITY_THRESHOLD = 0.3
+# A new spelling is only merged into an existing area above this score,
+# otherwise it becomes an area of its own
+MERGE_THRESHOLD = 0.5
+
+# Common abbreviations and old/new place names seen in voice answers
+TOKEN_ALIASES = {
+    'bch':        'beach',
+    'rd':         'road',
+    'st':         'street',
+    'str':        'street',
+    'jn':         'junction',
+    'jnc':        'junction',
+    'jct':        'junction',
+    'ngr':        'nagar',
+    'calicut':    'kozhikode',
+    'kozhikkode': 'kozhikode',
+    'cochin':     'kochi',
+    'trivandrum': 'thiruvananthapuram',
+    'trichur':    'thrissur',
+    'quilon':     'kollam',
+    'alleppey':   'alappuzha',
+    'cannanore':  'kannur',
+    'palghat':    'palakkad',
+}
+
+
+def normalize_area(name: str) -> str:
+    """Lowercase, strip punctuation and expand known aliases: 'Calicut Bch.' -> 'kozhikode beach'."""
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKC', name).lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    tokens = [TOKEN_ALIASES.get(t, t) for t in text.split()]
+    return ' '.join(tokens)[:100]
+
+
+def trigrams(text: str) -> set:
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing space."""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(a: str, b: str) -> float:
+    ga, gb = trigrams(normalize_area(a)), trigrams(normalize_area(b))
+    if not ga or not gb:
+        return 0.0
+    return len(ga & gb) / len(ga | gb)
+
+
+def area_id_for(norm: str) -> str:
+    """
+    Canonical area id for a normalised name: 'kozhikode beach' -> 'kozhikode-beach'.
+    Ids longer than Area.id's 64 characters are cut and end in a hash of
+    the whole name, so two long names with a shared prefix stay apart.
+    """
+    slug = re.sub(r'\s+', '-', norm)
+    if len(slug) <= 64:
+        return slug
+    return f"{slug[:55]}-{hashlib.sha256(slug.encode('utf-8')).hexdigest()[:8]}"
+
+
+def search_area_names(db: Session, text: str, threshold: float = SIMILARITY_THRESHOLD, limit: int = 10) -> list:
+    """
+    Return [(AreaName, similarity)] for spellings similar to `text`, best first.
+    Candidates come from the trigram index; similarity is |shared| / |union|.
+    """
+    norm = normalize_area(text)
+    grams = trigrams(norm)
+    if not grams:
+        return []
+    shared = func.count(AreaTrigram.trigram).label('shared')
+    rows = (
+        db.query(AreaName, shared)
+        .join(AreaTrigram, AreaTrigram.name == AreaName.name)
+        .filter(AreaTrigram.trigram.in_(grams))
+        .group_by(AreaName.name)
+        .all()
+    )
+    scored = []
+    for area_name, n in rows:
+        score = n / (len(grams) + area_name.trigram_count - n)
+        if score >= threshold:
+            scored.append((area_name, score))
+    scored.sort(key=lambda x: -x[1])
+    return scored[:limit]
+
+
+def match_area_ids(db: Session, text: str, threshold: float = SIMILARITY_THRESHOLD) -> set:
+    """Canonical area ids whose names fuzzily match `text`."""
+    return {n.area_id for n, _ in search_area_names(db, text, threshold)}
+
+
+def add_area_name(db: Session, norm: str, area_id: str) -> AreaName:
+    grams = trigrams(norm)
+    area_name = AreaName(name=norm, area_id=area_id, trigram_count=len(grams))
+    db.add(area_name)
+    for g in grams:
+        db.add(AreaTrigram(trigram=g, name=norm))
+    db.flush()
+    return area_name
+
+
+def resolve_area(db: Session, name: str, create: bool = True):
+    """
+    Map a free-text area name to its canonical Area.
+    Exact normalised match first, then the closest fuzzy match above
+    MERGE_THRESHOLD (the new spelling is recorded as an alias). With
+    create=True an unknown name becomes a new area.
+    """
+    norm = normalize_area(name)
+    if not norm:
+        return None
+    known = db.query(AreaName).filter(AreaName.name == norm).first()
+    if known:
+        return db.query(Area).filter(Area.id == known.area_id).first()
+
+    best = search_area_names(db, norm, threshold=MERGE_THRESHOLD, limit=1)
+    if best:
+        area_id = best[0][0].area_id
+        add_area_name(db, norm, area_id)
+        return db.query(Area).filter(Area.id == area_id).first()
+
+    if not create:
+        return None
+    area = Area(id=area_id_for(norm), name=name.strip())
+    db.add(area)
+    db.flush()
+    add_area_name(db, norm, area.id)
+    return area
+
+
+def index_worker_area(db: Session, worker: Worker):
+    """Link a worker to the canonical area of its `location_area`. Caller commits."""
+    link = db.query(WorkerArea).filter(WorkerArea.worker_id == worker.id).first()
+    area = resolve_area(db, worker.location_area) if worker.location_area else None
+    if area is None:
+        if link:
+            db.delete(link)
+        return None
+    own_position = (worker.location_lat is not None and worker.location_lng is not None
+                    and worker.location_source != 'geocoded')
+    if area.location_lat is None and own_position:
+        area.location_lat = worker.location_lat
+        area.location_lng = worker.location_lng
+    if link:
+        link.area_id = area.id
+    else:
+        db.add(WorkerArea(worker_id=worker.id, area_id=area.id))
+    return area
+
+
+def sync_worker_areas(db: Session) -> int:
+    """Index every worker that has a location_area but no worker_areas row yet."""
+    pending = (
+        db.query(Worker)
+        .outerjoin(WorkerArea, WorkerArea.worker_id == Worker.id)
+        .filter(Worker.location_area.isnot(None), WorkerArea.worker_id.is_(None))
+        .all()
+    )
+    for worker in pending:
+        index_worker_area(db, worker)
+    db.commit()
+    return len(pending)
+
+
+def refresh_centroids(db: Session) -> int:
+    """
+    Recompute each area's centroid as the mean position of its workers with
+    coordinates of their own. Geocoded positions are the centroid itself and are
+    left out. Areas loaded from the gazetteer file keep their surveyed centroid.
+    """
+    rows = (
+        db.query(WorkerArea.area_id, func.avg(Worker.location_lat), func.avg(Worker.location_lng))
+        .join(Worker, Worker.id == WorkerArea.worker_id)
+        .join(Area, Area.id == WorkerArea.area_id)
+        .filter(Worker.location_lat.isnot(None), Worker.location_lng.isnot(None))
+        .filter(or_(Worker.location_source.is_(None), Worker.location_source != 'geocoded'))
+        .filter(Area.source != 'gazetteer')
+        .group_by(WorkerArea.area_id)
+        .all()
+    )
+    for area_id, lat, lng in rows:
+        db.query(Area).filter(Area.id == area_id).update({'location_lat': lat, 'location_lng': lng})
+    db.commit()
+    return len(rows)
+
+
+if __name__ == '__main__':
+    from database import SessionLocal, Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        indexed = sync_worker_areas(db)
+        areas = refresh_centroids(db)
+        print(f'Done. Indexed workers: {indexed}, Area centroids: {areas}')
+    finally:
+        db.close()
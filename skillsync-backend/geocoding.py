@@ -0,0 +1,173 @@
+"""
+Offline geocoding of worker area names.
+
+Workers onboarded through IVR or the AI call only give an area name, so
+they have no location_lat/lng and never show up in radius searches. Area
+names are resolved against the local gazetteer file (data/gazetteer.csv,
+loaded into the `areas` table) and the area centroid becomes the worker's
+position. Lookups are memoised per process.
+
+Workers.location_source records where a position came from: 'gps' for
+coordinates sent by the client, 'geocoded' for an area centroid. When the
+area changes, a geocoded point is re-derived, or cleared if the new area
+is unknown. Geocoded points never feed back into area centroids.
+
+Load the gazetteer and backfill existing workers from the skillsync-backend directory:
+    python geocoding.py
+"""
+import csv
+import os
+from sqlalchemy.orm import Session
+from models import Area, AreaName, Worker
+from metrics import CACHE_REQUESTS
+from gazetteer import normalize_area, search_area_names, index_worker_area, add_area_name, area_id_for, MERGE_THRESHOLD
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+CACHE_SIZE = 4096
+
+# normalised area name -> (lat, lng); only hits are cached because the
+# gazetteer grows as workers register new areas
+_GEOCODE_CACHE: dict = {}
+
+
+def clear_cache():
+    _GEOCODE_CACHE.clear()
+
+
+def load_gazetteer(db: Session, path: str = GAZETTEER_PATH) -> int:
+    """
+    Load `name,aliases,lat,lng` rows into the areas table. Areas already
+    created from worker data are upgraded in place with the file's centroid.
+    """
+    loaded = 0
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            norm = normalize_area(row['name'])
+            if not norm:
+                continue
+            known = db.query(AreaName).filter(AreaName.name == norm).first()
+            if known:
+                area = db.query(Area).filter(Area.id == known.area_id).first()
+            else:
+                area = Area(id=area_id_for(norm), name=row['name'].strip())
+                db.add(area)
+                db.flush()
+                add_area_name(db, norm, area.id)
+            area.location_lat = float(row['lat'])
+            area.location_lng = float(row['lng'])
+            area.source = 'gazetteer'
+            for alias in (row.get('aliases') or '').split('|'):
+                alias_norm = normalize_area(alias)
+                if alias_norm and not db.query(AreaName).filter(AreaName.name == alias_norm).first():
+                    add_area_name(db, alias_norm, area.id)
+            loaded += 1
+    db.commit()
+    clear_cache()
+    return loaded
+
+
+def ensure_gazetteer(db: Session) -> int:
+    """Load the gazetteer file once, on first startup."""
+    if db.query(Area).filter(Area.source == 'gazetteer').first():
+        return 0
+    return load_gazetteer(db)
+
+
+def geocode(db: Session, name: str):
+    """
+    Return (lat, lng) for an area name, or None if it cannot be resolved.
+    Exact normalised match first, then the closest fuzzy match that has a centroid.
+    """
+    norm = normalize_area(name)
+    if not norm:
+        return None
+    if norm in _GEOCODE_CACHE:
+        CACHE_REQUESTS.inc('geocode', 'hit')
+        return _GEOCODE_CACHE[norm]
+    CACHE_REQUESTS.inc('geocode', 'miss')
+
+    coords = None
+    known = db.query(AreaName).filter(AreaName.name == norm).first()
+    area_ids = [known.area_id] if known else [n.area_id for n, _ in search_area_names(db, norm, threshold=MERGE_THRESHOLD)]
+    for area_id in area_ids:
+        area = db.query(Area).filter(Area.id == area_id).first()
+        if area and area.location_lat is not None and area.location_lng is not None:
+            coords = (area.location_lat, area.location_lng)
+            break
+
+    if coords:
+        if len(_GEOCODE_CACHE) >= CACHE_SIZE:
+            _GEOCODE_CACHE.clear()
+        _GEOCODE_CACHE[norm] = coords
+    return coords
+
+
+def locate_worker(db: Session, worker: Worker, area_changed: bool = False, gps: bool = False):
+    """
+    Index the worker's area and keep the coordinates in step with it. Caller commits.
+
+    gps: the caller has just set location_lat/lng from the client; they are kept and marked 'gps'.
+    Otherwise the area centroid fills missing coordinates and replaces geocoded ones. When the
+    area changed it also replaces a GPS fix taken for the old area, and an area that does not
+    resolve clears the stale point rather than keeping it.
+    """
+    if gps and worker.location_lat is not None and worker.location_lng is not None:
+        worker.location_source = 'gps'
+    elif worker.location_area and (area_changed or worker.location_lat is None or worker.location_lng is None
+                                   or worker.location_source == 'geocoded'):
+        coords = geocode(db, worker.location_area)
+        if coords:
+            worker.location_lat, worker.location_lng = coords
+            worker.location_source = 'geocoded'
+        elif area_changed or worker.location_source == 'geocoded':
+            worker.location_lat = worker.location_lng = worker.location_source = None
+    return index_worker_area(db, worker)
+
+
+def backfill_coordinates(db: Session, batch_size: int = 500) -> dict:
+    """Geocode every worker that has a location_area but no coordinates."""
+    resolved = unresolved = 0
+    misses = set()
+    last_id = ''
+    while True:
+        batch = (
+            db.query(Worker)
+            .filter(
+                Worker.location_area.isnot(None),
+                (Worker.location_lat.is_(None)) | (Worker.location_lng.is_(None)),
+                Worker.id > last_id
+            )
+            .order_by(Worker.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        for worker in batch:
+            last_id = worker.id
+            norm = normalize_area(worker.location_area)
+            coords = None if norm in misses else geocode(db, worker.location_area)
+            if coords:
+                worker.location_lat, worker.location_lng = coords
+                worker.location_source = 'geocoded'
+                resolved += 1
+            else:
+                misses.add(norm)
+                unresolved += 1
+        db.commit()
+    return {'resolved': resolved, 'unresolved': unresolved}
+
+
+if __name__ == '__main__':
+    from database import SessionLocal, Base, engine
+    from gazetteer import sync_worker_areas
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        areas = load_gazetteer(db)
+        sync_worker_areas(db)
+        result = backfill_coordinates(db)
+        print(f"Done. Gazetteer areas: {areas}, Resolved: {result['resolved']}, Unresolved: {result['unresolved']}")
+    finally:
+        db.close()
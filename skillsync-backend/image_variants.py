@@ -0,0 +1,255 @@
+"""
+Resized variants of worker photos.
+
+Photos are uploaded straight from phone cameras (2-5 MB, 3000-4000 px) and
+were served as-is, so a search page of twenty worker cards pulled tens of
+megabytes to draw 48 px avatars. After an upload commits, the photo is
+rendered in a small background pool into three sizes, each as WebP and
+JPEG:
+
+  thumb   160 px longest edge    search result cards
+  card    480 px                 worker detail gallery
+  full    1600 px                tapped / full-screen view
+
+Variants are keyed by the source blob's sha256 (see blob_store.py) and
+written to uploads/variants/<aa>/<sha256>/<variant>.<format>, so a photo
+shared by several workers or uploaded twice is rendered once. Each variant
+is recorded in the photo_variants table.
+
+GET /api/workers/photos/{photo_id}?size=thumb serves the best match. The
+format comes from ?format= or the Accept header: WebP when the client
+accepts it, JPEG otherwise. If a variant is not ready yet (or Pillow is not
+installed) the original is served and rendering is queued.
+
+Photos stored before the blob store have no hash and are always served as
+the original; run `python blob_store.py migrate` first, then backfill.
+
+Run from the skillsync-backend directory:
+    python image_variants.py backfill     # render variants for existing photos
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from database import SessionLocal, dialect_insert
+from models import PhotoVariant, WorkerPhoto
+from blob_store import blob_sha
+from media import MediaResponse, REVALIDATE
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    print('[WARNING] Pillow not installed - photo variants disabled, originals will be served')
+
+VARIANT_ROOT = 'uploads/variants'
+VARIANTS = {'thumb': 160, 'card': 480, 'full': 1600}  # longest edge in px
+FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv('IMAGE_VARIANT_WORKERS', '2')),
+                           thread_name_prefix='image-variants')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def variant_path(sha256: str, variant: str, fmt: str) -> str:
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{VARIANT_ROOT}/{sha256[:2]}/{sha256}/{variant}.{ext}'
+
+
+def photo_url(photo_id: str, size: str = None) -> str:
+    return f'/api/workers/photos/{photo_id}' + (f'?size={size}' if size else '')
+
+
+def photo_urls(photo_id: str) -> dict:
+    return {size: photo_url(photo_id, size) for size in VARIANTS}
+
+
+# ── Rendering ────────────────────────────────────────────────────────────────
+
+def _save(image, path: str, fmt: str) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.part'
+    try:
+        image.save(tmp_path, **SAVE_OPTIONS[fmt])
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return os.path.getsize(path)
+
+
+def render_variants(source_path: str, sha256: str) -> list:
+    """Write every variant of one photo; returns row dicts for photo_variants."""
+    with Image.open(source_path) as opened:
+        # Phone photos are often stored sideways with an EXIF rotation flag
+        image = ImageOps.exif_transpose(opened)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.load()
+
+    rows = []
+    # Largest first so each smaller size is downscaled from an already-reduced copy
+    current = image
+    for variant, edge in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        current = current.copy()
+        current.thumbnail((edge, edge), Image.LANCZOS)  # never upscales
+        for fmt in FORMATS:
+            path = variant_path(sha256, variant, fmt)
+            size = _save(current, path, fmt)
+            rows.append({'source_sha256': sha256, 'variant': variant, 'format': fmt, 'path': path,
+                         'width': current.width, 'height': current.height, 'size': size})
+    return rows
+
+
+def generate_variants(db: Session, source_path: str) -> int:
+    """Render and record the variants of one stored photo unless they exist. Returns rows written."""
+    sha256 = blob_sha(source_path)
+    if Image is None or sha256 is None or not os.path.exists(source_path):
+        return 0
+    existing = db.query(PhotoVariant).filter(PhotoVariant.source_sha256 == sha256).count()
+    if existing == len(VARIANTS) * len(FORMATS):
+        return 0
+    rows = render_variants(source_path, sha256)
+    insert = dialect_insert(db)
+    stmt = insert(PhotoVariant.__table__).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=['source_sha256', 'variant', 'format'],
+        set_={c: getattr(stmt.excluded, c) for c in ('path', 'width', 'height', 'size')}
+    ))
+    db.commit()
+    return len(rows)
+
+
+def _generate_in_background(source_path: str):
+    db = SessionLocal()
+    try:
+        generate_variants(db, source_path)
+    except Exception as e:
+        db.rollback()
+        print(f'[WARNING] Photo variants failed for {source_path}: {e}')
+    finally:
+        db.close()
+        with _pending_lock:
+            _pending.discard(source_path)
+
+
+def schedule_variants(paths: list) -> list:
+    """Queue rendering for stored photos after their upload has committed; returns the futures."""
+    if Image is None:
+        return []
+    futures = []
+    for path in paths:
+        if blob_sha(path) is None:
+            continue
+        with _pending_lock:
+            if path in _pending:
+                continue
+            _pending.add(path)
+        futures.append(_pool.submit(_generate_in_background, path))
+    return futures
+
+
+# ── Serving ──────────────────────────────────────────────────────────────────
+
+def negotiate_format(fmt: str, accept: str) -> str:
+    if fmt:
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=400, detail=f'format must be one of: {", ".join(FORMATS)}')
+        return fmt
+    return 'webp' if 'image/webp' in (accept or '') else 'jpeg'
+
+
+def photo_response(db: Session, photo_id: str, size: str, fmt: str, accept: str) -> MediaResponse:
+    """
+    The requested variant of a worker photo, or the original while it is
+    being rendered. A photo id always names the same content, so stored
+    variants and originals are sent as immutable (see media.py).
+    """
+    if size not in VARIANTS and size != 'original':
+        raise HTTPException(status_code=400, detail=f'size must be one of: {", ".join(VARIANTS)}, original')
+    photo = db.query(WorkerPhoto).filter(WorkerPhoto.id == photo_id).first()
+    if not photo or not os.path.exists(photo.file_path):
+        raise HTTPException(status_code=404, detail='Photo not found')
+    fmt = negotiate_format(fmt, accept)
+    headers = {'Vary': 'Accept'}
+
+    sha256 = blob_sha(photo.file_path)
+    if size != 'original' and sha256:
+        variant = db.query(PhotoVariant).filter(
+            PhotoVariant.source_sha256 == sha256,
+            PhotoVariant.variant == size,
+            PhotoVariant.format == fmt
+        ).first()
+        if variant and os.path.exists(variant.path):
+            return MediaResponse(variant.path, media_type=FORMATS[fmt], headers=headers)
+        schedule_variants([photo.file_path])
+        # Not ready yet: serve the original, but make caches come back for the variant
+        return MediaResponse(photo.file_path, cache_control=REVALIDATE, headers=headers)
+    return MediaResponse(photo.file_path, headers=headers)
+
+
+def cover_photos(db: Session, worker_ids: list) -> dict:
+    """{worker_id: photo_id} of each worker's earliest photo, in one query."""
+    if not worker_ids:
+        return {}
+    covers = {}
+    rows = db.query(WorkerPhoto.worker_id, WorkerPhoto.id).filter(
+        WorkerPhoto.worker_id.in_(worker_ids)
+    ).order_by(WorkerPhoto.uploaded_at, WorkerPhoto.id)
+    for worker_id, photo_id in rows:
+        covers.setdefault(worker_id, photo_id)
+    return covers
+
+
+def add_thumbnails(db: Session, results: list) -> list:
+    """Set 'photo_url' (thumb size, or None) on a page of search results."""
+    covers = cover_photos(db, [r['id'] for r in results])
+    for r in results:
+        photo_id = covers.get(r['id'])
+        r['photo_url'] = photo_url(photo_id, 'thumb') if photo_id else None
+    return results
+
+
+def backfill(db: Session) -> dict:
+    stats = {'photos': 0, 'rendered': 0, 'skipped': 0, 'failed': 0}
+    paths = sorted({path for (path,) in db.query(WorkerPhoto.file_path)})
+    for path in paths:
+        stats['photos'] += 1
+        try:
+            if generate_variants(db, path):
+                stats['rendered'] += 1
+            else:
+                stats['skipped'] += 1
+        except Exception as e:
+            db.rollback()
+            stats['failed'] += 1
+            print(f'[WARNING] {path}: {e}')
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resized variants of worker photos')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('backfill', help='render variants for photos that have none')
+    args = parser.parse_args()
+
+    if Image is None:
+        raise SystemExit('[ERROR] Pillow is required: pip install Pillow')
+    from database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        stats = backfill(db)
+    finally:
+        db.close()
+    print('Done. ' + ', '.join(f'{k}: {v}' for k, v in stats.items()))
@@ -0,0 +1,105 @@
+"""
+A whole AI-call interview processed in one request.
+
+The AI-call frontend used to post each recording to
+/api/ai-call/voice-answer, one after another, and then call
+/api/ai-call/extract-profile. An eight-question interview therefore
+waited for eight preprocess + upload + transcribe pipelines in a row.
+POST /api/ai-call/session (src/routers/ai_call.py) takes all the answer
+recordings at once:
+
+- transcribe_answers() runs ai.voice_to_text for up to
+  AI_SESSION_CONCURRENCY answers at a time. Preprocessing, the speech
+  check, the upload and the model call of one answer overlap with those
+  of the others.
+- All sessions in the process share AI_SESSION_SLOTS, one less than
+  AI_MAX_CONCURRENCY by default. An answer waits for a session slot for
+  as long as its request lasts. It therefore never queues on the AI
+  client, where it could be refused with AIBusy after AI_QUEUE_TIMEOUT,
+  and a free client slot is left for voice bios and other calls.
+- A silent recording (vad.NoSpeechDetected) or an error is reported per
+  question, and the profile is extracted from the answers that did
+  transcribe. An answer lost to an AI outage fails the whole session
+  with 503 and Retry-After instead, so the client sends it again rather
+  than saving a profile with answers silently missing.
+- Extraction runs once, over all the answers.
+
+Each answer's time is returned next to the session total. With enough
+slots the total is about the slowest answer plus one extraction, rather
+than the sum of all of them.
+
+Run from the skillsync-backend directory:
+    python interview_session.py measure a1.wav a2.wav ...   # session time, one at a time vs in parallel
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import ai
+from ai_client import MAX_CONCURRENCY
+from vad import NoSpeechDetected
+
+load_dotenv()
+
+SESSION_SLOTS = int(os.getenv('AI_SESSION_SLOTS', str(max(1, MAX_CONCURRENCY - 1))))
+CONCURRENCY = int(os.getenv('AI_SESSION_CONCURRENCY', str(SESSION_SLOTS)))
+
+_slots = threading.BoundedSemaphore(SESSION_SLOTS)
+
+
+def _transcribe_one(path: str, language: str) -> dict:
+    result = {'transcript': '', 'status': 'ok'}
+    with _slots:
+        started = time.perf_counter()
+        try:
+            result['transcript'] = ai.voice_to_text(path, language)
+            if result['transcript'] in (ai.OUTAGE_MESSAGE, ai.UNAVAILABLE_MESSAGE):
+                result.update(transcript='', status='unavailable')
+        except NoSpeechDetected:
+            result['status'] = 'no_speech'
+        except Exception as e:
+            result.update(status='error', detail=str(e))
+        result['ms'] = round((time.perf_counter() - started) * 1000)
+    return result
+
+
+def transcribe_answers(recordings: dict, language: str, concurrency: int = None) -> dict:
+    """{question_key: audio path} -> {question_key: {'transcript', 'status', 'ms'}}, transcribed in parallel."""
+    if not recordings:
+        return {}
+    concurrency = concurrency or CONCURRENCY
+    keys = list(recordings)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(keys))),
+                            thread_name_prefix='interview-session') as pool:
+        results = pool.map(lambda key: _transcribe_one(recordings[key], language), keys)
+        return dict(zip(keys, results))
+
+
+def measure(paths: list, language: str = 'Hindi') -> dict:
+    recordings = {f'q{i + 1}': path for i, path in enumerate(paths)}
+    started = time.perf_counter()
+    serial = transcribe_answers(recordings, language, concurrency=1)
+    serial_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parallel = transcribe_answers(recordings, language)
+    parallel_s = time.perf_counter() - started
+    return {'answers': len(paths), 'concurrency': CONCURRENCY,
+            'one_at_a_time_s': round(serial_s, 2), 'parallel_s': round(parallel_s, 2),
+            'slowest_answer_s': round(max(r['ms'] for r in parallel.values()) / 1000, 2),
+            'failed': sum(r['status'] != 'ok' for r in serial.values())}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel transcription of a whole interview')
+    commands = parser.add_subparsers(dest='command', required=True)
+    measure_cmd = commands.add_parser('measure', help='session time, one at a time vs in parallel')
+    measure_cmd.add_argument('paths', nargs='+', help='answer recordings')
+    measure_cmd.add_argument('--language', default='Hindi')
+    args = parser.parse_args()
+
+    if ai.model is None:
+        raise SystemExit('[ERROR] GEMINI_API_KEY (or AI_BACKEND=stub) is required')
+    print('Done. ' + ', '.join(f'{k}: {v}' for k, v in measure(args.paths, args.language).items()))
@@ -0,0 +1,227 @@
+"""
+Load-test harness for the SkillSync API.
+
+Drives the main user flows against a running server with N concurrent
+virtual users and reports throughput and latency percentiles per endpoint:
+
+  search   GET  /api/workers/search (coordinates, skill and area filters)
+  profile  GET  /api/workers/{id} and /api/workers/{id}/ledger
+  job      POST /api/jobs/create -> PUT respond -> PUT complete ->
+           POST /api/reviews/scan-qr -> POST /api/reviews/submit
+  ivr      POST /api/ivr/start and the respond steps up to OTP entry
+           (the OTP only exists in the server's logs, so the OTP step is
+           sent with a wrong code and exercises the rejection path)
+
+Generate data first with synthetic_data.py, start the server, then:
+    python load_test.py --base-url http://localhost:8000 --concurrency 20 --duration 60
+    python load_test.py --flows search=3,profile=1 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from uuid import uuid4
+from synthetic_data import load_centroids, LOADTEST_EMAIL, LOADTEST_PASSWORD, SKILLS
+
+DEFAULT_FLOWS = {'search': 5, 'profile': 3, 'job': 1, 'ivr': 1}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def record(self, name: str, seconds: float, ok: bool):
+        self.latencies[name].append(seconds * 1000)
+        if not ok:
+            self.errors[name] += 1
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            row = {
+                'requests': len(values),
+                'errors': self.errors[name],
+                'rps': round(len(values) / elapsed, 1),
+                'mean_ms': round(sum(values) / len(values), 1),
+                'max_ms': round(values[-1], 1),
+            }
+            for p in PERCENTILES:
+                row[f'p{p}_ms'] = round(percentile(values, p), 1)
+            endpoints[name] = row
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            'duration_s': round(elapsed, 1),
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'rps': round(total / elapsed, 1),
+            'endpoints': endpoints,
+        }
+
+
+def print_report(report: dict):
+    header = f"{'endpoint':<40}{'reqs':>7}{'err':>6}{'rps':>8}" + ''.join(f"{'p%d' % p:>9}" for p in PERCENTILES) + f"{'max':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, row in report['endpoints'].items():
+        print(f"{name:<40}{row['requests']:>7}{row['errors']:>6}{row['rps']:>8}"
+              + ''.join(f"{row[f'p{p}_ms']:>9}" for p in PERCENTILES) + f"{row['max_ms']:>9}")
+    print('-' * len(header))
+    print(f"Total: {report['requests']} requests, {report['errors']} errors, "
+          f"{report['rps']} req/s over {report['duration_s']}s (latencies in ms)")
+
+
+class LoadTest:
+    def __init__(self, client, stats: Stats, rng: random.Random):
+        self.client = client
+        self.stats = stats
+        self.rng = rng
+        self.centroids = load_centroids()
+        self.worker_ids = []
+        self.tokens = []
+
+    async def call(self, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.stats.record(name, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    async def setup(self, customers: int):
+        """Collect worker ids and log in (or register) a pool of customers; not counted in the stats."""
+        r = await self.client.get('/api/workers/search', params={'limit': 1000})
+        r.raise_for_status()
+        self.worker_ids = [w['id'] for w in r.json()['workers']]
+        if not self.worker_ids:
+            raise SystemExit('No workers found. Run synthetic_data.py first.')
+        for i in range(customers):
+            r = await self.client.post('/api/auth/customer/login', json={
+                'email': LOADTEST_EMAIL.format(i), 'password': LOADTEST_PASSWORD})
+            if r.status_code != 200:
+                r = await self.client.post('/api/auth/customer/register', json={
+                    'name': f'Load Test {i}', 'email': f'loadtest-{uuid4()}@skillsync.test',
+                    'password': LOADTEST_PASSWORD})
+            r.raise_for_status()
+            self.tokens.append(r.json()['access_token'])
+
+    def _headers(self):
+        return {'Authorization': f'Bearer {self.rng.choice(self.tokens)}'}
+
+    async def flow_search(self):
+        name, aliases, lat, lng, _ = self.rng.choice(self.centroids)
+        params = {'lat': round(self.rng.gauss(lat, 0.02), 5), 'lng': round(self.rng.gauss(lng, 0.02), 5),
+                  'radius_km': self.rng.choice([5, 10, 25, 50]), 'limit': 20}
+        if self.rng.random() < 0.5:
+            params['skill'] = self.rng.choice(list(SKILLS))
+        if self.rng.random() < 0.2:
+            params = {'location': self.rng.choice([name] + aliases), 'limit': 20}
+        await self.call('GET /api/workers/search', 'GET', '/api/workers/search', params=params)
+
+    async def flow_profile(self):
+        worker_id = self.rng.choice(self.worker_ids)
+        await self.call('GET /api/workers/{id}', 'GET', f'/api/workers/{worker_id}')
+        await self.call('GET /api/workers/{id}/ledger', 'GET', f'/api/workers/{worker_id}/ledger')
+
+    async def flow_job(self):
+        headers = self._headers()
+        r = await self.call('POST /api/jobs/create', 'POST', '/api/jobs/create', headers=headers,
+                            json={'worker_id': self.rng.choice(self.worker_ids), 'description': 'Load test job'})
+        if r is None:
+            return
+        job_id = r.json()['request_id']
+        if await self.call('PUT /api/jobs/{id}/respond', 'PUT', f'/api/jobs/{job_id}/respond',
+                           headers=headers, json={'response': 'accepted'}) is None:
+            return
+        r = await self.call('PUT /api/jobs/{id}/complete', 'PUT', f'/api/jobs/{job_id}/complete', headers=headers)
+        if r is None:
+            return
+        qr_id = r.json()['qr_id']
+        await self.call('POST /api/reviews/scan-qr', 'POST', '/api/reviews/scan-qr', headers=headers, json={'qr_id': qr_id})
+        await self.call('POST /api/reviews/submit', 'POST', '/api/reviews/submit', headers=headers,
+                        json={'qr_id': qr_id, 'rating': self.rng.choice([3, 4, 5, 5]), 'review_text': 'Load test review'})
+
+    async def flow_ivr(self):
+        r = await self.call('POST /api/ivr/start', 'POST', '/api/ivr/start',
+                            json={'phone': f'4{self.rng.randint(0, 10 ** 9 - 1):09d}'})
+        if r is None:
+            return
+        session_id = r.json()['session_id']
+        steps = [{'digit': str(self.rng.randint(1, 8))}, {'voice_text': 'Load Test Worker'},
+                 {'digit': f'{self.rng.randint(0, 9999):04d}'}, {'digit': '000000'}]
+        for step in steps:
+            if await self.call('POST /api/ivr/respond', 'POST', '/api/ivr/respond',
+                               json={'session_id': session_id, **step}) is None:
+                return
+
+    async def user(self, flows: dict, deadline: float, max_iterations: int):
+        names, weights = list(flows), list(flows.values())
+        done = 0
+        while time.perf_counter() < deadline and (not max_iterations or done < max_iterations):
+            flow = self.rng.choices(names, weights)[0]
+            await getattr(self, f'flow_{flow}')()
+            done += 1
+
+
+def parse_flows(text: str) -> dict:
+    flows = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_FLOWS:
+            raise argparse.ArgumentTypeError(f'unknown flow {name!r}')
+        flows[name] = float(weight or 1)
+    return flows
+
+
+async def run(base_url: str, concurrency: int, duration: float, flows: dict,
+              iterations: int = 0, customers: int = 20, seed: int = 1) -> dict:
+    import httpx
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        test = LoadTest(client, Stats(), random.Random(seed))
+        await test.setup(customers)
+        test.stats = Stats()
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(test.user(flows, deadline, iterations) for _ in range(concurrency)))
+        return test.stats.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the SkillSync API')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--iterations', type=int, default=0, help='stop each user after N flows (0 = until duration)')
+    parser.add_argument('--flows', type=parse_flows, default=DEFAULT_FLOWS, help='e.g. search=5,profile=3,job=1,ivr=1')
+    parser.add_argument('--customers', type=int, default=20, help='customer accounts to log in')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.base_url, args.concurrency, args.duration, args.flows,
+                             args.iterations, args.customers, args.seed))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
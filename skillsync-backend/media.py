@@ -0,0 +1,301 @@
+"""
+Serving uploaded media: strong ETags, long-lived caching, byte ranges and
+zero-copy sends.
+
+/uploads used to be a plain StaticFiles mount. Its ETag is an md5 of
+mtime and size, and it sends no Cache-Control, so browsers revalidated
+every photo on every profile view. It also has no Range support, so a
+voice bio could not be seeked without downloading it again from the
+start. MediaFiles replaces that mount, and MediaResponse is also used by
+the photo variant endpoint (image_variants.py).
+
+- ETags are content hashes. Blobs and their variants are named by sha256
+  already (blob_store.py), so their tag costs nothing. Legacy files are
+  hashed once per (mtime, size) on a worker thread.
+- Content-addressed paths never change, so they are sent with
+  Cache-Control: public, max-age=31536000, immutable. Browsers then do not
+  even revalidate. Other files use no-cache and get a 304 when the tag
+  matches.
+- Range: bytes=a-b, a- and -n get a 206 reply. If-Range is honoured,
+  unsatisfiable ranges get a 416, and multi-range requests get the whole
+  file.
+- Bodies are sent zero-copy when the server allows it. Behind nginx, set
+  MEDIA_ACCEL_PREFIX to an internal location aliased to uploads/; nginx
+  then sends the file with sendfile(2) via X-Accel-Redirect. Otherwise
+  the ASGI zerocopysend or pathsend extensions are used when the server
+  offers them. Failing both, the file is streamed in 256 KB chunks off
+  the event loop.
+
+Run from the skillsync-backend directory:
+    python media.py measure [worker_id]   # bytes/requests for two visits to a profile, before and after
+"""
+import argparse
+import hashlib
+import os
+import re
+import stat
+import threading
+from email.utils import formatdate
+from mimetypes import guess_type
+import anyio
+from dotenv import load_dotenv
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from blob_store import BLOB_ROOT
+
+load_dotenv()
+
+MEDIA_ROOT = 'uploads'
+ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '').rstrip('/')
+CHUNK_SIZE = 256 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Paths whose content can never change: blobs are named by their hash, variants by their source's
+CONTENT_ADDRESSED = (BLOB_ROOT + '/', MEDIA_ROOT + '/variants/')
+
+_hash_cache = {}  # path -> (mtime_ns, size, etag)
+_hash_lock = threading.Lock()
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+def _relative(path: str) -> str:
+    return os.path.relpath(path).replace(os.sep, '/')
+
+
+def is_content_addressed(path: str) -> bool:
+    return _relative(path).startswith(CONTENT_ADDRESSED)
+
+
+def content_etag(path: str, st: os.stat_result = None) -> str:
+    """Strong ETag from the file's content; free for content-addressed paths."""
+    rel = _relative(path)
+    if rel.startswith(CONTENT_ADDRESSED):
+        # uploads/blobs/aa/bb/<sha>.<ext> or uploads/variants/aa/<sha>/<variant>.<ext>
+        parts = rel.split('/')
+        if parts[1] == 'blobs':
+            return '"' + os.path.splitext(parts[-1])[0] + '"'
+        return '"{}-{}"'.format(parts[-2], parts[-1].replace('.', '-'))
+
+    st = st or os.stat(path)
+    with _hash_lock:
+        cached = _hash_cache.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    etag = '"' + digest.hexdigest() + '"'
+    with _hash_lock:
+        _hash_cache[path] = (st.st_mtime_ns, st.st_size, etag)
+    return etag
+
+
+def parse_range(header: str, size: int):
+    """(start, end) inclusive for a single byte range, None to send the whole file, 'invalid' for a 416."""
+    match = _RANGE.match(header.strip().replace(' ', ''))
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return 'invalid'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return 'invalid'
+    return start, end
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in [t[2:] if t.startswith('W/') else t for t in tags]
+
+
+class MediaResponse(Response):
+    """
+    A file response that handles If-None-Match, Range/If-Range and zero-copy
+    sending itself. The etag is computed from the content when not given.
+    """
+
+    def __init__(self, path: str, etag: str = None, cache_control: str = None,
+                 media_type: str = None, headers: dict = None, stat_result: os.stat_result = None):
+        self.path = path
+        self.etag = etag
+        self.stat_result = stat_result
+        self.status_code = 200
+        self.background = None
+        self.media_type = media_type or guess_type(path)[0] or 'application/octet-stream'
+        self.init_headers(headers)
+        if cache_control:
+            self.headers['cache-control'] = cache_control
+        elif 'cache-control' not in self.headers:
+            self.headers['cache-control'] = IMMUTABLE if is_content_addressed(path) else REVALIDATE
+
+    async def __call__(self, scope, receive, send):
+        st = self.stat_result
+        if st is None:
+            try:
+                st = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            return await Response('Not Found', status_code=404)(scope, receive, send)
+        etag = self.etag or await anyio.to_thread.run_sync(content_etag, self.path, st)
+
+        request = Headers(scope=scope)
+        self.headers['etag'] = etag
+        self.headers['last-modified'] = formatdate(st.st_mtime, usegmt=True)
+        self.headers['accept-ranges'] = 'bytes'
+
+        if_none_match = request.get('if-none-match')
+        if if_none_match and _etag_matches(if_none_match, etag):
+            del self.headers['content-type']
+            self.status_code = 304
+            await send({'type': 'http.response.start', 'status': 304, 'headers': self.raw_headers})
+            return await send({'type': 'http.response.body', 'body': b''})
+
+        size = st.st_size
+        start, end = 0, size - 1
+        byte_range = request.get('range')
+        if byte_range and request.get('if-range', etag) == etag:
+            parsed = parse_range(byte_range, size)
+            if parsed == 'invalid':
+                self.status_code = 416
+                del self.headers['content-type']
+                self.headers['content-range'] = f'bytes */{size}'
+                self.headers['content-length'] = '0'
+                await send({'type': 'http.response.start', 'status': 416, 'headers': self.raw_headers})
+                return await send({'type': 'http.response.body', 'body': b''})
+            if parsed:
+                start, end = parsed
+                self.status_code = 206
+                self.headers['content-range'] = f'bytes {start}-{end}/{size}'
+        count = end - start + 1 if size else 0
+
+        if ACCEL_PREFIX:
+            # nginx serves the body (and any range) with sendfile; we only decide headers
+            self.headers['x-accel-redirect'] = f'{ACCEL_PREFIX}/{_relative(self.path)}'
+            self.status_code = 200
+            if 'content-range' in self.headers:
+                del self.headers['content-range']
+            await send({'type': 'http.response.start', 'status': 200, 'headers': self.raw_headers})
+            return await send({'type': 'http.response.body', 'body': b''})
+
+        self.headers['content-length'] = str(count)
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        if scope['method'] == 'HEAD' or count == 0:
+            return await send({'type': 'http.response.body', 'body': b''})
+        await self._send_body(scope, send, start, count, full=count == size)
+
+    async def _send_body(self, scope, send, offset: int, count: int, full: bool):
+        extensions = scope.get('extensions') or {}
+        if 'http.response.zerocopysend' in extensions:
+            with open(self.path, 'rb') as f:
+                return await send({'type': 'http.response.zerocopysend', 'file': f,
+                                   'offset': offset, 'count': count})
+        if full and 'http.response.pathsend' in extensions:
+            return await send({'type': 'http.response.pathsend', 'path': os.path.abspath(self.path)})
+        async with await anyio.open_file(self.path, 'rb') as f:
+            await f.seek(offset)
+            remaining = count
+            while remaining:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+            if remaining:
+                # The file shrank under us; close the response rather than hang
+                await send({'type': 'http.response.body', 'body': b''})
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles for the uploads directory, answering with MediaResponse."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        return MediaResponse(str(full_path), stat_result=stat_result)
+
+
+# ── Measurement ──────────────────────────────────────────────────────────────
+
+class CachingClient:
+    """
+    Wraps a TestClient the way a browser cache would: fresh immutable
+    entries are served locally and others are revalidated with
+    If-None-Match. It counts requests and body bytes over the wire.
+    """
+
+    def __init__(self, client, cache: bool = True):
+        self.client = client
+        self.cache = cache
+        self.entries = {}
+        self.requests = 0
+        self.bytes = 0
+
+    def get(self, url: str, headers: dict = None):
+        headers = dict(headers or {})
+        entry = self.entries.get(url)
+        if entry and 'immutable' in entry.headers.get('cache-control', ''):
+            return entry
+        if entry and entry.headers.get('etag'):
+            headers['If-None-Match'] = entry.headers['etag']
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += len(response.content)
+        if response.status_code == 304:
+            return entry
+        if self.cache and response.status_code == 200:
+            self.entries[url] = response
+        return response
+
+
+def browse_profile(client, worker_id: str):
+    """What WorkerDetail loads: the profile, each photo, and the voice bio."""
+    detail = client.get(f'/api/workers/{worker_id}').json()
+    for photo in detail.get('photos', []):
+        client.get(photo['urls']['card'] if photo.get('urls') else '/' + photo['file_path'],
+                   headers={'Accept': 'image/webp'})
+    if detail.get('voice_bio_url'):
+        client.get(detail['voice_bio_url'])
+
+
+def measure(app, worker_id: str) -> dict:
+    from fastapi.testclient import TestClient
+    results = {}
+    for label, cache in (('no_cache', False), ('browser_cache', True)):
+        client = CachingClient(TestClient(app), cache=cache)
+        browse_profile(client, worker_id)
+        first = (client.requests, client.bytes)
+        browse_profile(client, worker_id)
+        results[label] = {'first_visit': first,
+                          'repeat_visit': (client.requests - first[0], client.bytes - first[1])}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Uploaded media serving')
+    commands = parser.add_subparsers(dest='command', required=True)
+    measure_cmd = commands.add_parser('measure', help='requests/bytes for a repeated profile browse')
+    measure_cmd.add_argument('worker_id', nargs='?', help='defaults to the worker with the most photos')
+    args = parser.parse_args()
+
+    from sqlalchemy import func
+    from database import SessionLocal
+    from models import WorkerPhoto
+    from main import app
+    worker_id = args.worker_id
+    if not worker_id:
+        db = SessionLocal()
+        row = db.query(WorkerPhoto.worker_id, func.count(WorkerPhoto.id)).group_by(
+            WorkerPhoto.worker_id).order_by(func.count(WorkerPhoto.id).desc()).first()
+        db.close()
+        if not row:
+            raise SystemExit('[ERROR] No worker has photos yet')
+        worker_id = row[0]
+    for label, visits in measure(app, worker_id).items():
+        (r1, b1), (r2, b2) = visits['first_visit'], visits['repeat_visit']
+        print(f'{label:14} first visit: {r1} requests, {b1:,} bytes   repeat visit: {r2} requests, {b2:,} bytes')
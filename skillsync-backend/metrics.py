@@ -0,0 +1,277 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at
+GET /metrics by both main.py and src/main.py. No client library or external
+service is needed; any Prometheus-compatible scraper (or curl) can read it.
+
+  skillsync_http_requests_total{method,route,status}    counter
+  skillsync_http_request_duration_seconds{method,route} histogram
+  skillsync_http_requests_in_flight                     gauge
+  skillsync_db_pool_connections{engine,state}           gauge, read at scrape
+  skillsync_ai_calls_in_flight{function}                gauge
+  skillsync_ai_calls_total{function,outcome}            counter
+  skillsync_ai_client_calls_total{op,outcome}           counter (retries, timeouts, circuit_open)
+  skillsync_ai_client_call_duration_seconds{op}         histogram
+  skillsync_ai_client_slots_in_use                      gauge
+  skillsync_ai_circuit_open                             gauge (1 while open)
+  skillsync_ai_file_cleanup_total{outcome}              counter (deleted, retried, dropped, orphan)
+  skillsync_cache_requests_total{cache,result}          counter (hit ratio)
+  skillsync_otp_sent_total{channel}                     counter (rate() it)
+  skillsync_ivr_sessions{state}                         gauge, read at scrape
+  skillsync_trust_score_recomputes_total{mode}          counter
+
+Recording is a dict lookup and an add under a per-metric lock that is held
+for a few bytecodes, so it stays well under 50 µs per request
+(benchmarks/test_hot_paths.py::test_metrics_request_overhead).
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import get_db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(n, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for n, v in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, labels, value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self.values[labels] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                yield self.name + '_bucket', labels + (bound,), cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Register a callable(db) that refreshes gauges just before exposition."""
+        self.collectors.append(func)
+        return func
+
+    def expose(self, db: Session = None) -> str:
+        for collect in self.collectors:
+            try:
+                collect(db)
+            except Exception as e:
+                print(f'[WARNING] Metrics collector {collect.__name__} failed: {e}')
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                names = metric.label_names + (('le',) if name.endswith('_bucket') else ())
+                lines.append(f'{name}{_labels(names, labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'skillsync_http_requests_total', 'HTTP requests by route template and status.', ('method', 'route', 'status')))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    'skillsync_http_request_duration_seconds', 'HTTP request latency.', ('method', 'route')))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    'skillsync_http_requests_in_flight', 'HTTP requests being handled.'))
+DB_POOL = REGISTRY.register(Gauge(
+    'skillsync_db_pool_connections', 'Connection pool usage per engine.', ('engine', 'state')))
+AI_IN_FLIGHT = REGISTRY.register(Gauge(
+    'skillsync_ai_calls_in_flight', 'Gemini helper calls currently running.', ('function',)))
+AI_CALLS = REGISTRY.register(Counter(
+    'skillsync_ai_calls_total', 'Gemini helper calls by outcome.', ('function', 'outcome')))
+AI_CLIENT_CALLS = REGISTRY.register(Counter(
+    'skillsync_ai_client_calls_total', 'Gemini API attempts by operation and outcome.', ('op', 'outcome')))
+AI_CLIENT_LATENCY = REGISTRY.register(Histogram(
+    'skillsync_ai_client_call_duration_seconds', 'Gemini API attempt latency.', ('op',)))
+AI_CLIENT_SLOTS = REGISTRY.register(Gauge(
+    'skillsync_ai_client_slots_in_use', 'Gemini API calls holding a concurrency slot.'))
+AI_CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    'skillsync_ai_circuit_open', '1 while the Gemini circuit breaker is open.'))
+AI_FILE_CLEANUP = REGISTRY.register(Counter(
+    'skillsync_ai_file_cleanup_total', 'Gemini uploads handled by the background reaper.', ('outcome',)))
+VAD_CLIPS = REGISTRY.register(Counter(
+    'skillsync_vad_clips_total', 'Recordings checked for speech before a model call (no_speech: call avoided).',
+    ('source', 'result')))
+VAD_SECONDS = REGISTRY.register(Counter(
+    'skillsync_vad_audio_seconds_total', 'Seconds of audio received by the speech check and sent on to the model.',
+    ('kind',)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'skillsync_cache_requests_total', 'Cache lookups by result.', ('cache', 'result')))
+OTP_SENT = REGISTRY.register(Counter(
+    'skillsync_otp_sent_total', 'OTPs generated.', ('channel',)))
+OTP_EXPIRED = REGISTRY.register(Counter(
+    'skillsync_otp_expired_total', 'Expired OTPs deleted by the expiry sweep.'))
+RATE_LIMITED = REGISTRY.register(Counter(
+    'skillsync_rate_limited_total', 'OTP and login requests refused with 429.', ('scope',)))
+IVR_SESSIONS = REGISTRY.register(Gauge(
+    'skillsync_ivr_sessions', 'IVR sessions by current state (COMPLETED once finished).', ('state',)))
+TRUST_RECOMPUTES = REGISTRY.register(Counter(
+    'skillsync_trust_score_recomputes_total', 'Workers whose trust score was recomputed.', ('mode',)))
+
+
+# ── Recording helpers ────────────────────────────────────────────────────────
+
+def track_ai(func):
+    """Count a Gemini helper call and keep the in-flight gauge up to date."""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        AI_IN_FLIGHT.inc(name)
+        outcome = 'error'
+        try:
+            result = func(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            AI_IN_FLIGHT.dec(name)
+            AI_CALLS.inc(name, outcome)
+    return wrapper
+
+
+_engines = {}
+
+def watch_engine(name: str, engine):
+    """Report this engine's pool in skillsync_db_pool_connections."""
+    _engines[name] = engine
+
+
+@REGISTRY.collector
+def _collect_pools(db):
+    for name, engine in _engines.items():
+        pool = engine.pool
+        for state, reader in (('size', 'size'), ('checked_out', 'checkedout'),
+                              ('checked_in', 'checkedin')):
+            if hasattr(pool, reader):
+                DB_POOL.set(name, state, value=getattr(pool, reader)())
+
+
+@REGISTRY.collector
+def _collect_ivr_sessions(db):
+    if db is None:
+        return
+    from models import IVRSession
+    rows = db.query(
+        IVRSession.current_state, IVRSession.completed, func.count(IVRSession.id)
+    ).group_by(IVRSession.current_state, IVRSession.completed).all()
+    counts = {}
+    for state, completed, n in rows:
+        key = 'COMPLETED' if completed else (state or 'UNKNOWN')
+        counts[key] = counts.get(key, 0) + n
+    with IVR_SESSIONS._lock:
+        IVR_SESSIONS.values = {(state,): n for state, n in counts.items()}
+
+
+# ── ASGI middleware and endpoint ─────────────────────────────────────────────
+
+class MetricsMiddleware:
+    """Plain ASGI middleware recording request counts and latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Label by route template so /api/workers/<uuid> does not create a series per worker
+            route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+            HTTP_REQUESTS.inc(scope['method'], route, status)
+            HTTP_LATENCY.observe(scope['method'], route, value=time.perf_counter() - started)
+
+
+router = APIRouter()
+
+@router.get('/metrics', include_in_schema=False, response_class=PlainTextResponse)
+def metrics(db: Session = Depends(get_db)):
+    return PlainTextResponse(REGISTRY.expose(db), media_type='text/plain; version=0.0.4; charset=utf-8')
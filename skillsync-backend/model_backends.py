@@ -0,0 +1,351 @@
+"""
+Model backends behind ai_client.AIClient.
+
+A backend is anything with the Gemini operations ai.py and file_reaper.py
+use: generate_content(contents, generation_config=None, request_options=None),
+upload_file(path, display_name=None), get_file(name), delete_file(name) and
+list_files().
+
+- GeminiBackend forwards these to google.generativeai. This is the
+  production path.
+- StubBackend answers locally. It is selected with AI_BACKEND=stub, and no
+  API key or network is needed. It recognises the fixed prompts in ai.py
+  (transcription, profile extraction, single and batched photo analysis).
+  It returns output in the same shape Gemini does, derived deterministically
+  from the input: the same audio file or photo always gets the same
+  answer.
+
+Timing and faults are configurable, so the real code path above the SDK
+can be tested and benchmarked offline. That path covers the AIClient
+queue, timeouts, retries and breaker, the thread pools, and batching.
+  AI_STUB_LATENCY_MS    base latency per generate_content call (default 300)
+  AI_STUB_IMAGE_MS      extra latency per image part (default 40)
+  AI_STUB_AUDIO_MS      extra latency per second of audio (default 20)
+  AI_STUB_JITTER_MS     uniform jitter added on top (default 100)
+  AI_STUB_ERROR_RATE    fraction of calls failing with AI_STUB_ERROR_CODE (default 0)
+  AI_STUB_ERROR_CODE    HTTP status of injected failures (default 503)
+  AI_STUB_SEED          seed for jitter and failures (default 0)
+
+Responses carry usage_metadata with rough Gemini token counts: 32 tokens
+per second of 16 kHz audio, 258 per image, and 4 characters per text
+token. The totals go in stats as prompt_tokens and output_tokens.
+
+Run from the skillsync-backend directory:
+    python model_backends.py bench --calls 200 --concurrency 16            # extract_profile through the stub
+    python model_backends.py bench --task photos --calls 40 --error-rate 0.1
+    python model_backends.py bench --task voice --calls 50                  # VOICE_PROFILE_MODE=two_step to compare
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from dotenv import load_dotenv
+from google.api_core import exceptions as api_exceptions
+
+load_dotenv()
+
+SKILLS = ['Plumber', 'Electrician', 'Carpenter', 'Mason', 'Painter', 'Welder']
+AREAS = ['Andheri', 'Bandra', 'Kothrud', 'Whitefield', 'Salt Lake', 'Kozhikode', 'Adyar', 'Gachibowli']
+ISSUES = {
+    'plumbing_leak': 'Plumber', 'pipe_burst': 'Plumber', 'electrical_fault': 'Electrician',
+    'wiring_issue': 'Electrician', 'wall_crack': 'Mason', 'ceiling_damage': 'Mason',
+    'tile_broken': 'Mason', 'painting_needed': 'Painter',
+}
+PORTFOLIO_TAGS = {
+    'Plumber': ['plumbing', 'bathroom', 'pipe fitting', 'kitchen sink'],
+    'Electrician': ['electrical', 'wiring', 'switchboard', 'ceiling fan'],
+    'Carpenter': ['carpentry', 'wardrobe', 'wood polish', 'door frame'],
+    'Mason': ['masonry', 'brick wall', 'plastering', 'tiling'],
+    'Painter': ['painting', 'interior wall', 'texture finish', 'living room'],
+    'Welder': ['welding', 'gate', 'grill', 'steel frame'],
+}
+
+
+class GeminiBackend:
+    name = 'gemini'
+
+    def __init__(self, model, genai_module):
+        self.model = model
+        self.genai = genai_module
+
+    def generate_content(self, contents, **kwargs):
+        return self.model.generate_content(contents, **kwargs)
+
+    def upload_file(self, path: str, display_name: str = None):
+        return self.genai.upload_file(path=path, display_name=display_name)
+
+    def get_file(self, name: str):
+        return self.genai.get_file(name)
+
+    def delete_file(self, name: str):
+        return self.genai.delete_file(name)
+
+    def list_files(self) -> list:
+        # list_files pages lazily; materialise it so every request runs inside the client's timeout
+        return list(self.genai.list_files())
+
+
+def _digest(data) -> int:
+    if isinstance(data, str):
+        data = data.encode()
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], 'big')
+
+
+class StubBackend:
+    name = 'stub'
+
+    def __init__(self, latency_ms: float = 300, image_ms: float = 40, audio_ms: float = 20, jitter_ms: float = 100,
+                 error_rate: float = 0.0, error_code: int = 503, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.image_ms = image_ms
+        self.audio_ms = audio_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self._rng = random.Random(seed)
+        self._files = {}
+        self._lock = threading.Lock()
+        # calls per operation and the most generate_content calls seen at once
+        self.stats = {'generate_content': 0, 'upload_file': 0, 'get_file': 0, 'delete_file': 0,
+                      'errors': 0, 'in_flight': 0, 'max_in_flight': 0, 'prompt_tokens': 0, 'output_tokens': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(latency_ms=float(os.getenv('AI_STUB_LATENCY_MS', '300')),
+                   image_ms=float(os.getenv('AI_STUB_IMAGE_MS', '40')),
+                   audio_ms=float(os.getenv('AI_STUB_AUDIO_MS', '20')),
+                   jitter_ms=float(os.getenv('AI_STUB_JITTER_MS', '100')),
+                   error_rate=float(os.getenv('AI_STUB_ERROR_RATE', '0')),
+                   error_code=int(os.getenv('AI_STUB_ERROR_CODE', '503')),
+                   seed=int(os.getenv('AI_STUB_SEED', '0')))
+
+    # ── Files ────────────────────────────────────────────────────────────────
+
+    def upload_file(self, path: str, display_name: str = None):
+        with open(path, 'rb') as f:
+            digest = _digest(f.read())
+        with self._lock:
+            # Numbered by upload count, so concurrent uploads of the same audio get distinct names
+            name = f'files/stub-{digest:016x}-{self.stats["upload_file"]}'
+            uploaded = SimpleNamespace(name=name, display_name=display_name, digest=digest,
+                                       size_bytes=os.path.getsize(path), state=SimpleNamespace(name='ACTIVE'),
+                                       create_time=datetime.now(timezone.utc))
+            self._files[name] = uploaded
+            self.stats['upload_file'] += 1
+        return uploaded
+
+    def get_file(self, name: str):
+        with self._lock:
+            self.stats['get_file'] += 1
+            if name not in self._files:
+                raise api_exceptions.NotFound(f'{name} not found')
+            return self._files[name]
+
+    def delete_file(self, name: str):
+        with self._lock:
+            self.stats['delete_file'] += 1
+            if self._files.pop(name, None) is None:
+                raise api_exceptions.NotFound(f'{name} not found')
+
+    def list_files(self) -> list:
+        with self._lock:
+            return list(self._files.values())
+
+    # ── Generation ───────────────────────────────────────────────────────────
+
+    def _delay_and_fault(self, images: int, audio_seconds: float):
+        with self._lock:
+            delay = (self.latency_ms + self.image_ms * images + self.audio_ms * audio_seconds
+                     + self._rng.uniform(0, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.stats['errors'] += 1
+            raise api_exceptions.from_http_status(self.error_code, 'injected by StubBackend')
+
+    def generate_content(self, contents, generation_config=None, request_options=None, **kwargs):
+        parts = contents if isinstance(contents, list) else [contents]
+        texts = [p for p in parts if isinstance(p, str)]
+        prompt = texts[-1] if texts else ''
+        inline = [p for p in parts if isinstance(p, dict) and 'data' in p]
+        images = [p['data'] for p in inline if not p.get('mime_type', '').startswith('audio/')]
+        # Uploaded files, and inline audio treated the same way
+        files = [p for p in parts if isinstance(p, SimpleNamespace)] + [
+            SimpleNamespace(digest=_digest(p['data']), size_bytes=len(p['data']))
+            for p in inline if p.get('mime_type', '').startswith('audio/')]
+        audio_seconds = sum(f.size_bytes for f in files) / 32000  # 16 kHz mono PCM is 32,000 bytes a second
+        with self._lock:
+            self.stats['generate_content'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+        try:
+            self._delay_and_fault(len(images), audio_seconds)
+            text = self._answer(prompt, images, files)
+            prompt_tokens = (sum(len(t) for t in texts) // 4 + 258 * len(images)
+                             + int(audio_seconds * 32))
+            usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=len(text) // 4)
+            with self._lock:
+                self.stats['prompt_tokens'] += usage.prompt_token_count
+                self.stats['output_tokens'] += usage.candidates_token_count
+            return SimpleNamespace(text=text, usage_metadata=usage)
+        finally:
+            with self._lock:
+                self.stats['in_flight'] -= 1
+
+    def _answer(self, prompt: str, images: list, files: list) -> str:
+        if files and '"transcript"' in prompt and '"profile"' in prompt:
+            transcript = self._transcript(files[0].digest)
+            return json.dumps({'transcript': transcript, 'profile': self._profile(transcript)})
+        if files and 'Transcribe' in prompt:
+            return self._transcript(files[0].digest)
+        if 'Transcript:' in prompt:
+            return json.dumps(self._profile(prompt.split('Transcript:', 1)[1].strip()))
+        if 'labelled Photo 1' in prompt:
+            if 'portfolio' in prompt:
+                results = [{'tags': self._tags(_digest(image))} for image in images]
+            else:
+                results = [self._complaint(_digest(image)) for image in images]
+            return json.dumps([dict(index=i, **r) for i, r in enumerate(results, 1)])
+        if 'repair problem photo' in prompt and images:
+            return json.dumps(self._complaint(_digest(images[0])))
+        return f'stub response {_digest(prompt) % 10000}'
+
+    @staticmethod
+    def _transcript(digest: int) -> str:
+        skill = SKILLS[digest % len(SKILLS)]
+        years = 2 + digest % 19
+        areas = [AREAS[digest % len(AREAS)], AREAS[(digest // 7) % len(AREAS)]]
+        rate = 400 + (digest % 13) * 50
+        return (f'I am a {skill.lower()} with {years} years of experience. I work in {areas[0]} and {areas[1]}. '
+                f'I charge {rate} rupees per day.')
+
+    @staticmethod
+    def _profile(transcript: str) -> dict:
+        lowered = transcript.lower()
+        skill = next((s for s in SKILLS if s.lower() in lowered), 'Other')
+        years = re.search(r'(\d+)\s+years?', lowered)
+        rate = re.search(r'(\d+)\s+(?:rupees|rs)', lowered)
+        areas = [a for a in AREAS if a.lower() in lowered]
+        return {
+            'skill_type': skill,
+            'experience_years': int(years.group(1)) if years else 0,
+            'work_areas': areas,
+            'specializations': PORTFOLIO_TAGS.get(skill, [])[1:3],
+            'daily_rate': int(rate.group(1)) if rate else None,
+            'bio_english': f'{skill} with {years.group(1) if years else "some"} years of experience. '
+                           f'Works in {", ".join(areas) or "the local area"}.',
+        }
+
+    @staticmethod
+    def _tags(digest: int) -> list:
+        tags = PORTFOLIO_TAGS[SKILLS[digest % len(SKILLS)]]
+        return tags[:3 + digest % 2]
+
+    @staticmethod
+    def _complaint(digest: int) -> dict:
+        issue = list(ISSUES)[digest % len(ISSUES)]
+        return {
+            'issue_type': issue,
+            'confidence_score': round(0.6 + (digest % 40) / 100, 2),
+            'suggested_worker_skill': ISSUES[issue],
+            'description_for_worker': f'Photo shows {issue.replace("_", " ")} that needs a {ISSUES[issue].lower()}.',
+        }
+
+
+def bench(task: str, calls: int, concurrency: int) -> dict:
+    """Run ai.py helpers through the configured backend; returns latency percentiles in ms."""
+    import ai
+    if task == 'profile':
+        def one(i):
+            return ai.extract_profile(f'I am a plumber with {i % 20} years of experience in Bandra.', 'Hindi')
+    elif task == 'voice':
+        import wave
+        os.makedirs('uploads/bench', exist_ok=True)
+        paths = []
+        for i in range(8):
+            path = f'uploads/bench/bio{i}.wav'
+            with wave.open(path, 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(16000)
+                w.writeframes(os.urandom(2) * 16000 * (20 + i))  # 20-27 s, like a short voice bio
+            paths.append(path)
+
+        def one(i):
+            return ai.voice_to_profile(paths[i % len(paths)], 'Hindi')
+    else:
+        from PIL import Image
+        os.makedirs('uploads/bench', exist_ok=True)
+        paths = []
+        for i in range(8):
+            path = f'uploads/bench/photo{i}.jpg'
+            Image.new('RGB', (1600, 1200), (i * 30, 90, 160)).save(path, 'JPEG')
+            paths.append(path)
+
+        def one(i):
+            return ai.analyze_photo_batch(paths, 'portfolio')
+
+    from metrics import AI_CLIENT_CALLS
+    before = dict(AI_CLIENT_CALLS.values)
+    latencies = []
+    failures = 0
+
+    def timed(i):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            one(i)
+        except Exception:
+            failures += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(calls)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    # Helpers fall back instead of raising, so report what the client actually saw
+    outcomes = {}
+    for (op, outcome), count in AI_CLIENT_CALLS.values.items():
+        outcomes[outcome] = outcomes.get(outcome, 0) + count - before.get((op, outcome), 0)
+    return {
+        'calls': calls, 'failures': failures, 'seconds': round(elapsed, 2),
+        'calls_per_s': round(calls / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 1),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        'max_ms': round(latencies[-1], 1),
+        'max_in_flight': ai.client.backend.stats['max_in_flight'],
+        'model_calls': ai.client.backend.stats['generate_content'],
+        'prompt_tokens': ai.client.backend.stats['prompt_tokens'],
+        'output_tokens': ai.client.backend.stats['output_tokens'],
+        **{f'client_{k}': v for k, v in sorted(outcomes.items()) if v},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Model backends')
+    commands = parser.add_subparsers(dest='command', required=True)
+    bench_cmd = commands.add_parser('bench', help='drive ai.py through the stub backend')
+    bench_cmd.add_argument('--task', choices=['profile', 'photos', 'voice'], default='profile')
+    bench_cmd.add_argument('--calls', type=int, default=100)
+    bench_cmd.add_argument('--concurrency', type=int, default=8)
+    bench_cmd.add_argument('--latency-ms', type=float)
+    bench_cmd.add_argument('--error-rate', type=float)
+    args = parser.parse_args()
+
+    os.environ['AI_BACKEND'] = 'stub'
+    if args.latency_ms is not None:
+        os.environ['AI_STUB_LATENCY_MS'] = str(args.latency_ms)
+    if args.error_rate is not None:
+        os.environ['AI_STUB_ERROR_RATE'] = str(args.error_rate)
+    stats = bench(args.task, args.calls, args.concurrency)
+    print('Done. ' + ', '.join(f'{k}: {v}' for k, v in stats.items()))
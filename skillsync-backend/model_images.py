@@ -0,0 +1,105 @@
+"""
+Shrinking photos before they are sent to Gemini.
+
+Phone photos arrive at 12 MP or more, as 3-6 MB JPEGs with EXIF (GPS
+position included). Gemini gains nothing from detail above roughly
+1024 px, and it bills images by 768 px tiles. prepare_for_model() does
+the following:
+
+- Decodes with Image.draft(). For JPEG this makes libjpeg decode at 1/2,
+  1/4 or 1/8 scale directly, the largest that still covers the target,
+  so a 4000x3000 photo is never fully decoded.
+- Applies the EXIF orientation, so sideways phone shots are analysed
+  upright.
+- Downsizes to MODEL_IMAGE_EDGE on the longest side.
+- Re-encodes as a baseline JPEG with no metadata, so EXIF and GPS are
+  stripped.
+
+The result is an inline image part ({'mime_type', 'data'}) that
+generate_content accepts directly. Decoding is CPU-bound and releases
+the GIL, so prepare_many() spreads a batch over a small thread pool.
+
+Run from the skillsync-backend directory:
+    python model_images.py measure photo1.jpg photo2.jpg ...   # payload size and time, before vs after
+"""
+import argparse
+import io
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+MODEL_IMAGE_EDGE = int(os.getenv('MODEL_IMAGE_EDGE', '1024'))
+JPEG_QUALITY = 85
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv('MODEL_IMAGE_WORKERS', '4')),
+                           thread_name_prefix='model-images')
+
+
+def prepare_for_model(image_path: str, edge: int = MODEL_IMAGE_EDGE) -> dict:
+    """A downscaled, metadata-free JPEG of image_path as a Gemini inline image part."""
+    with Image.open(image_path) as img:
+        scale = edge / max(img.size)
+        if scale < 1:
+            # Ask for the target size keeping the aspect ratio, so the widest possible reduction applies
+            img.draft('RGB', (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        # Bicubic is plenty for the model and about half the cost of Lanczos at this size
+        img.thumbnail((edge, edge), Image.BICUBIC)
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=JPEG_QUALITY)
+    return {'mime_type': 'image/jpeg', 'data': buf.getvalue()}
+
+
+def prepare_many(image_paths: list, edge: int = MODEL_IMAGE_EDGE) -> list:
+    """prepare_for_model over several images at once, in order."""
+    return list(_pool.map(lambda path: prepare_for_model(path, edge), image_paths))
+
+
+def _full_decode(image_path: str) -> dict:
+    # What ai.analyze_complaint_photo used to send: Image.open() of the raw photo,
+    # which the Gemini SDK re-encodes at full size (genai pil_to_blob)
+    with Image.open(image_path) as img:
+        fmt = 'PNG' if img.format == 'PNG' else 'JPEG'
+        buf = io.BytesIO()
+        img.save(buf, fmt)
+    return {'mime_type': f'image/{fmt.lower()}', 'data': buf.getvalue()}
+
+
+def measure(image_paths: list) -> list:
+    rows = []
+    for path in image_paths:
+        started = time.perf_counter()
+        before = _full_decode(path)
+        full_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        after = prepare_for_model(path)
+        prepared_ms = (time.perf_counter() - started) * 1000
+        rows.append({'path': path, 'file_bytes': os.path.getsize(path),
+                     'before_bytes': len(before['data']), 'before_ms': round(full_ms, 1),
+                     'after_bytes': len(after['data']), 'after_ms': round(prepared_ms, 1)})
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Downscale photos for the model')
+    commands = parser.add_subparsers(dest='command', required=True)
+    measure_cmd = commands.add_parser('measure', help='payload size and preparation time, before vs after')
+    measure_cmd.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    if Image is None:
+        raise SystemExit('[ERROR] Pillow is required: pip install Pillow')
+    rows = measure(args.paths)
+    for r in rows:
+        print(f"{os.path.basename(r['path']):30} {r['before_bytes']:>10,} B {r['before_ms']:>7} ms  ->  "
+              f"{r['after_bytes']:>8,} B {r['after_ms']:>6} ms")
+    before, after = sum(r['before_bytes'] for r in rows), sum(r['after_bytes'] for r in rows)
+    print(f'Total payload {before:,} -> {after:,} bytes ({before / max(after, 1):.1f}x smaller)')
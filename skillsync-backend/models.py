@@ -21,6 +21,7 @@ class Worker(Base):
     location_lat = Column(Float, nullable=True)
     location_lng = Column(Float, nullable=True)
     location_area = Column(String(100), nullable=True)
+    location_source = Column(String(10), nullable=True)  # 'gps' (sent by the client) or 'geocoded' (area centroid)
     voice_bio_path = Column(String(200), nullable=True)
     trust_score = Column(Integer, default=0)
     trust_badge = Column(String(10), default='Red')
@@ -48,6 +49,7 @@ class WorkerPhoto(Base):
     worker_id = Column(String(36), ForeignKey('workers.id'), nullable=False)
     file_path = Column(String(200), nullable=False)
     ai_tags = Column(String(300), nullable=True)
+    analysis_attempts = Column(Integer, nullable=False, default=0)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
 class JobRequest(Base):
@@ -59,6 +61,7 @@ class JobRequest(Base):
     complaint_description = Column(Text, nullable=True)
     ai_issue_type = Column(String(50), nullable=True)
     ai_description = Column(Text, nullable=True)
+    analysis_attempts = Column(Integer, nullable=False, default=0)
     job_status = Column(String(20), default='pending')
     worker_response = Column(String(20), nullable=True)
     dispute_reason = Column(Text, nullable=True)
@@ -68,7 +71,7 @@ class JobRequest(Base):
 class WorkLedger(Base):
     __tablename__ = 'work_ledger'
     id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
-    worker_id = Column(String(36), ForeignKey('workers.id'), nullable=False)
+    worker_id = Column(String(36), ForeignKey('workers.id'), nullable=False, index=True)
     customer_id = Column(String(36), nullable=False)
     job_request_id = Column(String(36), ForeignKey('job_requests.id'), nullable=False)
     job_type = Column(String(50), nullable=False)
@@ -94,7 +97,7 @@ class Call(Base):
     id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
     job_request_id = Column(String(36), ForeignKey('job_requests.id'), nullable=False)
     customer_id = Column(String(36), ForeignKey('customers.id'), nullable=False)
-    worker_id = Column(String(36), ForeignKey('workers.id'), nullable=False)
+    worker_id = Column(String(36), ForeignKey('workers.id'), nullable=False, index=True)
     call_start = Column(DateTime, nullable=True)
     call_end = Column(DateTime, nullable=True)
     duration_seconds = Column(Integer, nullable=True)
@@ -107,7 +110,7 @@ class EmergencyIncident(Base):
     __tablename__ = 'emergency_incidents'
     id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
     customer_id = Column(String(36), ForeignKey('customers.id'), nullable=False)
-    worker_id = Column(String(36), ForeignKey('workers.id'), nullable=False)
+    worker_id = Column(String(36), ForeignKey('workers.id'), nullable=False, index=True)
     job_request_id = Column(String(36), ForeignKey('job_requests.id'), nullable=True)
     location_lat = Column(Float, nullable=False)
     location_lng = Column(Float, nullable=False)
@@ -126,4 +129,72 @@ class IVRSession(Base):
     collected_data = Column(Text, default='{}')
     completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class OTPCode(Base):
+    __tablename__ = 'otp_codes'
+    purpose = Column(String(20), primary_key=True)        # login / aadhaar
+    phone = Column(String(20), primary_key=True)
+    code = Column(String(10), nullable=False)
+    data = Column(Text, default='{}')                     # JSON extras, e.g. aadhaar_last4
+    attempts = Column(Integer, nullable=False, default=0)  # wrong guesses so far
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class Area(Base):
+    __tablename__ = 'areas'
+    id = Column(String(64), primary_key=True)  # canonical id, e.g. 'kozhikode-beach'
+    name = Column(String(100), nullable=False)
+    location_lat = Column(Float, nullable=True)
+    location_lng = Column(Float, nullable=True)
+    source = Column(String(20), default='workers')  # 'gazetteer' for data/gazetteer.csv rows
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AreaName(Base):
+    __tablename__ = 'area_names'
+    name = Column(String(100), primary_key=True)  # normalised spelling
+    area_id = Column(String(64), ForeignKey('areas.id'), nullable=False, index=True)
+    trigram_count = Column(Integer, nullable=False)
+
+class AreaTrigram(Base):
+    __tablename__ = 'area_trigrams'
+    # (trigram, name) primary key doubles as the trigram lookup index
+    trigram = Column(String(3), primary_key=True)
+    name = Column(String(100), ForeignKey('area_names.name'), primary_key=True)
+
+class WorkerArea(Base):
+    __tablename__ = 'worker_areas'
+    worker_id = Column(String(36), ForeignKey('workers.id'), primary_key=True)
+    area_id = Column(String(64), ForeignKey('areas.id'), nullable=False, index=True)
+
+class Blob(Base):
+    __tablename__ = 'blobs'
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(200), nullable=False)  # uploads/blobs/ab/cd/<sha256>.<ext>
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_referenced_at = Column(DateTime, nullable=True)  # refreshed by every add_ref; GC falls back to created_at
+
+class PhotoVariant(Base):
+    __tablename__ = 'photo_variants'
+    source_sha256 = Column(String(64), primary_key=True)  # blob the variant was rendered from
+    variant = Column(String(10), primary_key=True)         # thumb / card / full
+    format = Column(String(10), primary_key=True)          # webp / jpeg
+    path = Column(String(200), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AudioRendition(Base):
+    __tablename__ = 'audio_renditions'
+    source_sha256 = Column(String(64), primary_key=True)  # blob the rendition was transcoded from
+    path = Column(String(200), nullable=False)            # the Opus file, itself a blob
+    codec = Column(String(20), nullable=False)
+    bitrate_kbps = Column(Integer, nullable=False)
+    duration_seconds = Column(Float, nullable=False)
+    loudness_dbfs = Column(Float, nullable=True)          # RMS level; None for digital silence
+    peak_dbfs = Column(Float, nullable=True)
+    size = Column(Integer, nullable=False)
+    source_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,225 @@
+"""
+One-time passwords with expiry, shared by every worker process.
+
+auth.OTP_STORE (login and IVR OTPs) and _otp_store in
+src/routers/ai_call.py (Aadhaar OTPs) used to be plain dicts. They never
+expired, grew with every phone number, and each uvicorn worker had its
+own. A verify request that the load balancer sent to a different process
+than the send request always failed. Now:
+
+- Codes live in the otp_codes table (models.OTPCode), keyed by
+  (purpose, phone), in the DATABASE_URL database (src/database.py), not
+  the root database.py's local SQLite file. On Render that is the shared
+  Postgres, so a verify that reaches another instance finds the code.
+  Without DATABASE_URL it is ./skillsync.db, shared only by the
+  processes on one host. start() creates the table there. put()
+  upserts, so sending a new code replaces the old one and restarts its
+  OTP_TTL_SECONDS.
+- get() only returns codes that have not expired, so a code is dead the
+  moment its TTL passes, whether or not it has been swept yet.
+- A code works once. verify() uses it up in the same statement that
+  checks it: a conditional DELETE (or, when data is kept, a conditional
+  UPDATE that blanks the code), so two requests racing with the right
+  code cannot both succeed. Wrong guesses are counted in attempts, and
+  after MAX_ATTEMPTS of them the code is deleted and a new one has to be
+  sent.
+- Expired rows are deleted by a sweep, so the table only holds live
+  codes. Each process keeps a heap of the expiry times it has issued. A
+  single sweeper thread sleeps until the earliest one, and is woken early
+  when a shorter-lived code arrives. It then deletes every expired row
+  through the expires_at index, including rows that other processes
+  issued. The thread exits when the heap is empty. The heap holds one
+  entry per code issued within the last TTL. start() sweeps once on
+  startup for rows left by processes that have died.
+
+Run from the skillsync-backend directory:
+    python otp_store.py sweep            # delete expired codes now
+"""
+import argparse
+import heapq
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from database import dialect_insert
+from src.database import SessionLocal, engine
+from metrics import OTP_EXPIRED
+from models import OTPCode
+
+load_dotenv()
+
+OTP_TTL_SECONDS = int(os.getenv('OTP_TTL_SECONDS', '300'))
+OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', '5'))
+SWEEP_SLACK_SECONDS = 1.0   # let codes expiring close together go in one DELETE
+
+_lock = threading.Lock()
+_expiries = []  # heap of expires_at for codes issued by this process
+_running = False
+_wake = threading.Event()  # set when a code expires sooner than the one the sweeper waits for
+
+
+def put(purpose: str, phone: str, code: str, data: dict = None, ttl: int = None):
+    """Store (or replace) the code for phone; it expires after ttl seconds."""
+    expires_at = datetime.utcnow() + timedelta(seconds=OTP_TTL_SECONDS if ttl is None else ttl)
+    row = dict(purpose=purpose, phone=phone, code=code, data=json.dumps(data or {}), attempts=0,
+               expires_at=expires_at)
+    db = SessionLocal()
+    try:
+        stmt = dialect_insert(db)(OTPCode.__table__).values(**row)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=['purpose', 'phone'],
+            set_={c: getattr(stmt.excluded, c) for c in ('code', 'data', 'attempts', 'expires_at')}
+        ))
+        db.commit()
+    finally:
+        db.close()
+    _schedule_sweep(expires_at)
+
+
+def get(purpose: str, phone: str):
+    """{'code', 'data', 'expires_at'} for phone's live code, or None if there is none or it expired."""
+    db = SessionLocal()
+    try:
+        row = db.query(OTPCode).filter(
+            OTPCode.purpose == purpose, OTPCode.phone == phone, OTPCode.expires_at > datetime.utcnow()
+        ).first()
+        if row is None:
+            return None
+        return {'code': row.code, 'data': json.loads(row.data or '{}'), 'expires_at': row.expires_at}
+    finally:
+        db.close()
+
+
+def update(purpose: str, phone: str, **data) -> bool:
+    """Merge data into a live code's extras, keeping its expiry. False if there is no live code."""
+    db = SessionLocal()
+    try:
+        row = db.query(OTPCode).filter(
+            OTPCode.purpose == purpose, OTPCode.phone == phone, OTPCode.expires_at > datetime.utcnow()
+        ).first()
+        if row is None:
+            return False
+        row.data = json.dumps({**json.loads(row.data or '{}'), **data})
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def verify(purpose: str, phone: str, code: str, **data) -> bool:
+    """True if code is phone's live code, which is then used up.
+
+    With data, the row stays (merged with data, its code blanked) for later get() calls; without, it is deleted.
+    A wrong code counts as an attempt, and the OTP_MAX_ATTEMPTS-th wrong code deletes the row.
+    """
+    code = (code or '').strip()
+    db = SessionLocal()
+    try:
+        live = db.query(OTPCode).filter(
+            OTPCode.purpose == purpose, OTPCode.phone == phone, OTPCode.expires_at > datetime.utcnow(),
+            OTPCode.code != ''
+        )
+        row = live.first()
+        if row is None:
+            return False
+        if code and row.code == code:
+            matching = live.filter(OTPCode.code == code)
+            if data:
+                used = matching.update({'code': '', 'data': json.dumps({**json.loads(row.data or '{}'), **data})},
+                                       synchronize_session=False)
+            else:
+                used = matching.delete(synchronize_session=False)
+            db.commit()
+            return used == 1
+        live.update({'attempts': OTPCode.attempts + 1}, synchronize_session=False)
+        live.filter(OTPCode.attempts >= OTP_MAX_ATTEMPTS).delete(synchronize_session=False)
+        db.commit()
+        return False
+    finally:
+        db.close()
+
+
+# ── Expiry sweep ─────────────────────────────────────────────────────────────
+
+def sweep() -> int:
+    """Delete every expired code, whichever process issued it; returns the number deleted."""
+    db = SessionLocal()
+    try:
+        deleted = db.query(OTPCode).filter(OTPCode.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    if deleted:
+        OTP_EXPIRED.inc(amount=deleted)
+    return deleted
+
+
+def _sweeper():
+    global _running
+    while True:
+        with _lock:
+            if not _expiries:
+                _running = False
+                return
+            wait = (_expiries[0] - datetime.utcnow()).total_seconds() + SWEEP_SLACK_SECONDS
+        if wait > 0:
+            _wake.wait(wait)
+            _wake.clear()
+            continue
+        now = datetime.utcnow()
+        with _lock:
+            while _expiries and _expiries[0] <= now:
+                heapq.heappop(_expiries)
+        try:
+            sweep()
+        except Exception as e:
+            print(f'[WARNING] OTP expiry sweep failed: {e}')
+
+
+def _schedule_sweep(expires_at: datetime):
+    global _running
+    with _lock:
+        heapq.heappush(_expiries, expires_at)
+        if _running:
+            if _expiries[0] == expires_at:
+                _wake.set()
+            return
+        _running = True
+    threading.Thread(target=_sweeper, name='otp-sweeper', daemon=True).start()
+
+
+def pending() -> int:
+    """Expiry times this process is still waiting to sweep."""
+    with _lock:
+        return len(_expiries)
+
+
+def _startup_sweep():
+    try:
+        deleted = sweep()
+        if deleted:
+            print(f'[OK] Removed {deleted} expired OTPs')
+    except Exception as e:
+        print(f'[WARNING] OTP startup sweep failed: {e}')
+
+
+def ensure_table():
+    # otp_codes is a models.Base table, but lives in the DATABASE_URL database that every host shares
+    OTPCode.__table__.create(bind=engine, checkfirst=True)
+
+
+def start():
+    """Create the table if needed, then delete codes that expired while no process was running."""
+    ensure_table()
+    threading.Thread(target=_startup_sweep, name='otp-startup-sweep', daemon=True).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shared OTP store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('sweep', help='delete expired codes now')
+    args = parser.parse_args()
+
+    ensure_table()
+    print(f'Done. expired codes deleted: {sweep()}')
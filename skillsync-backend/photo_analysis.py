@@ -0,0 +1,208 @@
+"""
+Batched AI analysis of uploaded photos.
+
+Portfolio photos (WorkerPhoto) never got ai_tags, and complaint photos
+were analysed one per Gemini call, or not at all in src/routers/jobs.py.
+This stage finds the pending images:
+
+  - WorkerPhoto rows with ai_tags NULL
+  - JobRequest rows with a complaint photo but no ai_issue_type
+
+in both cases with fewer than PHOTO_ANALYSIS_MAX_ATTEMPTS failed attempts.
+
+It groups them by task into multi-image requests of PHOTO_ANALYSIS_BATCH
+images each (ai.analyze_photo_batch). Every image is downscaled to the
+model's useful resolution before sending. Up to
+PHOTO_ANALYSIS_CONCURRENCY requests run at once.
+
+Rows that share a blob (the same photo uploaded twice) are analysed once.
+A batch that the model fails, or answers with something unparseable,
+adds one to its rows' analysis_attempts and leaves them for the next
+pass, so a batch that always fails is billed at most
+PHOTO_ANALYSIS_MAX_ATTEMPTS times. AIUnavailable (breaker open, no free
+slot, timeout) costs no attempt, so an outage never retires a photo.
+Images that cannot be decoded are settled at once: portfolio photos get
+empty tags, and complaint photos are given their last attempt.
+
+Upload handlers call schedule_analysis() after committing. At most one
+drain runs at a time, and a request that arrives mid-drain queues exactly
+one more pass. Without GEMINI_API_KEY nothing is analysed; rows stay
+pending until a key is configured.
+
+Run from the skillsync-backend directory:
+    python photo_analysis.py run          # analyse everything pending now
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+import ai
+from ai_client import AIUnavailable
+from database import SessionLocal
+from models import WorkerPhoto, JobRequest
+
+load_dotenv()
+
+BATCH_SIZE = int(os.getenv('PHOTO_ANALYSIS_BATCH', '8'))
+CONCURRENCY = int(os.getenv('PHOTO_ANALYSIS_CONCURRENCY', '2'))
+MAX_ATTEMPTS = int(os.getenv('PHOTO_ANALYSIS_MAX_ATTEMPTS', '3'))
+MAX_PENDING = 500  # rows picked up per pass
+TAGS_LENGTH = 300  # WorkerPhoto.ai_tags
+
+_coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix='photo-analysis')
+_state_lock = threading.Lock()
+_running = False
+_rerun = False
+
+
+def pending_photos(db: Session, limit: int = MAX_PENDING) -> dict:
+    """{task: [paths]} of distinct images still waiting for analysis."""
+    portfolio = db.query(WorkerPhoto.file_path).filter(
+        WorkerPhoto.ai_tags.is_(None),
+        WorkerPhoto.analysis_attempts < MAX_ATTEMPTS
+    ).limit(limit)
+    complaints = db.query(JobRequest.complaint_photo_path).filter(
+        JobRequest.complaint_photo_path.isnot(None),
+        JobRequest.ai_issue_type.is_(None),
+        JobRequest.analysis_attempts < MAX_ATTEMPTS
+    ).limit(limit)
+    return {
+        'portfolio': sorted({path for (path,) in portfolio}),
+        'complaint': sorted({path for (path,) in complaints}),
+    }
+
+
+def _readable(path: str) -> bool:
+    try:
+        with ai.Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
+def apply_results(db: Session, task: str, results: dict):
+    """Write {path: result} back to every row pointing at each path."""
+    for path, result in results.items():
+        if task == 'portfolio':
+            tags = [str(t).strip().lower() for t in (result.get('tags') or []) if str(t).strip()]
+            db.query(WorkerPhoto).filter(WorkerPhoto.file_path == path, WorkerPhoto.ai_tags.is_(None)).update(
+                {'ai_tags': ','.join(tags)[:TAGS_LENGTH]}, synchronize_session=False
+            )
+        else:
+            db.query(JobRequest).filter(
+                JobRequest.complaint_photo_path == path, JobRequest.ai_issue_type.is_(None)
+            ).update({
+                'ai_issue_type': (result.get('issue_type') or 'other')[:50],
+                'ai_description': result.get('description_for_worker'),
+            }, synchronize_session=False)
+    db.commit()
+
+
+def record_failure(db: Session, task: str, paths: list, final: bool = False):
+    """Count a failed attempt on every still-pending row at paths; final=True gives up on them."""
+    model, path_column, done_column = ((WorkerPhoto, WorkerPhoto.file_path, WorkerPhoto.ai_tags)
+                                       if task == 'portfolio' else
+                                       (JobRequest, JobRequest.complaint_photo_path, JobRequest.ai_issue_type))
+    attempts = MAX_ATTEMPTS if final else model.analysis_attempts + 1
+    db.query(model).filter(path_column.in_(paths), done_column.is_(None)).update(
+        {'analysis_attempts': attempts}, synchronize_session=False
+    )
+    db.commit()
+
+
+def analyze_batch(task: str, paths: list) -> int:
+    """Analyse one batch with its own session; returns the number of images written."""
+    readable = [p for p in paths if os.path.exists(p) and _readable(p)]
+    unreadable = [p for p in paths if p not in readable]
+    results = {p: {} for p in unreadable if task == 'portfolio'}
+    db = SessionLocal()
+    try:
+        if task != 'portfolio' and unreadable:
+            record_failure(db, task, unreadable, final=True)
+        if readable:
+            try:
+                results.update(zip(readable, ai.analyze_photo_batch(readable, task)))
+            except AIUnavailable:
+                raise  # breaker open or no free slot: the next pass tries again, at no cost to the rows
+            except Exception:
+                record_failure(db, task, readable)
+                raise
+        apply_results(db, task, results)
+    finally:
+        db.close()
+    return len(results)
+
+
+def run_pending(batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY) -> dict:
+    """One pass over everything pending, batches running concurrently. Returns counts."""
+    stats = {'images': 0, 'batches': 0, 'analysed': 0, 'failed_batches': 0}
+    if ai.model is None or ai.Image is None:
+        return stats
+    db = SessionLocal()
+    try:
+        pending = pending_photos(db)
+    finally:
+        db.close()
+
+    batches = [(task, paths[i:i + batch_size])
+               for task, paths in pending.items()
+               for i in range(0, len(paths), batch_size)]
+    stats['images'] = sum(len(paths) for _, paths in batches)
+    stats['batches'] = len(batches)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='photo-analysis-batch') as pool:
+        futures = [(pool.submit(analyze_batch, task, paths), paths) for task, paths in batches]
+        for future, paths in futures:
+            try:
+                stats['analysed'] += future.result()
+            except Exception as e:
+                stats['failed_batches'] += 1
+                print(f'[WARNING] Photo analysis batch of {len(paths)} failed: {e}')
+    return stats
+
+
+def _drain():
+    global _running, _rerun
+    while True:
+        try:
+            stats = run_pending()
+            if stats['images']:
+                print(f'[OK] Photo analysis: {stats["analysed"]}/{stats["images"]} images in {stats["batches"]} batches')
+        except Exception as e:
+            print(f'[WARNING] Photo analysis pass failed: {e}')
+        with _state_lock:
+            if not _rerun:
+                _running = False
+                return
+            _rerun = False
+
+
+def schedule_analysis():
+    """Analyse pending photos in the background; call after committing new ones."""
+    global _running, _rerun
+    if ai.model is None:
+        return
+    with _state_lock:
+        if _running:
+            _rerun = True
+            return
+        _running = True
+    _coordinator.submit(_drain)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched AI analysis of uploaded photos')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='analyse all pending portfolio and complaint photos')
+    run.add_argument('--batch', type=int, default=BATCH_SIZE)
+    run.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+
+    if ai.model is None:
+        raise SystemExit('[ERROR] GEMINI_API_KEY is required')
+    from database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    stats = run_pending(args.batch, args.concurrency)
+    print('Done. ' + ', '.join(f'{k}: {v}' for k, v in stats.items()))
@@ -0,0 +1,288 @@
+"""
+Opt-in per-request profiling.
+
+For every HTTP request this records wall time, the number of SQL statements
+and the time spent in them (SQLAlchemy cursor events on every engine, so
+both database.py and src/database.py are covered) and the time spent in the
+Gemini helpers in ai.py. Each request is logged as one JSON line:
+
+  [PROFILE] {"method": "GET", "route": "/api/workers/search", "status": 200,
+             "ms": 41.2, "sql": 7, "sql_ms": 9.8, "ai": 0, "ai_ms": 0.0}
+
+The same SQL text running PROFILE_N_PLUS_ONE or more times in one request
+(a query inside a loop, like the per-worker ledger lookup in search) is
+reported under "n_plus_one" and logged as a [WARNING].
+
+Settings (environment or .env):
+  PROFILE_REQUESTS=1     enable the middleware (off by default)
+  DEBUG=True             also return the numbers as Server-Timing / X-SQL-*
+                         response headers
+  PROFILE_N_PLUS_ONE=5   repeat count that flags a statement
+  PROFILE_SLOW_MS=0      when > 0, sample stacks every PROFILE_INTERVAL_MS
+                         and write a collapsed-stack file (flamegraph.pl /
+                         speedscope format) to PROFILE_DIR for requests
+                         slower than this
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import wraps
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '').lower() in ('1', 'true', 'yes')
+DEBUG_HEADERS = os.getenv('DEBUG', '').lower() in ('1', 'true', 'yes')
+N_PLUS_ONE_THRESHOLD = int(os.getenv('PROFILE_N_PLUS_ONE', '5'))
+SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '0'))
+SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+_current = ContextVar('request_profile', default=None)
+_in_ai = ContextVar('in_timed_ai', default=False)
+
+
+class RequestProfile:
+    def __init__(self, method: str = '', route: str = ''):
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.elapsed = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.ai_count = 0
+        self.ai_time = 0.0
+        self.threads = {threading.get_ident()}
+
+    def finish(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def n_plus_one(self) -> list:
+        return [
+            {'count': n, 'statement': ' '.join(sql.split())[:200]}
+            for sql, n in self.statements.most_common()
+            if n >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def to_dict(self) -> dict:
+        data = {
+            'method': self.method,
+            'route': self.route,
+            'ms': round((self.elapsed or 0) * 1000, 1),
+            'sql': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'ai': self.ai_count,
+            'ai_ms': round(self.ai_time * 1000, 1),
+        }
+        repeated = self.n_plus_one()
+        if repeated:
+            data['n_plus_one'] = repeated
+        return data
+
+    def headers(self) -> list:
+        timing = (
+            f'total;dur={(self.elapsed or 0) * 1000:.1f}, '
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries", '
+            f'ai;dur={self.ai_time * 1000:.1f};desc="{self.ai_count} calls"'
+        )
+        headers = [
+            (b'server-timing', timing.encode()),
+            (b'x-sql-queries', str(self.sql_count).encode()),
+            (b'x-sql-ms', f'{self.sql_time * 1000:.1f}'.encode()),
+        ]
+        repeated = self.n_plus_one()
+        if repeated:
+            headers.append((b'x-n-plus-one', str(repeated[0]['count']).encode()))
+        return headers
+
+
+def current_profile():
+    return _current.get()
+
+
+def start_profile(method: str = '', route: str = '') -> RequestProfile:
+    """Start collecting for the current context; use outside HTTP (scripts, tests)."""
+    install_sql_hooks()
+    profile = RequestProfile(method, route)
+    _current.set(profile)
+    return profile
+
+
+def stop_profile() -> RequestProfile:
+    profile = _current.get()
+    _current.set(None)
+    return profile.finish() if profile else None
+
+
+# ── SQL ──────────────────────────────────────────────────────────────────────
+
+_hooks_installed = False
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    started = conn.info.get('profile_started')
+    if not started:
+        return
+    profile.sql_time += time.perf_counter() - started.pop()
+    profile.sql_count += 1
+    profile.statements[statement] += 1
+    profile.threads.add(threading.get_ident())
+
+def install_sql_hooks():
+    """Listen on the Engine class so every engine, present or future, is counted."""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _hooks_installed = True
+
+
+# ── AI ───────────────────────────────────────────────────────────────────────
+
+def timed_ai(func):
+    """
+    Count a call to an ai.py helper and its duration against the current
+    request. Helpers that call other timed helpers (voice_to_profile falling
+    back to extract_profile) count once, as the outermost call.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or _in_ai.get():
+            return func(*args, **kwargs)
+        profile.threads.add(threading.get_ident())
+        token = _in_ai.set(True)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.ai_time += time.perf_counter() - started
+            profile.ai_count += 1
+            _in_ai.reset(token)
+    return wrapper
+
+
+# ── Sampling profiler for slow requests ──────────────────────────────────────
+
+_IDLE_FILES = ('threading.py', 'selectors.py', 'queue.py', 'base_events.py')
+
+class StackSampler:
+    """
+    Background thread that snapshots every thread's stack at a fixed interval
+    into a ring buffer. A slow request's dump is the samples taken while it
+    ran, on the threads it touched (the event loop plus whichever worker
+    thread ran SQL or AI code for it). Concurrent requests sharing a thread
+    can bleed into each other's dump; the sampler is a debugging aid.
+    """
+    def __init__(self, interval_ms: float = SAMPLE_INTERVAL_MS, max_samples: int = 200_000):
+        self.interval = interval_ms / 1000
+        self.samples = deque(maxlen=max_samples)
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            now = time.time()
+            for ident, frame in sys._current_frames().items():
+                if ident == me or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                self.samples.append((now, ident, ';'.join(reversed(stack))))
+            time.sleep(self.interval)
+
+    def dump(self, profile: RequestProfile, path: str) -> int:
+        ended = profile.wall_started + (profile.elapsed or 0)
+        stacks = Counter(
+            stack for t, ident, stack in list(self.samples)
+            if profile.wall_started <= t <= ended and ident in profile.threads
+        )
+        with open(path, 'w') as f:
+            for stack, n in stacks.items():
+                f.write(f'{stack} {n}\n')
+        return sum(stacks.values())
+
+_sampler = None
+
+
+# ── Middleware ───────────────────────────────────────────────────────────────
+
+class ProfilingMiddleware:
+    """Plain ASGI middleware; add with app.add_middleware(ProfilingMiddleware)."""
+
+    def __init__(self, app, debug_headers: bool = DEBUG_HEADERS, slow_ms: float = SLOW_MS):
+        global _sampler
+        self.app = app
+        self.debug_headers = debug_headers
+        self.slow_ms = slow_ms
+        install_sql_hooks()
+        if slow_ms > 0:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            _sampler = _sampler or StackSampler()
+            _sampler.start()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope['method'], scope['path'])
+        token = _current.set(profile)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                profile.finish()
+                if self.debug_headers:
+                    message.setdefault('headers', [])
+                    message['headers'] = list(message['headers']) + profile.headers()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            profile.finish()
+            # FastAPI puts the matched route into the scope; log the template, not the raw path
+            route = scope.get('route')
+            profile.route = getattr(route, 'path', profile.route)
+            self.report(profile, status)
+
+    def report(self, profile: RequestProfile, status: int):
+        data = profile.to_dict()
+        data['status'] = status
+        if self.slow_ms > 0 and data['ms'] >= self.slow_ms and _sampler is not None:
+            name = f"{int(profile.wall_started * 1000)}-{profile.method}-{profile.route.strip('/').replace('/', '_')}.folded"
+            path = os.path.join(PROFILE_DIR, name.replace('{', '').replace('}', ''))
+            if _sampler.dump(profile, path):
+                data['stacks'] = path
+        print(f'[PROFILE] {json.dumps(data)}')
+        for repeated in data.get('n_plus_one', []):
+            print(f"[WARNING] N+1 on {profile.method} {profile.route}: "
+                  f"{repeated['count']}x {repeated['statement']}")
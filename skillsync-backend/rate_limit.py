@@ -0,0 +1,207 @@
+"""
+Token-bucket rate limits for OTP sends and logins.
+
+/api/auth/send-otp, /api/ai-call/generate-otp, /api/auth/customer/login,
+the OTP verify endpoints and the IVR's OTP steps (/api/ivr/respond)
+had no throttling. One client could issue
+OTPs for any number of phones, or guess passwords and six-digit codes as
+fast as the server answered. Each endpoint now calls throttle() first,
+before it queries the database or hashes a password:
+
+- Every scope has two buckets: one keyed by the account (phone or email)
+  and one by client IP. A request takes one token from each. If either
+  bucket is empty, neither is charged and the request gets 429 with
+  Retry-After set to the seconds until a token is back.
+- A bucket holds up to capacity tokens and refills continuously at
+  capacity per period. This allows a short burst, then a steady rate.
+  There is no window boundary to game. The limits are set with
+  RATE_LIMIT_OTP_ACCOUNT, RATE_LIMIT_OTP_IP, RATE_LIMIT_LOGIN_ACCOUNT and
+  RATE_LIMIT_LOGIN_IP, each written as "capacity/seconds".
+- Buckets are shared by every worker process. With
+  RATE_LIMIT_STORE=sqlite (the default) they are rows in a small SQLite
+  file (RATE_LIMIT_DB), kept apart from the application database in WAL
+  mode without fsync. A check is one BEGIN IMMEDIATE transaction: two
+  primary-key reads and two upserts. Every SWEEP_EVERY checks, buckets
+  that have refilled completely are deleted through an index on the time
+  they become full. The file therefore only holds clients that are
+  currently limited. RATE_LIMIT_STORE=memory keeps buckets per process,
+  for tests and single-worker runs.
+
+Client IPs come from request.client. Behind RATE_LIMIT_PROXY_HOPS
+trusted proxies (1 on Render, see render.yaml), they come from the
+X-Forwarded-For entry that many places from the right instead. That is
+the address the outermost trusted proxy saw. Entries to its left are
+whatever the client sent, so rotating them does not escape a bucket.
+(uvicorn's --forwarded-allow-ips "*" takes the leftmost entry, which is
+why it is not used.)
+
+skillsync_rate_limited_total{scope} counts refused requests.
+
+Run from the skillsync-backend directory:
+    python rate_limit.py measure          # cost of one check against the shared store
+"""
+import argparse
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from fastapi import HTTPException, Request
+from dotenv import load_dotenv
+from metrics import RATE_LIMITED
+
+load_dotenv()
+
+
+def _limit(spec: str) -> tuple:
+    """'3/300' -> (capacity 3, refill rate per second)."""
+    capacity, period = spec.split('/')
+    return int(capacity), int(capacity) / float(period)
+
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'sqlite')
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB') or os.path.join(tempfile.gettempdir(), 'skillsync-ratelimit.db')
+LIMITS = {
+    ('otp', 'account'): _limit(os.getenv('RATE_LIMIT_OTP_ACCOUNT', '3/300')),
+    ('otp', 'ip'): _limit(os.getenv('RATE_LIMIT_OTP_IP', '20/300')),
+    ('login', 'account'): _limit(os.getenv('RATE_LIMIT_LOGIN_ACCOUNT', '5/300')),
+    ('login', 'ip'): _limit(os.getenv('RATE_LIMIT_LOGIN_IP', '30/300')),
+}
+PROXY_HOPS = int(os.getenv('RATE_LIMIT_PROXY_HOPS', '0'))
+SWEEP_EVERY = 1000
+
+
+def _refill(state, capacity: int, rate: float, now: float) -> float:
+    if state is None:
+        return float(capacity)
+    tokens, updated = state
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBuckets:
+    """Buckets in this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated)
+        self._checks = 0
+
+    def take(self, buckets: list, now: float) -> float:
+        """Take a token from each (key, capacity, rate) bucket; 0 if taken, else seconds until possible."""
+        with self._lock:
+            levels = [_refill(self._buckets.get(key), capacity, rate, now) for key, capacity, rate in buckets]
+            wait = max((1 - level) / rate for level, (_, _, rate) in zip(levels, buckets))
+            spend = 1 if wait <= 0 else 0
+            for level, (key, _, _) in zip(levels, buckets):
+                self._buckets[key] = (level - spend, now)
+            self._checks += 1
+            if self._checks % SWEEP_EVERY == 0:
+                self._sweep(now)
+        return max(wait, 0)
+
+    def _sweep(self, now: float):
+        for key, (tokens, updated) in list(self._buckets.items()):
+            scope, kind, _ = key.split(':', 2)
+            capacity, rate = LIMITS.get((scope, kind), (0, 0))
+            if tokens + (now - updated) * rate >= capacity:
+                del self._buckets[key]
+
+
+class SQLiteBuckets:
+    """Buckets in a SQLite file, shared by every process that opens it."""
+
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._checks = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # losing the last moments of rate state in a crash is harmless
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)')
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets: list, now: float) -> float:
+        """Take a token from each (key, capacity, rate) bucket; 0 if taken, else seconds until possible."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key, capacity, rate in buckets:
+                state = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                levels.append(_refill(state, capacity, rate, now))
+            wait = max((1 - level) / rate for level, (_, _, rate) in zip(levels, buckets))
+            spend = 1 if wait <= 0 else 0
+            conn.executemany(
+                'INSERT INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, '
+                'full_at = excluded.full_at',
+                [(key, level - spend, now, now + (capacity - level + spend) / rate)
+                 for level, (key, capacity, rate) in zip(levels, buckets)])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._checks += 1
+        if self._checks % SWEEP_EVERY == 0:
+            conn.execute('DELETE FROM buckets WHERE full_at <= ?', (now,))
+        return max(wait, 0)
+
+
+store = SQLiteBuckets() if RATE_LIMIT_STORE == 'sqlite' else MemoryBuckets()
+
+
+def client_ip(request: Request) -> str:
+    if PROXY_HOPS:
+        hops = [h.strip() for h in ','.join(request.headers.getlist('x-forwarded-for')).split(',') if h.strip()]
+        if len(hops) >= PROXY_HOPS:
+            return hops[-PROXY_HOPS]
+    return request.client.host if request.client else 'unknown'
+
+
+def too_many(retry_after: float) -> HTTPException:
+    seconds = max(1, math.ceil(retry_after))
+    return HTTPException(status_code=429, detail=f'Too many attempts. Try again in {seconds} seconds.',
+                         headers={'Retry-After': str(seconds)})
+
+
+def throttle(request: Request, scope: str, account: str):
+    """Charge one attempt at scope ('otp' or 'login') to account and the client IP; raises 429 when over the limit."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    account = (account or '').strip().lower()
+    buckets = [(f'{scope}:{kind}:{value}', *LIMITS[(scope, kind)])
+               for kind, value in (('account', account), ('ip', client_ip(request)))]
+    try:
+        wait = store.take(buckets, time.time())
+    except sqlite3.Error as e:
+        # A broken limiter must not lock everyone out of logging in
+        print(f'[WARNING] Rate limit check failed, allowing request: {e}')
+        return
+    if wait > 0:
+        RATE_LIMITED.inc(scope)
+        raise too_many(wait)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OTP and login rate limits')
+    commands = parser.add_subparsers(dest='command', required=True)
+    measure = commands.add_parser('measure', help='cost of one check against the shared store')
+    measure.add_argument('--checks', type=int, default=5000)
+    args = parser.parse_args()
+
+    buckets = SQLiteBuckets()
+    started = time.perf_counter()
+    for i in range(args.checks):
+        buckets.take([(f'login:account:bench{i % 500}', 5, 1 / 60), (f'login:ip:10.0.{i % 250}.1', 30, 0.1)],
+                     time.time())
+    per_check = (time.perf_counter() - started) / args.checks
+    print(f'Done. checks: {args.checks}, store: {buckets.path}, per check: {per_check * 1e6:.0f} us')
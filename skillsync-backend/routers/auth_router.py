@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Worker, Customer
 from auth import send_otp, verify_otp, create_token, hash_password, verify_password
 from pydantic import BaseModel
 from uuid import uuid4
+from rate_limit import throttle
 
 router = APIRouter()
 
@@ -18,9 +19,10 @@ class OTPVerify(BaseModel):
     role: str
 
 @router.post('/send-otp')
-def send_otp_endpoint(req: OTPRequest):
+def send_otp_endpoint(req: OTPRequest, request: Request):
     if req.role not in ['worker', 'customer']:
         raise HTTPException(status_code=400, detail="role must be 'worker' or 'customer'")
+    throttle(request, 'otp', req.phone)
     send_otp(req.phone)
     return {
         'success': True,
@@ -53,7 +55,8 @@ def customer_register(req: CustomerRegister, db: Session = Depends(get_db)):
     return {'access_token': token, 'token_type': 'bearer', 'user_id': customer.id, 'name': customer.name, 'email': customer.email}
 
 @router.post('/customer/login')
-def customer_login(req: CustomerLogin, db: Session = Depends(get_db)):
+def customer_login(req: CustomerLogin, request: Request, db: Session = Depends(get_db)):
+    throttle(request, 'login', req.email)
     customer = db.query(Customer).filter(Customer.email == req.email).first()
     if not customer or not customer.password_hash or not verify_password(req.password, customer.password_hash):
         raise HTTPException(status_code=401, detail='Invalid email or password')
@@ -61,10 +64,11 @@ def customer_login(req: CustomerLogin, db: Session = Depends(get_db)):
     return {'access_token': token, 'token_type': 'bearer', 'user_id': customer.id, 'name': customer.name, 'email': customer.email}
 
 @router.post('/verify-otp')
-def verify_otp_endpoint(req: OTPVerify, db: Session = Depends(get_db)):
+def verify_otp_endpoint(req: OTPVerify, request: Request, db: Session = Depends(get_db)):
     if req.role not in ['worker', 'customer']:
         raise HTTPException(status_code=400, detail="role must be 'worker' or 'customer'")
 
+    throttle(request, 'login', req.phone)
     if not verify_otp(req.phone, req.otp):
         raise HTTPException(status_code=400, detail='Invalid OTP')
 
@@ -1,14 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Customer
-from auth import verify_token
+from auth import Principal, current_user
 from pydantic import BaseModel
 from typing import Optional
 
 router = APIRouter()
-security = HTTPBearer()
 
 class CustomerRegister(BaseModel):
     name: str
@@ -21,11 +19,10 @@ class CustomerRegister(BaseModel):
 @router.post('/register')
 def register_customer(
     data: CustomerRegister,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
-    customer = db.query(Customer).filter(Customer.id == payload['sub']).first()
+    customer = db.query(Customer).filter(Customer.id == user.id).first()
     if not customer:
         raise HTTPException(status_code=404, detail='Customer not found. Please verify OTP first.')
     for key, value in data.dict(exclude_none=True).items():
@@ -1,15 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import EmergencyIncident, Worker, Customer
-from auth import verify_token
+from auth import Principal, current_user
 from pydantic import BaseModel
 from typing import Optional
 from uuid import uuid4
 
 router = APIRouter()
-security = HTTPBearer()
 
 POLICE_STATION = {
     'name': 'Kozhikode Central Police Station',
@@ -25,16 +23,15 @@ class EmergencyTrigger(BaseModel):
 @router.post('/trigger')
 def trigger_emergency(
     data: EmergencyTrigger,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
-    customer = db.query(Customer).filter(Customer.id == payload['sub']).first()
+    customer = db.query(Customer).filter(Customer.id == user.id).first()
     worker = db.query(Worker).filter(Worker.id == data.worker_id).first()
 
     incident = EmergencyIncident(
         id=str(uuid4()),
-        customer_id=payload['sub'],
+        customer_id=user.id,
         worker_id=data.worker_id,
         job_request_id=data.job_request_id,
         location_lat=data.location_lat,
@@ -69,10 +66,9 @@ def trigger_emergency(
 @router.get('/{incident_id}')
 def get_incident(
     incident_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     incident = db.query(EmergencyIncident).filter(
         EmergencyIncident.id == incident_id
     ).first()
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database import get_db
 from models import IVRSession, Worker
 from auth import verify_otp, send_otp
+from geocoding import locate_worker
+from rate_limit import throttle
+import otp_store
 from pydantic import BaseModel
 from typing import Optional
 from uuid import uuid4
@@ -53,7 +56,7 @@ def ivr_start(data: IVRStart, db: Session = Depends(get_db)):
     }
 
 @router.post('/respond')
-def ivr_respond(data: IVRRespond, db: Session = Depends(get_db)):
+def ivr_respond(data: IVRRespond, request: Request, db: Session = Depends(get_db)):
     session = db.query(IVRSession).filter(IVRSession.id == data.session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail='IVR session not found')
@@ -86,6 +89,7 @@ def ivr_respond(data: IVRRespond, db: Session = Depends(get_db)):
 
     elif state == 'AADHAAR':
         if data.digit and len(data.digit) == 4 and data.digit.isdigit():
+            throttle(request, 'otp', session.phone)
             collected['aadhaar_last4'] = data.digit
             session.current_state = 'OTP_VERIFY'
             send_otp(session.phone)
@@ -94,10 +98,15 @@ def ivr_respond(data: IVRRespond, db: Session = Depends(get_db)):
             prompt = 'Please enter exactly 4 digits of your Aadhaar'
 
     elif state == 'OTP_VERIFY':
+        throttle(request, 'login', session.phone)
         if verify_otp(session.phone, data.digit):
             session.current_state = 'SKILL'
             prompt = 'Please select your skill: 1-Plumber 2-Electrician 3-Carpenter 4-Mason 5-Painter'
             options = SKILL_MAP
+        elif otp_store.get('login', session.phone) is None:
+            # Expired, or thrown away after too many wrong guesses: a new code needs the Aadhaar step again
+            session.current_state = 'AADHAAR'
+            prompt = 'OTP expired or too many wrong attempts. Enter the last 4 digits of your Aadhaar for a new OTP'
         else:
             prompt = 'Invalid OTP. Please enter the 6-digit OTP sent to your number'
 
@@ -168,6 +177,7 @@ def ivr_respond(data: IVRRespond, db: Session = Depends(get_db)):
                 )
                 db.add(worker)
                 db.flush()
+                locate_worker(db, worker)
                 worker_id = worker.id
                 completed = True
                 session.completed = True
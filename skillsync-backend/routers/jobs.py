@@ -1,19 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from database import get_db
 from models import JobRequest, QRCode, Customer
-from auth import verify_token
+from auth import Principal, current_user
 from ai import analyze_complaint_photo
+from photo_analysis import schedule_analysis
+from file_uploads import safe_extension, MAX_PHOTO_BYTES
+from blob_store import store_upload
 from pydantic import BaseModel
 from typing import Optional
 from uuid import uuid4
 from datetime import datetime, timedelta
-import shutil
-import os
 
 router = APIRouter()
-security = HTTPBearer()
 
 class JobRespond(BaseModel):
     response: str  # 'accepted' or 'declined'
@@ -31,14 +31,13 @@ class JobCreate(BaseModel):
 @router.post('/create')
 async def create_job_json(
     data: JobCreate,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
     desc = data.description or data.complaint_description
     job = JobRequest(
         id=str(uuid4()),
-        customer_id=data.customer_id or payload['sub'],
+        customer_id=data.customer_id or user.id,
         worker_id=data.worker_id,
         complaint_description=desc,
         job_status='pending'
@@ -52,11 +51,10 @@ async def create_job(
     worker_id: str = Form(...),
     complaint_description: Optional[str] = Form(None),
     complaint_photo: Optional[UploadFile] = File(None),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
-    customer_id = payload['sub']
+    customer_id = user.id
 
     # Verify customer exists
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
@@ -73,15 +71,12 @@ async def create_job(
 
     ai_analysis = {}
     if complaint_photo:
+        ext = safe_extension(complaint_photo.filename, 'jpg')
+        filepath = (await store_upload(db, complaint_photo, ext, MAX_PHOTO_BYTES)).path
         try:
-            os.makedirs('uploads/photos', exist_ok=True)
-            ext = complaint_photo.filename.split('.')[-1] if '.' in complaint_photo.filename else 'jpg'
-            filename = f'complaint_{uuid4()}.{ext}'
-            filepath = f'uploads/photos/{filename}'
-            with open(filepath, 'wb') as f:
-                shutil.copyfileobj(complaint_photo.file, f)
             job.complaint_photo_path = filepath
-            ai_result = analyze_complaint_photo(filepath)
+            # Image preparation and the Gemini call block; keep them off the event loop
+            ai_result = await run_in_threadpool(analyze_complaint_photo, filepath)
             job.ai_issue_type = ai_result.get('issue_type')
             job.ai_description = ai_result.get('description_for_worker')
             ai_analysis = ai_result
@@ -91,6 +86,9 @@ async def create_job(
     db.add(job)
     db.commit()
     db.refresh(job)
+    if job.complaint_photo_path and not job.ai_issue_type:
+        # Analysis failed or was unavailable; the batch stage retries it
+        schedule_analysis()
     return {
         'request_id': job.id,
         'status': 'pending',
@@ -100,10 +98,9 @@ async def create_job(
 @router.get('/worker/{worker_id}')
 def get_worker_jobs(
     worker_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     jobs = db.query(JobRequest).filter(
         JobRequest.worker_id == worker_id,
         JobRequest.job_status == 'pending'
@@ -123,10 +120,9 @@ def get_worker_jobs(
 @router.get('/{request_id}')
 def get_job(
     request_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
     if not job:
         raise HTTPException(status_code=404, detail='Job not found')
@@ -148,10 +144,9 @@ def get_job(
 def respond_to_job(
     request_id: str,
     data: JobRespond,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
     if not job:
         raise HTTPException(status_code=404, detail='Job not found')
@@ -165,10 +160,9 @@ def respond_to_job(
 @router.put('/{request_id}/complete')
 def complete_job(
     request_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
     if not job:
         raise HTTPException(status_code=404, detail='Job not found')
@@ -193,10 +187,9 @@ def complete_job(
 def dispute_job(
     request_id: str,
     data: JobDispute,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
     if not job:
         raise HTTPException(status_code=404, detail='Job not found')
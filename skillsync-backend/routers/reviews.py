@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import QRCode, JobRequest, Worker, WorkLedger
-from auth import verify_token
+from auth import Principal, current_user
 from trust_score import calculate_trust_score
 from pydantic import BaseModel, validator
 from typing import Optional
@@ -11,7 +10,6 @@ from uuid import uuid4
 from datetime import datetime, date
 
 router = APIRouter()
-security = HTTPBearer()
 
 class ScanQR(BaseModel):
     qr_id: str
@@ -40,10 +38,9 @@ def validate_qr(qr_id: str, db: Session):
 @router.post('/scan-qr')
 def scan_qr(
     data: ScanQR,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     qr = validate_qr(data.qr_id, db)
     job = db.query(JobRequest).filter(JobRequest.id == qr.job_request_id).first()
     worker = db.query(Worker).filter(Worker.id == qr.worker_id).first()
@@ -60,10 +57,9 @@ def scan_qr(
 @router.post('/submit')
 def submit_review(
     data: SubmitReview,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
     qr = validate_qr(data.qr_id, db)
     job = db.query(JobRequest).filter(JobRequest.id == qr.job_request_id).first()
     worker = db.query(Worker).filter(Worker.id == qr.worker_id).first()
@@ -73,7 +69,7 @@ def submit_review(
     entry = WorkLedger(
         id=str(uuid4()),
         worker_id=qr.worker_id,
-        customer_id=payload['sub'],
+        customer_id=user.id,
         job_request_id=qr.job_request_id,
         job_type=worker.skill_type or 'General',
         rating=data.rating,
@@ -1,21 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Header
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from database import get_db
-from models import Worker, WorkerPhoto, WorkLedger
-from auth import verify_token
+from models import Worker, WorkerPhoto, WorkLedger, WorkerArea
+from auth import Principal, current_user
 from trust_score import calculate_trust_score
 from distance import haversine
-from ai import voice_to_text, extract_profile
+from gazetteer import match_area_ids
+from geocoding import locate_worker
+from file_uploads import safe_extension, MAX_AUDIO_BYTES, MAX_PHOTO_BYTES
+from blob_store import store_upload, store_uploads, release, release_unused
+from image_variants import schedule_variants, photo_response, photo_urls, add_thumbnails
+from audio_transcode import audio_extension, schedule_transcode, playback_url
+from photo_analysis import schedule_analysis
+from ai import voice_to_profile
+from vad import NoSpeechDetected
 from pydantic import BaseModel
 from typing import Optional, List
 from uuid import uuid4
-from datetime import datetime
-import shutil
-import os
 
 router = APIRouter()
-security = HTTPBearer()
 
 class WorkerRegister(BaseModel):
     name: str
@@ -45,15 +49,16 @@ class WorkerUpdate(BaseModel):
 @router.post('/register')
 def register_worker(
     data: WorkerRegister,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
-    worker = db.query(Worker).filter(Worker.id == payload['sub']).first()
+    worker = db.query(Worker).filter(Worker.id == user.id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found. Please verify OTP first.')
-    for key, value in data.dict(exclude_none=True).items():
+    fields = data.dict(exclude_none=True)
+    for key, value in fields.items():
         setattr(worker, key, value)
+    locate_worker(db, worker, area_changed='location_area' in fields, gps='location_lat' in fields)
     # Mark profile complete if essential fields are present
     if all([worker.name, worker.skill_type, worker.location_lat, worker.daily_rate]):
         worker.profile_complete = True
@@ -70,10 +75,9 @@ def register_worker(
 @router.post('/aadhaar-verify')
 def aadhaar_verify(
     data: AadhaarVerify,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     worker = db.query(Worker).filter(Worker.id == data.worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
@@ -88,25 +92,26 @@ async def upload_voice_bio(
     worker_id: str,
     audio: UploadFile = File(...),
     language: str = Form('hi'),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
 
-    os.makedirs('uploads/audio', exist_ok=True)
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    filename = f'{worker_id}_{timestamp}.mp3'
-    filepath = f'uploads/audio/{filename}'
+    filepath = (await store_upload(db, audio, audio_extension(audio), MAX_AUDIO_BYTES)).path
 
-    with open(filepath, 'wb') as f:
-        shutil.copyfileobj(audio.file, f)
+    try:
+        result = await run_in_threadpool(voice_to_profile, filepath, language)
+    except NoSpeechDetected:
+        release_unused(db, [filepath])
+        raise HTTPException(status_code=422, detail='No speech detected in the recording. Please record again.')
+    except Exception as e:
+        release_unused(db, [filepath])
+        raise HTTPException(status_code=500, detail=f'AI processing failed: {str(e)}')
 
     try:
-        transcript = voice_to_text(filepath, language)
-        profile = extract_profile(transcript, language)
+        transcript, profile = result['transcript'], result['profile']
         worker.skill_type = profile.get('skill_type') or worker.skill_type
         worker.experience_years = profile.get('experience_years') or worker.experience_years
         worker.daily_rate = profile.get('daily_rate') or worker.daily_rate
@@ -114,8 +119,10 @@ async def upload_voice_bio(
         specializations = profile.get('specializations', [])
         if specializations:
             worker.sub_skills = ','.join(specializations)
+        release(db, worker.voice_bio_path)
         worker.voice_bio_path = filepath
         db.commit()
+        schedule_transcode([filepath])
         score = calculate_trust_score(worker.id, db)
         return {
             'transcript': transcript,
@@ -129,32 +136,41 @@ async def upload_voice_bio(
 async def upload_photos(
     worker_id: str,
     photos: List[UploadFile] = File(...),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
 
-    os.makedirs('uploads/photos', exist_ok=True)
+    # Stored by content, so a retried upload reuses the same file; one oversized photo rejects the batch
+    saved = await store_uploads(db, photos[:10], lambda p: safe_extension(p.filename, 'jpg'), MAX_PHOTO_BYTES)
     photo_ids = []
-    for photo in photos[:10]:
-        ext = photo.filename.split('.')[-1] if '.' in photo.filename else 'jpg'
-        filename = f'{worker_id}_{uuid4()}.{ext}'
-        filepath = f'uploads/photos/{filename}'
-        with open(filepath, 'wb') as f:
-            shutil.copyfileobj(photo.file, f)
+    for upload in saved:
         wp = WorkerPhoto(
             id=str(uuid4()),
             worker_id=worker_id,
-            file_path=filepath
+            file_path=upload.path
         )
         db.add(wp)
         photo_ids.append(wp.id)
     db.commit()
+    # Thumbnail / card / full sizes are rendered off the request; until then the original is served
+    schedule_variants([upload.path for upload in saved])
+    schedule_analysis()
     return {'uploaded': len(photo_ids), 'photo_ids': photo_ids}
 
+@router.get('/photos/{photo_id}')
+def get_photo(
+    photo_id: str,
+    size: str = 'card',
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    # size: thumb / card / full / original; format: webp / jpeg, else picked from Accept
+    return photo_response(db, photo_id, size, format, accept)
+
 @router.get('/search')
 def search_workers(
     lat: Optional[float] = None,
@@ -177,7 +193,15 @@ def search_workers(
     if skill:
         query = query.filter(Worker.skill_type == skill)
     if location:
-        query = query.filter(Worker.location_area.ilike(f'%{location}%'))
+        # Fuzzy match through the trigram-indexed gazetteer; fall back to a
+        # substring match only when no known area resembles the query
+        area_ids = match_area_ids(db, location)
+        if area_ids:
+            query = query.join(WorkerArea, WorkerArea.worker_id == Worker.id).filter(
+                WorkerArea.area_id.in_(area_ids)
+            )
+        else:
+            query = query.filter(Worker.location_area.ilike(f'%{location}%'))
     all_workers = query.all()
 
     # If no coordinates provided, return all matching workers without distance
@@ -202,7 +226,7 @@ def search_workers(
                 'aadhaar_verified': w.aadhaar_verified,
             })
         results.sort(key=lambda x: -(x['trust_score'] or 0))
-        return {'workers': results[:limit], 'total': len(results)}
+        return {'workers': add_thumbnails(db, results[:limit]), 'total': len(results)}
 
     results = []
     for w in all_workers:
@@ -227,15 +251,14 @@ def search_workers(
                     'aadhaar_verified': w.aadhaar_verified,
                 })
     results.sort(key=lambda x: x['distance_km'])
-    return {'workers': results[:limit], 'total': len(results)}
+    return {'workers': add_thumbnails(db, results[:limit]), 'total': len(results)}
 
 @router.get('/{worker_id}/trust-score')
 def get_trust_score(
     worker_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    verify_token(credentials.credentials)
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
@@ -289,7 +312,8 @@ def get_worker(worker_id: str, db: Session = Depends(get_db)):
         'account_status': worker.account_status,
         'profile_complete': worker.profile_complete,
         'created_at': str(worker.created_at),
-        'photos': [{'id': p.id, 'file_path': p.file_path} for p in photos],
+        'photos': [{'id': p.id, 'file_path': p.file_path, 'urls': photo_urls(p.id)} for p in photos],
+        'voice_bio_url': playback_url(db, worker.voice_bio_path),
         'reviews': [{
             'rating': r.rating,
             'review_text': r.review_text,
@@ -302,15 +326,21 @@ def get_worker(worker_id: str, db: Session = Depends(get_db)):
 def update_worker(
     worker_id: str,
     data: WorkerUpdate,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
-    for key, value in data.dict(exclude_none=True).items():
+    updates = data.dict(exclude_none=True)
+    # the frontend resends the whole profile; only values that differ count as a move
+    area, point = worker.location_area, (worker.location_lat, worker.location_lng)
+    for key, value in updates.items():
         setattr(worker, key, value)
+    if updates.keys() & {'location_area', 'location_lat', 'location_lng'}:
+        locate_worker(db, worker, area_changed=worker.location_area != area,
+                      gps=(worker.location_lat, worker.location_lng) != point)
+        worker.profile_complete = all([worker.name, worker.skill_type, worker.location_lat, worker.daily_rate])
     db.commit()
     score = calculate_trust_score(worker.id, db)
     return {'updated': True, 'new_trust_score': score['total_score']}
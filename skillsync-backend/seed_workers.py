@@ -1,5 +1,6 @@
 """
 Seed 10 sample workers around Kozhikode, Kerala.
+Uses the bulk import pipeline, so re-running updates the same workers by phone.
 Run from the skillsync-backend directory:
     python seed_workers.py
 """
@@ -7,8 +8,7 @@ import sys, os
 sys.path.insert(0, os.path.dirname(__file__))
 
 from database import SessionLocal, Base, engine
-from models import Worker
-from uuid import uuid4
+from bulk_import import import_rows
 
 Base.metadata.create_all(bind=engine)
 
@@ -166,20 +166,6 @@ WORKERS = [
 ]
 
 db = SessionLocal()
-added = 0
-skipped = 0
-for w in WORKERS:
-    existing = db.query(Worker).filter(Worker.phone == w["phone"]).first()
-    if existing:
-        # update coordinates & details
-        for k, v in w.items():
-            setattr(existing, k, v)
-        skipped += 1
-    else:
-        worker = Worker(id=str(uuid4()), profile_complete=True, account_status="active", **w)
-        db.add(worker)
-        added += 1
-
-db.commit()
+result = import_rows(db, WORKERS)
 db.close()
-print(f"Done. Added: {added}, Updated: {skipped}")
+print(f"Done. Added: {result['inserted']}, Updated: {result['updated']}")
\ No newline at end of file
@@ -1,13 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import get_swagger_ui_html
 from database import engine, Base, init_db, SessionLocal
 from sqlalchemy.orm import Session
-from uuid import uuid4
 import os
 import uvicorn
 import models
+from gazetteer import sync_worker_areas, refresh_centroids
+from geocoding import ensure_gazetteer, backfill_coordinates
+from bulk_import import import_rows
+from profiling import ProfilingMiddleware, PROFILE_REQUESTS
+import metrics
+from file_uploads import RequestSizeLimitMiddleware
+from media import MediaFiles
+from tracing import TracingMiddleware, TRACE_EXPORT
+import file_reaper
+import otp_store
+from src.database import engine as ai_call_engine
 from src.routers import workers, customers, jobs, reviews, calls, emergency, ivr, auth_router
 from src.routers.ai_call import router as ai_call_router
 
@@ -35,8 +44,24 @@ app.add_middleware(
     allow_headers=['*']
 )
 
+# Per-request timing and SQL counts (PROFILE_REQUESTS=1, see profiling.py)
+if PROFILE_REQUESTS:
+    app.add_middleware(ProfilingMiddleware)
+
+# Request traces with SQL and AI pipeline spans (TRACE_EXPORT=file|otlp, see tracing.py)
+if TRACE_EXPORT:
+    app.add_middleware(TracingMiddleware)
+
+# Request counts and latency histograms, scraped from /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.watch_engine('database', engine)
+metrics.watch_engine('src.database', ai_call_engine)
+
+# Reject oversized request bodies before they are spooled (MAX_REQUEST_MB)
+app.add_middleware(RequestSizeLimitMiddleware)
+
 # Static files
-app.mount('/uploads', StaticFiles(directory='uploads'), name='uploads')
+app.mount('/uploads', MediaFiles(directory='uploads'), name='uploads')
 
 # Routers
 app.include_router(auth_router.router,  prefix='/api/auth',      tags=['Auth'])
@@ -48,6 +73,7 @@ app.include_router(calls.router,        prefix='/api/calls',     tags=['Calls'])
 app.include_router(emergency.router,    prefix='/api/emergency', tags=['Emergency'])
 app.include_router(ivr.router,          prefix='/api/ivr',       tags=['IVR'])
 app.include_router(ai_call_router)
+app.include_router(metrics.router)
 
 # Custom Swagger UI using CDN
 @app.get('/docs', include_in_schema=False)
@@ -67,85 +93,68 @@ def seed_demo_data():
             return
         
         demo_workers = [
-            models.Worker(
-                id=str(uuid4()), name='Ramu Naidu', phone='9000000001',
-                skill_type='Electrician', experience_years=12, daily_rate=800,
-                location_lat=11.2588, location_lng=75.7804,
-                location_area='Kozhikode', aadhaar_verified=True,
-                trust_score=87, trust_badge='Green', account_status='active',
-                profile_complete=True,
-                bio_text='Ramu is a certified electrician with 12 years of experience in residential and commercial wiring. He specializes in panel installations, safety audits, and fault repairs across Kozhikode.'
-            ),
-            models.Worker(
-                id=str(uuid4()), name='Suresh Kumar', phone='9000000002',
-                skill_type='Plumber', experience_years=8, daily_rate=600,
-                location_lat=11.2650, location_lng=75.7850,
-                location_area='Calicut Beach', aadhaar_verified=True,
-                trust_score=72, trust_badge='Yellow', account_status='active',
-                profile_complete=True,
-                bio_text='Suresh is an experienced plumber skilled in pipe fitting, bathroom installation, and leak repairs. He has worked on over 200 homes in Calicut and surrounding areas.'
-            ),
-            models.Worker(
-                id=str(uuid4()), name='Anand S', phone='9000000003',
-                skill_type='Carpenter', experience_years=15, daily_rate=900,
-                location_lat=11.2450, location_lng=75.7700,
-                location_area='Palayam', aadhaar_verified=False,
-                trust_score=45, trust_badge='Red', account_status='active',
-                profile_complete=True,
-                bio_text='Anand is a skilled carpenter specializing in custom furniture, door frames, and wooden flooring. 15 years of experience working with teak and plywood across Kerala.'
-            ),
-            models.Worker(
-                id=str(uuid4()), name='Murugan R', phone='9000000004',
-                skill_type='Painter', experience_years=6, daily_rate=500,
-                location_lat=11.2700, location_lng=75.7950,
-                location_area='Mavoor Road', aadhaar_verified=True,
-                trust_score=61, trust_badge='Yellow', account_status='active',
-                profile_complete=True,
-                bio_text='Murugan is a professional painter experienced in interior and exterior painting, waterproofing, and texture finishes. Works cleanly and completes projects on time.'
-            ),
-            models.Worker(
-                id=str(uuid4()), name='Biju Thomas', phone='9000000005',
-                skill_type='Mason', experience_years=20, daily_rate=1000,
-                location_lat=11.2550, location_lng=75.7750,
-                location_area='SM Street', aadhaar_verified=True,
-                trust_score=91, trust_badge='Green', account_status='active',
-                profile_complete=True,
-                bio_text='Biju is a master mason with 20 years of experience in brickwork, plastering, and concrete construction. He has led teams on major building projects across Kozhikode district.'
-            ),
-            models.Worker(
-                id=str(uuid4()), name='Rajesh Verma', phone='9000000006',
-                skill_type='Welder', experience_years=10, daily_rate=750,
-                location_lat=11.2600, location_lng=75.7820,
-                location_area='Nadakkav', aadhaar_verified=True,
-                trust_score=80, trust_badge='Green', account_status='active',
-                profile_complete=True,
-                bio_text='Rajesh is a certified welder skilled in arc welding, gate fabrication, and metal repairs. He operates his own small workshop and serves both residential and industrial clients.'
-            ),
-            models.Worker(
-                id=str(uuid4()), name='Lakshmi Devi', phone='9000000007',
-                skill_type='Other', experience_years=5, daily_rate=400,
-                location_lat=11.2520, location_lng=75.7780,
-                location_area='West Hill', aadhaar_verified=True,
-                trust_score=76, trust_badge='Green', account_status='active',
-                profile_complete=True,
-                bio_text='Lakshmi is a skilled domestic helper and cook specializing in Kerala and South Indian cuisine. She manages household work efficiently and is trusted by many families in West Hill.'
-            ),
+            {'name': 'Ramu Naidu', 'phone': '9000000001', 'skill_type': 'Electrician',
+             'experience_years': 12, 'daily_rate': 800, 'location_lat': 11.2588, 'location_lng': 75.7804,
+             'location_area': 'Kozhikode', 'aadhaar_verified': True, 'trust_score': 87,
+             'bio_text': 'Ramu is a certified electrician with 12 years of experience in residential and commercial wiring. He specializes in panel installations, safety audits, and fault repairs across Kozhikode.'},
+            {'name': 'Suresh Kumar', 'phone': '9000000002', 'skill_type': 'Plumber', 'experience_years': 8,
+             'daily_rate': 600, 'location_lat': 11.265, 'location_lng': 75.785,
+             'location_area': 'Calicut Beach', 'aadhaar_verified': True, 'trust_score': 72,
+             'bio_text': 'Suresh is an experienced plumber skilled in pipe fitting, bathroom installation, and leak repairs. He has worked on over 200 homes in Calicut and surrounding areas.'},
+            {'name': 'Anand S', 'phone': '9000000003', 'skill_type': 'Carpenter', 'experience_years': 15,
+             'daily_rate': 900, 'location_lat': 11.245, 'location_lng': 75.77, 'location_area': 'Palayam',
+             'aadhaar_verified': False, 'trust_score': 45,
+             'bio_text': 'Anand is a skilled carpenter specializing in custom furniture, door frames, and wooden flooring. 15 years of experience working with teak and plywood across Kerala.'},
+            {'name': 'Murugan R', 'phone': '9000000004', 'skill_type': 'Painter', 'experience_years': 6,
+             'daily_rate': 500, 'location_lat': 11.27, 'location_lng': 75.795,
+             'location_area': 'Mavoor Road', 'aadhaar_verified': True, 'trust_score': 61,
+             'bio_text': 'Murugan is a professional painter experienced in interior and exterior painting, waterproofing, and texture finishes. Works cleanly and completes projects on time.'},
+            {'name': 'Biju Thomas', 'phone': '9000000005', 'skill_type': 'Mason', 'experience_years': 20,
+             'daily_rate': 1000, 'location_lat': 11.255, 'location_lng': 75.775,
+             'location_area': 'SM Street', 'aadhaar_verified': True, 'trust_score': 91,
+             'bio_text': 'Biju is a master mason with 20 years of experience in brickwork, plastering, and concrete construction. He has led teams on major building projects across Kozhikode district.'},
+            {'name': 'Rajesh Verma', 'phone': '9000000006', 'skill_type': 'Welder', 'experience_years': 10,
+             'daily_rate': 750, 'location_lat': 11.26, 'location_lng': 75.782, 'location_area': 'Nadakkav',
+             'aadhaar_verified': True, 'trust_score': 80,
+             'bio_text': 'Rajesh is a certified welder skilled in arc welding, gate fabrication, and metal repairs. He operates his own small workshop and serves both residential and industrial clients.'},
+            {'name': 'Lakshmi Devi', 'phone': '9000000007', 'skill_type': 'Other', 'experience_years': 5,
+             'daily_rate': 400, 'location_lat': 11.252, 'location_lng': 75.778, 'location_area': 'West Hill',
+             'aadhaar_verified': True, 'trust_score': 76,
+             'bio_text': 'Lakshmi is a skilled domestic helper and cook specializing in Kerala and South Indian cuisine. She manages household work efficiently and is trusted by many families in West Hill.'},
         ]
-        
-        for w in demo_workers:
-            db.add(w)
-        db.commit()
-        print('[OK] Demo data seeded - workers added')
+        result = import_rows(db, demo_workers)
+        print(f"[OK] Demo data seeded - {result['inserted']} workers added")
     except Exception as e:
         print(f'[ERROR] Seed failed: {e}')
         db.rollback()
     finally:
         db.close()
 
+def index_areas():
+    db: Session = SessionLocal()
+    try:
+        if ensure_gazetteer(db):
+            print('[OK] Gazetteer loaded')
+        indexed = sync_worker_areas(db)
+        if indexed:
+            refresh_centroids(db)
+            print(f'[OK] Area index updated - {indexed} workers indexed')
+        geocoded = backfill_coordinates(db)
+        if geocoded['resolved']:
+            print(f"[OK] Geocoded {geocoded['resolved']} workers from area names")
+    except Exception as e:
+        print(f'[ERROR] Area indexing failed: {e}')
+        db.rollback()
+    finally:
+        db.close()
+
 @app.on_event('startup')
 async def startup_event():
     await init_db()
     seed_demo_data()
+    index_areas()
+    file_reaper.start()
+    otp_store.start()
 
 @app.get('/')
 def root():
@@ -6,17 +6,28 @@ Workers select their language, answer questions by voice/text,
 and Gemini extracts a structured profile from their answers.
 """
 
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-import sys, os, json, shutil, tempfile, io
+import sys, os, json, io, time
+from uuid import uuid4
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 import ai as ai_module
 import models
 from src.database import SessionLocal
 from trust_score import calculate_trust_score
+from geocoding import locate_worker
+from metrics import OTP_SENT
+import otp_store
+from rate_limit import throttle
+from file_uploads import save_upload, save_uploads, MAX_AUDIO_BYTES
+from file_reaper import SCRATCH_DIR, discard
+from interview_session import transcribe_answers
+from streaming_transcription import TranscriptionStream
+from vad import NoSpeechDetected
 
 router = APIRouter(prefix="/api/ai-call", tags=["AI Call"])
 
@@ -66,9 +77,6 @@ QUESTIONS_ENGLISH = {
     "aadhaar_otp":   "We have sent a one-time password to the mobile number registered with your Aadhaar. Please say the OTP now."
 }
 
-# In-memory OTP store: {phone: {otp, aadhaar_last4, verified}}
-_otp_store: dict = {}
-
 # Hardcoded translations — no Gemini dependency for core questions
 QUESTIONS_TRANSLATED = {
     "Malayalam": {
@@ -226,15 +234,17 @@ class VerifyOTPRequest(BaseModel):
 
 
 @router.post("/generate-otp")
-def generate_otp(req: GenerateOTPRequest):
+def generate_otp(req: GenerateOTPRequest, request: Request):
     """
     Simulate sending an OTP to the Aadhaar-registered mobile number.
     In production this would call an SMS gateway.
     For demo: generates a 6-digit OTP and returns it (so operator can relay it).
     """
+    throttle(request, "otp", req.phone)
     import random
     otp = str(random.randint(100000, 999999))
-    _otp_store[req.phone] = {"otp": otp, "aadhaar_last4": req.aadhaar_last4, "verified": False}
+    otp_store.put("aadhaar", req.phone, otp, {"aadhaar_last4": req.aadhaar_last4, "verified": False})
+    OTP_SENT.inc("ai_call")
     # In a real system we would NOT return the OTP — it would be sent via SMS.
     # For demo purposes we return it so the operator/tester can see it.
     return {
@@ -245,16 +255,16 @@ def generate_otp(req: GenerateOTPRequest):
 
 
 @router.post("/verify-otp")
-def verify_otp(req: VerifyOTPRequest):
+def verify_otp(req: VerifyOTPRequest, request: Request):
     """
     Verify the OTP spoken/typed by the worker.
     Returns verified=True if the OTP matches.
     """
-    record = _otp_store.get(req.phone)
-    if not record:
-        raise HTTPException(400, detail="No OTP found for this phone. Please generate OTP first.")
-    if record["otp"] == req.otp.strip():
-        _otp_store[req.phone]["verified"] = True
+    throttle(request, "login", req.phone)
+    record = otp_store.get("aadhaar", req.phone)
+    if not record or not record["code"]:
+        raise HTTPException(400, detail="No OTP found for this phone, or it has expired. Please generate OTP first.")
+    if otp_store.verify("aadhaar", req.phone, req.otp, verified=True):
         return {"verified": True, "message": "Aadhaar identity verified successfully."}
     return {"verified": False, "message": "OTP does not match. Please try again."}
 
@@ -323,25 +333,102 @@ def extract_profile_from_answers(req: SubmitAnswersRequest):
     After worker answers all questions (typed text or voice transcript),
     Gemini extracts a structured worker profile.
     """
+    transcript, profile = _profile_from_answers(req.answers, req.language)
+    return {
+        "success": True,
+        "language": req.language,
+        "transcript": transcript,
+        "profile": profile
+    }
+
+
+def _profile_from_answers(answers: dict, language: str) -> tuple:
+    """(combined Q&A transcript, extracted profile) for {question_key: answer_text}."""
     # Build a combined transcript from Q&A
     qa_pairs = []
-    for key, answer in req.answers.items():
+    for key, answer in answers.items():
         q = QUESTIONS_ENGLISH.get(key, key)
         qa_pairs.append(f"Q: {q}\nA: {answer}")
     transcript = "\n\n".join(qa_pairs)
 
-    profile = ai_module.extract_profile(transcript, req.language)
+    profile = ai_module.extract_profile(transcript, language)
     # Also try to get name from the 'name' answer directly
-    if req.answers.get("name"):
-        profile["name"] = req.answers["name"]
-    if req.answers.get("location"):
-        profile["location_hint"] = req.answers["location"]
+    if answers.get("name"):
+        profile["name"] = answers["name"]
+    if answers.get("location"):
+        profile["location_hint"] = answers["location"]
+    return transcript, profile
+
+
+@router.post("/session")
+async def process_interview_session(
+    language: str = Form(...),
+    question_keys: list[str] = Form(...),
+    audio: list[UploadFile] = File(...),
+    answers: str = Form("{}"),
+):
+    """
+    A whole interview in one request: the recording for each question
+    (audio[i] answers question_keys[i]) plus any typed answers as a JSON
+    object {question_key: text}. The recordings are transcribed in parallel
+    (interview_session.py), then the profile is extracted once.
+    Nothing is stored; the phone goes with /save-profile.
+    Returns the /extract-profile result plus, per question, the status and
+    milliseconds of its transcription. If any answer was lost to an AI
+    outage, returns 503 with Retry-After and nothing is extracted.
+    """
+    if not ai_module.model:
+        raise HTTPException(503, detail="AI service unavailable. Use text input instead.")
+    if len(question_keys) != len(audio):
+        raise HTTPException(400, detail="Send one question_keys value per audio file.")
+    unknown = [key for key in question_keys if key not in QUESTION_KEYS]
+    if unknown or len(set(question_keys)) != len(question_keys):
+        raise HTTPException(400, detail=f"Invalid or repeated question keys: {unknown or question_keys}")
+    try:
+        typed = json.loads(answers)
+    except ValueError:
+        raise HTTPException(400, detail="answers must be a JSON object of typed answers.")
+    if not isinstance(typed, dict):
+        raise HTTPException(400, detail="answers must be a JSON object of typed answers.")
+
+    started = time.perf_counter()
+    items = []
+    for key, upload in zip(question_keys, audio):
+        suffix = os.path.splitext(upload.filename or "")[1] or ".webm"
+        items.append((upload, os.path.join(SCRATCH_DIR, f"voice-answer-{uuid4()}{suffix}")))
+    saved = await save_uploads(items, MAX_AUDIO_BYTES)
+    try:
+        results = await run_in_threadpool(
+            transcribe_answers, {key: s.path for key, s in zip(question_keys, saved)}, language)
+    finally:
+        for s in saved:
+            discard(s.path)
+    transcribed = time.perf_counter()
+    shed = [key for key, r in results.items() if r["status"] == "unavailable"]
+    if shed:
+        # Extracting a profile without these answers would save it with them silently missing
+        raise HTTPException(503, detail={"message": ai_module.OUTAGE_MESSAGE, "retry": True,
+                                         "unavailable": shed, "questions": results},
+                            headers={"Retry-After": "10"})
+
+    all_answers = {key: str(text) for key, text in typed.items() if str(text).strip()}
+    all_answers.update({key: r["transcript"] for key, r in results.items() if r["transcript"]})
+    ordered = {key: all_answers[key] for key in QUESTION_KEYS if key in all_answers}
+    transcript, profile = await run_in_threadpool(_profile_from_answers, ordered, language)
+    finished = time.perf_counter()
 
     return {
         "success": True,
-        "language": req.language,
+        "language": language,
+        "answers": ordered,
+        "questions": results,
         "transcript": transcript,
-        "profile": profile
+        "profile": profile,
+        "timings": {
+            "transcribe_ms": round((transcribed - started) * 1000),
+            "extract_ms": round((finished - transcribed) * 1000),
+            "total_ms": round((finished - started) * 1000),
+        },
     }
 
 
@@ -365,22 +452,82 @@ async def transcribe_voice_answer(
     if not suffix:
         suffix = ".webm"
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    tmp_path = os.path.join(SCRATCH_DIR, f"voice-answer-{uuid4()}{suffix}")
+    await save_upload(audio, tmp_path, MAX_AUDIO_BYTES)
     try:
-        shutil.copyfileobj(audio.file, tmp)
-        tmp.close()
-        transcript = ai_module.voice_to_text(tmp.name, language)
+        transcript = await run_in_threadpool(ai_module.voice_to_text, tmp_path, language)
+    except NoSpeechDetected:
+        raise HTTPException(422, detail="No speech detected. Please record your answer again.")
     except Exception as e:
         raise HTTPException(500, detail=f"Transcription failed: {str(e)}")
     finally:
         try:
-            os.unlink(tmp.name)
+            os.unlink(tmp_path)
         except Exception:
             pass
 
     return {"question_key": question_key, "transcript": transcript}
 
 
+@router.websocket("/voice-answer/stream")
+async def stream_voice_answer(websocket: WebSocket, language: str = "Hindi", question_key: str = "",
+                              format: str = "webm"):
+    """
+    Streaming version of /voice-answer: transcription starts while the worker is still speaking.
+    Send audio as binary frames (MediaRecorder chunks, or 16 kHz s16le PCM with format=pcm16),
+    then the text frame {"type": "stop"} at the end of speech. The server sends
+    {"type": "partial", "transcript"} as segments are transcribed, then
+    {"type": "final", "question_key", "transcript", "finish_ms"} and closes.
+    Failures send {"type": "error", "detail"}.
+    """
+    await websocket.accept()
+    if not ai_module.model:
+        await websocket.send_json({"type": "error", "detail": "AI service unavailable. Use text input instead."})
+        await websocket.close(code=1013)
+        return
+
+    async def send_partial(text):
+        await websocket.send_json({"type": "partial", "transcript": text})
+
+    try:
+        stream = TranscriptionStream(language, format, on_partial=send_partial)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1003)
+        return
+
+    received = 0
+    try:
+        await stream.start()
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                received += len(message["bytes"])
+                if received > MAX_AUDIO_BYTES:
+                    await websocket.send_json({"type": "error", "detail": "Recording too large"})
+                    await websocket.close(code=1009)
+                    return
+                await stream.feed(message["bytes"])
+            elif message.get("text") and json.loads(message["text"]).get("type") == "stop":
+                break
+        stopped = time.perf_counter()
+        transcript = await stream.finish()
+        await websocket.send_json({
+            "type": "final", "question_key": question_key, "transcript": transcript,
+            "finish_ms": round((time.perf_counter() - stopped) * 1000),
+        })
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"Transcription failed: {str(e)}"})
+        await websocket.close(code=1011)
+    finally:
+        await stream.abort()
+
+
 @router.post("/save-profile")
 def save_worker_profile(phone: str, profile: dict, db: Session = Depends(get_db)):
     """
@@ -418,6 +565,7 @@ def save_worker_profile(phone: str, profile: dict, db: Session = Depends(get_db)
 
     worker.bio_text = profile.get("bio_text") or profile.get("bio_english") or worker.bio_text
     # location_hint comes from extract-profile which maps the 'location' answer
+    previous_area = worker.location_area
     worker.location_area = profile.get("location_hint") or profile.get("location_area") or worker.location_area
     # aadhaar_verified is set when OTP was confirmed on the frontend
     if profile.get("aadhaar_verified"):
@@ -429,6 +577,8 @@ def save_worker_profile(phone: str, profile: dict, db: Session = Depends(get_db)
     if worker.skill_type:
         worker.skill_type = worker.skill_type.strip().title()
 
+    db.flush()
+    locate_worker(db, worker, area_changed=worker.location_area != previous_area)
     db.commit()
     db.refresh(worker)
 
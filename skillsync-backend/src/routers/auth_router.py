@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Worker, Customer
 from auth import send_otp, verify_otp, create_token
 from pydantic import BaseModel
 from uuid import uuid4
+from rate_limit import throttle
 
 router = APIRouter()
 
@@ -18,7 +19,8 @@ class OTPVerify(BaseModel):
     role: str
 
 @router.post('/send-otp')
-def send_otp_endpoint(req: OTPRequest):
+def send_otp_endpoint(req: OTPRequest, request: Request):
+    throttle(request, 'otp', req.phone)
     send_otp(req.phone)
     return {
         'success': True,
@@ -26,7 +28,8 @@ def send_otp_endpoint(req: OTPRequest):
     }
 
 @router.post('/verify-otp')
-def verify_otp_endpoint(req: OTPVerify, db: Session = Depends(get_db)):
+def verify_otp_endpoint(req: OTPVerify, request: Request, db: Session = Depends(get_db)):
+    throttle(request, 'login', req.phone)
     if not verify_otp(req.phone, req.otp):
         raise HTTPException(status_code=400, detail='Invalid OTP')
 
@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Call, JobRequest
-from auth import verify_token
+from auth import Principal, current_user
 from trust_score import calculate_trust_score
 from pydantic import BaseModel
 from typing import Optional
@@ -11,7 +10,6 @@ from uuid import uuid4
 from datetime import datetime
 
 router = APIRouter()
-security = HTTPBearer()
 
 class InitiateCall(BaseModel):
     job_request_id: str
@@ -26,17 +24,16 @@ class RateCall(BaseModel):
 @router.post('/initiate')
 def initiate_call(
     data: InitiateCall,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
     job = db.query(JobRequest).filter(JobRequest.id == data.job_request_id).first()
     if not job:
         raise HTTPException(status_code=404, detail='Job not found')
     call = Call(
         id=str(uuid4()),
         job_request_id=job.id,
-        customer_id=payload['sub'],
+        customer_id=user.id,
         worker_id=job.worker_id,
         call_start=datetime.utcnow()
     )
@@ -52,7 +49,7 @@ def initiate_call(
 def end_call(
     call_id: str,
     data: EndCall,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     call = db.query(Call).filter(Call.id == call_id).first()
@@ -69,7 +66,7 @@ def end_call(
 def rate_call(
     call_id: str,
     data: RateCall,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     call = db.query(Call).filter(Call.id == call_id).first()
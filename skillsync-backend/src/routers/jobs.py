@@ -1,17 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import JobRequest, QRCode
-from auth import verify_token
+from auth import Principal, current_user
+from file_uploads import MAX_PHOTO_BYTES
+from blob_store import store_upload
+from photo_analysis import schedule_analysis
 from pydantic import BaseModel
 from typing import Optional
 from uuid import uuid4
 from datetime import datetime, timedelta
-import shutil
 
 router = APIRouter()
-security = HTTPBearer()
 
 class JobRespond(BaseModel):
     response: str
@@ -29,14 +29,13 @@ class JobCreate(BaseModel):
 @router.post('/create')
 async def create_job_json(
     data: JobCreate,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
     desc = data.description or data.complaint_description
     job = JobRequest(
         id=str(uuid4()),
-        customer_id=data.customer_id or payload['sub'],
+        customer_id=data.customer_id or user.id,
         worker_id=data.worker_id,
         complaint_description=desc,
         job_status='pending'
@@ -51,32 +50,29 @@ async def create_job(
     worker_id: str = Form(...),
     complaint_description: Optional[str] = Form(None),
     complaint_photo: Optional[UploadFile] = File(None),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
     job = JobRequest(
         id=str(uuid4()),
-        customer_id=payload['sub'],
+        customer_id=user.id,
         worker_id=worker_id,
         complaint_description=complaint_description,
         job_status='pending'
     )
     ai_analysis = {}
     if complaint_photo:
-        filename = f'{uuid4()}.jpg'
-        filepath = f'uploads/photos/{filename}'
-        with open(filepath, 'wb') as f:
-            shutil.copyfileobj(complaint_photo.file, f)
-        job.complaint_photo_path = filepath
+        job.complaint_photo_path = (await store_upload(db, complaint_photo, 'jpg', MAX_PHOTO_BYTES)).path
     db.add(job)
     db.commit()
+    if job.complaint_photo_path:
+        schedule_analysis()
     return {'request_id': job.id, 'status': 'pending', 'ai_analysis': ai_analysis}
 
 @router.get('/worker/{worker_id}')
 def get_worker_jobs(
     worker_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     jobs = db.query(JobRequest).filter(
@@ -89,7 +85,7 @@ def get_worker_jobs(
 @router.get('/{request_id}')
 def get_job(
     request_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
@@ -101,7 +97,7 @@ def get_job(
 def respond_to_job(
     request_id: str,
     data: JobRespond,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
@@ -115,7 +111,7 @@ def respond_to_job(
 @router.put('/{request_id}/complete')
 def complete_job(
     request_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
@@ -138,7 +134,7 @@ def complete_job(
 def dispute_job(
     request_id: str,
     data: JobDispute,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     job = db.query(JobRequest).filter(JobRequest.id == request_id).first()
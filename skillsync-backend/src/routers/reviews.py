@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import QRCode, JobRequest, Worker, WorkLedger
-from auth import verify_token
+from auth import Principal, current_user
 from trust_score import calculate_trust_score
 from pydantic import BaseModel
 from typing import Optional
@@ -11,7 +10,6 @@ from uuid import uuid4
 from datetime import datetime, date
 
 router = APIRouter()
-security = HTTPBearer()
 
 class ScanQR(BaseModel):
     qr_id: str
@@ -24,7 +22,7 @@ class SubmitReview(BaseModel):
 @router.post('/scan-qr')
 def scan_qr(
     data: ScanQR,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     qr = db.query(QRCode).filter(QRCode.id == data.qr_id).first()
@@ -47,10 +45,9 @@ def scan_qr(
 @router.post('/submit')
 def submit_review(
     data: SubmitReview,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
     qr = db.query(QRCode).filter(QRCode.id == data.qr_id).first()
     if not qr or qr.used or qr.expires_at < datetime.utcnow():
         raise HTTPException(status_code=400, detail='Invalid or expired QR')
@@ -59,7 +56,7 @@ def submit_review(
     entry = WorkLedger(
         id=str(uuid4()),
         worker_id=qr.worker_id,
-        customer_id=payload['sub'],
+        customer_id=user.id,
         job_request_id=qr.job_request_id,
         job_type=worker.skill_type or 'General',
         rating=data.rating,
@@ -1,21 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Header
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Worker, WorkerPhoto, WorkLedger
-from auth import verify_token
+from models import Worker, WorkerPhoto, WorkLedger, WorkerArea
+from auth import Principal, current_user
 from trust_score import calculate_trust_score
 from distance import haversine
+from gazetteer import match_area_ids
+from geocoding import locate_worker
+from file_uploads import MAX_AUDIO_BYTES, MAX_PHOTO_BYTES
+from blob_store import store_upload, store_uploads, release
+from image_variants import schedule_variants, photo_response, photo_urls, add_thumbnails
+from audio_transcode import audio_extension, schedule_transcode, playback_url
+from photo_analysis import schedule_analysis
 def voice_to_text(filepath, language): return ''
 def extract_profile(transcript, language): return {}
 from pydantic import BaseModel
 from typing import Optional, List
 from uuid import uuid4
-from datetime import datetime
-import shutil
 
 router = APIRouter()
-security = HTTPBearer()
 
 class WorkerRegister(BaseModel):
     name: str
@@ -45,15 +48,16 @@ class WorkerUpdate(BaseModel):
 @router.post('/register')
 def register_worker(
     data: WorkerRegister,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
-    payload = verify_token(credentials.credentials)
-    worker = db.query(Worker).filter(Worker.id == payload['sub']).first()
+    worker = db.query(Worker).filter(Worker.id == user.id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
-    for key, value in data.dict(exclude_none=True).items():
+    fields = data.dict(exclude_none=True)
+    for key, value in fields.items():
         setattr(worker, key, value)
+    locate_worker(db, worker, area_changed='location_area' in fields, gps='location_lat' in fields)
     db.commit()
     score = calculate_trust_score(worker.id, db)
     return {'worker_id': worker.id, 'trust_score': score['total_score'], 'message': 'Profile created'}
@@ -61,7 +65,7 @@ def register_worker(
 @router.post('/aadhaar-verify')
 def aadhaar_verify(
     data: AadhaarVerify,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     worker = db.query(Worker).filter(Worker.id == data.worker_id).first()
@@ -78,17 +82,13 @@ async def upload_voice_bio(
     worker_id: str,
     audio: UploadFile = File(...),
     language: str = Form('hi'),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    filename = f'{worker_id}_{timestamp}.mp3'
-    filepath = f'uploads/audio/{filename}'
-    with open(filepath, 'wb') as f:
-        shutil.copyfileobj(audio.file, f)
+    filepath = (await store_upload(db, audio, audio_extension(audio), MAX_AUDIO_BYTES)).path
     transcript = voice_to_text(filepath, language)
     profile = extract_profile(transcript, language)
     worker.skill_type = profile.get('skill_type', worker.skill_type)
@@ -96,8 +96,10 @@ async def upload_voice_bio(
     worker.daily_rate = profile.get('daily_rate', worker.daily_rate)
     worker.bio_text = profile.get('bio_english', worker.bio_text)
     worker.sub_skills = ','.join(profile.get('specializations', []))
+    release(db, worker.voice_bio_path)
     worker.voice_bio_path = filepath
     db.commit()
+    schedule_transcode([filepath])
     score = calculate_trust_score(worker.id, db)
     return {'transcript': transcript, 'extracted_profile': profile, 'new_trust_score': score['total_score']}
 
@@ -105,29 +107,39 @@ async def upload_voice_bio(
 async def upload_photos(
     worker_id: str,
     photos: List[UploadFile] = File(...),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
     photo_ids = []
-    for photo in photos[:10]:
-        filename = f'{worker_id}_{uuid4()}.jpg'
-        filepath = f'uploads/photos/{filename}'
-        with open(filepath, 'wb') as f:
-            shutil.copyfileobj(photo.file, f)
-        wp = WorkerPhoto(id=str(uuid4()), worker_id=worker_id, file_path=filepath)
+    saved = await store_uploads(db, photos[:10], lambda _: 'jpg', MAX_PHOTO_BYTES)
+    for upload in saved:
+        wp = WorkerPhoto(id=str(uuid4()), worker_id=worker_id, file_path=upload.path)
         db.add(wp)
         photo_ids.append(wp.id)
     db.commit()
+    schedule_variants([upload.path for upload in saved])
+    schedule_analysis()
     return {'uploaded': len(photo_ids), 'photo_ids': photo_ids}
 
+@router.get('/photos/{photo_id}')
+def get_photo(
+    photo_id: str,
+    size: str = 'card',
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    return photo_response(db, photo_id, size, format, accept)
+
 @router.get('/search')
 def search_workers(
     lat: Optional[float] = None,
     lng: Optional[float] = None,
     skill: Optional[str] = None,
+    location: Optional[str] = None,
     radius_km: int = 10,
     min_trust: int = 0,
     limit: int = 20,
@@ -136,6 +148,14 @@ def search_workers(
     query = db.query(Worker).filter(Worker.account_status == 'active', Worker.trust_score >= min_trust)
     if skill:
         query = query.filter(Worker.skill_type == skill)
+    if location:
+        area_ids = match_area_ids(db, location)
+        if area_ids:
+            query = query.join(WorkerArea, WorkerArea.worker_id == Worker.id).filter(
+                WorkerArea.area_id.in_(area_ids)
+            )
+        else:
+            query = query.filter(Worker.location_area.ilike(f'%{location}%'))
     workers = query.all()
     results = []
     
@@ -170,12 +190,12 @@ def search_workers(
     else:
         results.sort(key=lambda x: x['trust_score'], reverse=True)
         
-    return {'workers': results[:limit], 'total': len(results)}
+    return {'workers': add_thumbnails(db, results[:limit]), 'total': len(results)}
 
 @router.get('/{worker_id}/trust-score')
 def get_trust_score(
     worker_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
@@ -206,7 +226,8 @@ def get_worker(worker_id: str, db: Session = Depends(get_db)):
         'trust_score': worker.trust_score, 'trust_badge': worker.trust_badge,
         'bio_text': worker.bio_text, 'location_area': worker.location_area,
         'aadhaar_verified': worker.aadhaar_verified,
-        'photos': [{'id': p.id, 'file_path': p.file_path} for p in photos],
+        'photos': [{'id': p.id, 'file_path': p.file_path, 'urls': photo_urls(p.id)} for p in photos],
+        'voice_bio_url': playback_url(db, worker.voice_bio_path),
         'reviews': [{'rating': r.rating, 'review_text': r.review_text,
                      'job_type': r.job_type, 'completed_date': str(r.completed_date)} for r in reviews]
     }
@@ -215,14 +236,21 @@ def get_worker(worker_id: str, db: Session = Depends(get_db)):
 def update_worker(
     worker_id: str,
     data: WorkerUpdate,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Principal = Depends(current_user),
     db: Session = Depends(get_db)
 ):
     worker = db.query(Worker).filter(Worker.id == worker_id).first()
     if not worker:
         raise HTTPException(status_code=404, detail='Worker not found')
-    for key, value in data.dict(exclude_none=True).items():
+    updates = data.dict(exclude_none=True)
+    # the frontend resends the whole profile; only values that differ count as a move
+    area, point = worker.location_area, (worker.location_lat, worker.location_lng)
+    for key, value in updates.items():
         setattr(worker, key, value)
+    if updates.keys() & {'location_area', 'location_lat', 'location_lng'}:
+        locate_worker(db, worker, area_changed=worker.location_area != area,
+                      gps=(worker.location_lat, worker.location_lng) != point)
+        worker.profile_complete = all([worker.name, worker.skill_type, worker.location_lat, worker.daily_rate])
     db.commit()
     score = calculate_trust_score(worker.id, db)
     return {'updated': True, 'new_trust_score': score['total_score']}
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""
+Streaming transcription of voice answers.
+
+POST /api/ai-call/voice-answer only starts work once the whole recording
+has arrived. It then runs the upload, librosa preprocessing, a Gemini
+file upload and a transcription of the full clip, one after another. The
+WebSocket endpoint /api/ai-call/voice-answer/stream (src/routers/ai_call.py)
+does most of that work while the worker is still speaking:
+
+- Chunks are decoded as they arrive. Browser MediaRecorder chunks
+  (webm/ogg) are piped through one ffmpeg process per stream, which
+  emits 16 kHz mono PCM. Clients without ffmpeg on the server can send
+  raw 16 kHz s16le PCM instead (format=pcm16).
+- The PCM is cut into segments of about SEGMENT_SECONDS. Each cut is made
+  at the quietest 100 ms frame of the last CUT_WINDOW_SECONDS, so words
+  are not split.
+- Each segment goes through the local speech check (vad.py) in the
+  threadpool, with the sample arithmetic in NumPy where it is installed,
+  so the event loop only moves bytes. Segments
+  without speech are skipped; the rest are cut to their speech regions,
+  peak-normalised and sent to Gemini as an inline WAV part
+  (ai.transcribe_segment), so there are no Files API round trips. A finished segment produces a
+  partial transcript. At most SEGMENT_CONCURRENCY segments of one stream
+  are in the threadpool at a time; a client sending audio faster than
+  real time queues behind its own segments instead of filling the
+  threadpool and the AI client's slots.
+- On stop, only the tail since the last cut is left to transcribe. The
+  final transcript therefore comes one short model call after the end of
+  speech.
+
+Run from the skillsync-backend directory:
+    python streaming_transcription.py measure answer.wav   # end-of-speech to transcript, streamed vs full upload
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+import wave
+from array import array
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import ai
+from audio_transcode import FFMPEG
+from vad import trim_pcm, NoSpeechDetected
+
+PCM_RATE = 16000
+SEGMENT_SECONDS = float(os.getenv('STREAM_SEGMENT_SECONDS', '5'))
+SEGMENT_CONCURRENCY = int(os.getenv('STREAM_SEGMENT_CONCURRENCY', '2'))  # per stream
+CUT_WINDOW_SECONDS = 1.5
+FRAME_SECONDS = 0.1
+MIN_TAIL_SECONDS = 0.3
+SILENCE_PEAK = 500  # about -36 dBFS; quieter segments are not sent, even without NumPy for the speech check
+STREAM_FORMATS = ('webm', 'ogg', 'wav', 'mp3', 'm4a', 'pcm16')
+
+
+def _samples(pcm: bytes) -> array:
+    samples = array('h')
+    samples.frombytes(pcm[:len(pcm) // 2 * 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples
+
+
+def _to_bytes(samples: array) -> bytes:
+    if sys.byteorder == 'big':
+        samples = array('h', samples)
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def _as_array(pcm: bytes) -> 'np.ndarray':
+    return np.frombuffer(pcm, dtype='<i2', count=len(pcm) // 2).astype(np.int32)
+
+
+def peak(pcm: bytes) -> int:
+    if np is not None:
+        samples = _as_array(pcm)
+        return int(np.abs(samples).max()) if len(samples) else 0
+    samples = _samples(pcm)
+    return max(max(samples), -min(samples)) if samples else 0
+
+
+def normalise(pcm: bytes) -> bytes:
+    """Scale to a 0.95 full-scale peak, like ai._preprocess_audio does for whole files."""
+    top = peak(pcm)
+    if not top:
+        return pcm
+    gain = 0.95 * 32767 / top
+    if np is not None:
+        return (_as_array(pcm) * gain).astype('<i2').tobytes()
+    return _to_bytes(array('h', (int(s * gain) for s in _samples(pcm))))
+
+
+def prepare_segment(segment: bytes):
+    """The segment as a normalised WAV of its speech, or None when there is nothing to send."""
+    try:
+        speech = trim_pcm(segment, 'stream')
+    except NoSpeechDetected:
+        return None
+    if peak(speech) < SILENCE_PEAK:
+        return None
+    return to_wav(normalise(speech))
+
+
+def to_wav(pcm: bytes, rate: int = PCM_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+class Segmenter:
+    """Cuts a growing PCM stream into segments of about segment_seconds, at a quiet point."""
+
+    def __init__(self, segment_seconds: float = SEGMENT_SECONDS, rate: int = PCM_RATE):
+        self.target = int(segment_seconds * rate) * 2
+        self.window = int(CUT_WINDOW_SECONDS * rate) * 2
+        self.frame = int(FRAME_SECONDS * rate) * 2
+        self.buffer = bytearray()
+
+    def _cut_point(self) -> int:
+        first = self.target - self.window
+        if np is not None:
+            n_frames = (self.window - self.frame) // self.frame + 1
+            frames = _as_array(bytes(self.buffer[first:first + n_frames * self.frame])).reshape(n_frames, -1)
+            energy = np.square(frames, dtype=np.int64).sum(axis=1)
+            best = first + int(np.argmin(energy)) * self.frame + self.frame // 2
+            return best - best % 2
+        best, best_energy = self.target, None
+        for start in range(first, self.target - self.frame + 1, self.frame):
+            energy = sum(s * s for s in _samples(self.buffer[start:start + self.frame]))
+            if best_energy is None or energy < best_energy:
+                best, best_energy = start + self.frame // 2, energy
+        return best - best % 2
+
+    def feed(self, pcm: bytes) -> list:
+        self.buffer += pcm
+        segments = []
+        while len(self.buffer) >= self.target:
+            cut = self._cut_point()
+            segments.append(bytes(self.buffer[:cut]))
+            del self.buffer[:cut]
+        return segments
+
+    def flush(self) -> bytes:
+        tail = bytes(self.buffer)
+        self.buffer.clear()
+        return tail
+
+
+class TranscriptionStream:
+    """
+    One streamed answer. feed() audio chunks as they arrive, then finish()
+    for the final transcript. on_partial(text) is awaited whenever the
+    transcript of the leading finished segments grows.
+    """
+
+    def __init__(self, language: str, fmt: str = 'webm', on_partial=None,
+                 segment_seconds: float = SEGMENT_SECONDS):
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f'Unsupported format {fmt}')
+        if fmt != 'pcm16' and FFMPEG is None:
+            raise ValueError('Streaming compressed audio needs ffmpeg on the server; send format=pcm16')
+        self.language = language
+        self.fmt = fmt
+        self.on_partial = on_partial
+        self.segmenter = Segmenter(segment_seconds)
+        self.tasks = []
+        self.texts = []
+        self.sent = ''
+        self.pcm_bytes = 0
+        self._slots = asyncio.Semaphore(SEGMENT_CONCURRENCY)
+        self._decoder = None
+        self._reader = None
+
+    async def start(self):
+        if self.fmt != 'pcm16':
+            self._decoder = await asyncio.create_subprocess_exec(
+                FFMPEG, '-v', 'error', '-i', 'pipe:0', '-ac', '1', '-ar', str(PCM_RATE), '-f', 's16le', 'pipe:1',
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            )
+            self._reader = asyncio.create_task(self._read_decoded())
+
+    async def _read_decoded(self):
+        while True:
+            pcm = await self._decoder.stdout.read(65536)
+            if not pcm:
+                return
+            self._pcm(pcm)
+
+    def _pcm(self, pcm: bytes):
+        self.pcm_bytes += len(pcm)
+        for segment in self.segmenter.feed(pcm):
+            self._transcribe(segment)
+
+    def _transcribe(self, segment: bytes):
+        index = len(self.tasks)
+        self.texts.append(None)
+        self.tasks.append(asyncio.create_task(self._run_segment(index, segment)))
+
+    async def _run_segment(self, index: int, segment: bytes):
+        text = ''
+        async with self._slots:
+            # Off the event loop, so one stream's sample crunching never stalls the other sockets
+            wav = await run_in_threadpool(prepare_segment, segment)
+            if wav is not None:
+                text = await run_in_threadpool(ai.transcribe_segment, wav, self.language)
+        self.texts[index] = text
+        await self._emit()
+
+    def transcript(self) -> str:
+        """Text of the leading segments that are done, in order."""
+        done = []
+        for text in self.texts:
+            if text is None:
+                break
+            done.append(text)
+        return ' '.join(t for t in done if t)
+
+    async def _emit(self):
+        text = self.transcript()
+        if self.on_partial and text and text != self.sent:
+            self.sent = text
+            await self.on_partial(text)
+
+    async def feed(self, chunk: bytes):
+        if self._decoder is None:
+            self._pcm(chunk)
+            return
+        self._decoder.stdin.write(chunk)
+        await self._decoder.stdin.drain()
+
+    async def finish(self) -> str:
+        """End of speech: transcribe what is left and return the whole transcript."""
+        if self._decoder is not None:
+            self._decoder.stdin.close()
+            await self._reader
+            await self._decoder.wait()
+        tail = self.segmenter.flush()
+        if len(tail) >= MIN_TAIL_SECONDS * PCM_RATE * 2:
+            self._transcribe(tail)
+        await asyncio.gather(*self.tasks)
+        return self.transcript()
+
+    async def abort(self):
+        for task in self.tasks + ([self._reader] if self._reader else []):
+            task.cancel()
+        if self._decoder is not None and self._decoder.returncode is None:
+            self._decoder.kill()
+            await self._decoder.wait()
+
+
+async def measure(wav_path: str, language: str = 'Hindi', chunk_seconds: float = 0.25) -> dict:
+    """Replay a 16 kHz mono WAV in real time; seconds from end of speech to transcript, streamed vs full clip."""
+    with wave.open(wav_path, 'rb') as w:
+        pcm = w.readframes(w.getnframes())
+    stream = TranscriptionStream(language, 'pcm16')
+    step = int(chunk_seconds * PCM_RATE) * 2
+    for i in range(0, len(pcm), step):
+        await stream.feed(pcm[i:i + step])
+        await asyncio.sleep(chunk_seconds)
+    started = time.perf_counter()
+    streamed = await stream.finish()
+    streamed_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    full = await run_in_threadpool(ai.voice_to_text, wav_path, language)
+    full_s = time.perf_counter() - started
+    return {'audio_seconds': round(len(pcm) / 2 / PCM_RATE, 1), 'segments': len(stream.tasks),
+            'streamed_s': round(streamed_s, 2), 'full_upload_s': round(full_s, 2),
+            'streamed': streamed, 'full': full}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streaming voice-answer transcription')
+    commands = parser.add_subparsers(dest='command', required=True)
+    measure_cmd = commands.add_parser('measure', help='end-of-speech to transcript, streamed vs full upload')
+    measure_cmd.add_argument('path', help='16 kHz mono 16-bit WAV')
+    measure_cmd.add_argument('--language', default='Hindi')
+    args = parser.parse_args()
+
+    if ai.model is None:
+        raise SystemExit('[ERROR] GEMINI_API_KEY (or AI_BACKEND=stub) is required')
+    result = asyncio.run(measure(args.path, args.language))
+    print('Done. ' + ', '.join(f'{k}: {v}' for k, v in result.items() if k not in ('streamed', 'full')))
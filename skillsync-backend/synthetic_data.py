@@ -0,0 +1,221 @@
+"""
+Synthetic dataset generator for load testing.
+
+Creates workers, customers, jobs, calls, QR codes, work ledger entries and
+emergency incidents with realistic shapes: workers cluster around the
+gazetteer's real area centroids (mostly Kozhikode district, some in other
+cities), some give only a misspelled area name and no coordinates (like
+IVR sign-ups), ratings skew high, most calls are answered and incidents
+are rare. The same --seed gives the same data (generated ids aside).
+
+Every customer can log in with email loadtest+<n>@skillsync.test and
+password LOADTEST_PASSWORD, which load_test.py relies on.
+
+Run from the skillsync-backend directory, against an empty database:
+    python synthetic_data.py --workers 20000 --customers 5000 --jobs 40000
+"""
+import argparse
+import csv
+import random
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy.orm import Session
+from models import Customer, JobRequest, Call, WorkLedger, QRCode, EmergencyIncident, Worker
+from auth import hash_password
+from bulk_import import import_rows
+from geocoding import GAZETTEER_PATH
+from trust_score import calculate_trust_scores
+
+LOADTEST_PASSWORD = 'loadtest'
+LOADTEST_EMAIL = 'loadtest+{}@skillsync.test'
+CHUNK_SIZE = 2000
+
+SKILLS = {
+    # skill: (share of workers, median daily rate)
+    'Plumber':     (0.20, 650),
+    'Electrician': (0.20, 750),
+    'Carpenter':   (0.15, 800),
+    'Mason':       (0.15, 850),
+    'Painter':     (0.15, 550),
+    'Welder':      (0.07, 800),
+    'Other':       (0.08, 450),
+}
+RATINGS = [1, 2, 3, 4, 5]
+RATING_WEIGHTS = [0.03, 0.05, 0.12, 0.35, 0.45]
+FIRST_NAMES = ['Ramu', 'Suresh', 'Anand', 'Murugan', 'Biju', 'Rajesh', 'Lakshmi', 'Priya', 'Thomas',
+               'Vijayan', 'Sunitha', 'Abdul', 'Deepa', 'Santhosh', 'Meera', 'Hari', 'Ashraf', 'Faisal',
+               'Latha', 'Gopal', 'Shibu', 'Rekha', 'Manoj', 'Anil', 'Salim', 'Beena', 'Joseph', 'Divya']
+LAST_NAMES = ['Naidu', 'Kumar', 'S', 'R', 'Thomas', 'Verma', 'Devi', 'Nair', 'Antony', 'K', 'V', 'P',
+              'Menon', 'Rehman', 'Pillai', 'Varghese', 'Babu', 'Das', 'Joseph', 'M']
+LANGUAGES = ['ml', 'ml', 'ml', 'hi', 'ta', 'en', 'kn', 'te', 'bn', 'mr']
+
+
+def load_centroids(path: str = GAZETTEER_PATH) -> list:
+    """[(name, aliases, lat, lng, weight)] — areas near Kozhikode get most of the workers."""
+    rows = []
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            lat, lng = float(row['lat']), float(row['lng'])
+            near_home = abs(lat - 11.2588) < 0.5 and abs(lng - 75.7804) < 0.5
+            aliases = [a for a in (row.get('aliases') or '').split('|') if a]
+            rows.append((row['name'], aliases, lat, lng, 4.0 if near_home else 1.0))
+    return rows
+
+
+def _spelling(rng: random.Random, name: str, aliases: list) -> str:
+    """The way the area tends to come back from a voice answer."""
+    roll = rng.random()
+    if roll < 0.15 and aliases:
+        return rng.choice(aliases)
+    if roll < 0.25:
+        return name.lower().replace('road', 'rd').replace('beach', 'bch').replace('street', 'st')
+    return name
+
+
+def generate_workers(rng: random.Random, n: int, centroids: list):
+    skills = list(SKILLS)
+    skill_weights = [SKILLS[s][0] for s in skills]
+    weights = [c[4] for c in centroids]
+    for i in range(n):
+        name, aliases, lat, lng, _ = rng.choices(centroids, weights)[0]
+        skill = rng.choices(skills, skill_weights)[0]
+        experience = min(40, int(rng.gammavariate(2.0, 4.0)))
+        rate = round(rng.lognormvariate(0, 0.25) * SKILLS[skill][1] * (1 + experience / 60), -1)
+        row = {
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'phone': f'6{i:09d}',
+            'language': rng.choice(LANGUAGES),
+            'skill_type': skill,
+            'experience_years': experience,
+            'daily_rate': rate,
+            'work_radius_km': rng.choice([5, 10, 10, 15, 20, 30]),
+            'location_area': _spelling(rng, name, aliases),
+            'aadhaar_verified': rng.random() < 0.7,
+            'bio_text': f'{skill} with {experience} years of experience around {name}.',
+        }
+        # ~20% register by IVR / AI call with no GPS fix
+        if rng.random() >= 0.2:
+            row['location_lat'] = round(rng.gauss(lat, 0.02), 6)
+            row['location_lng'] = round(rng.gauss(lng, 0.02), 6)
+        yield row
+
+
+def _insert(db: Session, model, rows: list):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.execute(model.__table__.insert(), rows[start:start + CHUNK_SIZE])
+    db.commit()
+
+
+def generate(db: Session, workers: int, customers: int, jobs: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    centroids = load_centroids()
+    counts = {}
+
+    counts['workers'] = import_rows(db, generate_workers(rng, workers, centroids), compute_trust=False)['inserted']
+    worker_rows = db.query(Worker.id, Worker.skill_type, Worker.location_lat, Worker.location_lng, Worker.location_area).all()
+    worker_rows = [w for w in worker_rows if w.location_lat is not None]
+
+    # Customers: one password hash reused, hashing per row is not what is being measured
+    password_hash = hash_password(LOADTEST_PASSWORD)
+    customer_rows = []
+    weights = [c[4] for c in centroids]
+    for i in range(customers):
+        name, _, lat, lng, _ = rng.choices(centroids, weights)[0]
+        customer_rows.append({
+            'id': str(uuid4()), 'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'email': LOADTEST_EMAIL.format(i), 'password_hash': password_hash,
+            'phone': f'5{i:09d}', 'location_lat': round(rng.gauss(lat, 0.02), 6),
+            'location_lng': round(rng.gauss(lng, 0.02), 6), 'location_area': name,
+            'created_at': datetime.utcnow(),
+        })
+    _insert(db, Customer, customer_rows)
+    counts['customers'] = len(customer_rows)
+
+    job_rows, call_rows, ledger_rows, qr_rows, incident_rows = [], [], [], [], []
+    now = datetime.utcnow()
+    flagged = set()
+    for _ in range(jobs if customer_rows and worker_rows else 0):
+        customer = rng.choice(customer_rows)
+        worker = rng.choice(worker_rows)
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 180))
+        status = rng.choices(['completed', 'accepted', 'pending', 'cancelled', 'disputed'],
+                             [0.60, 0.10, 0.15, 0.12, 0.03])[0]
+        job_id = str(uuid4())
+        job_rows.append({
+            'id': job_id, 'customer_id': customer['id'], 'worker_id': worker.id,
+            'complaint_description': 'Synthetic job request', 'job_status': status,
+            'worker_response': {'accepted': 'accepted', 'completed': 'accepted', 'cancelled': 'declined'}.get(status),
+            'created_at': created,
+            'completed_at': created + timedelta(hours=rng.randint(2, 72)) if status == 'completed' else None,
+        })
+        if rng.random() < 0.8:
+            start = created + timedelta(minutes=rng.randint(1, 120))
+            responded = rng.random() < 0.85
+            duration = int(rng.expovariate(1 / 180)) if responded else 0
+            call_rows.append({
+                'id': str(uuid4()), 'job_request_id': job_id, 'customer_id': customer['id'],
+                'worker_id': worker.id, 'call_start': start, 'call_end': start + timedelta(seconds=duration),
+                'duration_seconds': duration, 'worker_responded': responded, 'created_at': start,
+            })
+        if status == 'completed':
+            qr_rows.append({
+                'id': str(uuid4()), 'worker_id': worker.id, 'job_request_id': job_id,
+                'issued_at': created, 'expires_at': created + timedelta(days=7),
+                'used': True, 'used_at': created + timedelta(days=1),
+            })
+            ledger_rows.append({
+                'id': str(uuid4()), 'worker_id': worker.id, 'customer_id': customer['id'],
+                'job_request_id': job_id, 'job_type': worker.skill_type or 'General',
+                'rating': rng.choices(RATINGS, RATING_WEIGHTS)[0], 'review_text': 'Synthetic review',
+                'completed_date': created.date(), 'location_area': worker.location_area,
+                'verified': True, 'created_at': created,
+            })
+        if rng.random() < 0.003:
+            open_incident = rng.random() < 0.3
+            incident_rows.append({
+                'id': str(uuid4()), 'customer_id': customer['id'], 'worker_id': worker.id,
+                'job_request_id': job_id, 'location_lat': customer['location_lat'],
+                'location_lng': customer['location_lng'], 'worker_flagged': open_incident,
+                'status': 'open' if open_incident else 'resolved', 'created_at': created,
+            })
+            if open_incident:
+                flagged.add(worker.id)
+
+    for model, rows, key in [(JobRequest, job_rows, 'jobs'), (Call, call_rows, 'calls'),
+                             (QRCode, qr_rows, 'qr_codes'), (WorkLedger, ledger_rows, 'ledger'),
+                             (EmergencyIncident, incident_rows, 'incidents')]:
+        _insert(db, model, rows)
+        counts[key] = len(rows)
+    if flagged:
+        db.query(Worker).filter(Worker.id.in_(flagged)).update({'account_status': 'flagged'}, synchronize_session=False)
+        db.commit()
+
+    ids = [wid for (wid,) in db.query(Worker.id)]
+    for start in range(0, len(ids), CHUNK_SIZE):
+        calculate_trust_scores(ids[start:start + CHUNK_SIZE], db)
+        db.commit()
+
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic SkillSync dataset')
+    parser.add_argument('--workers', type=int, default=5000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--jobs', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from database import SessionLocal, Base, engine
+    from geocoding import ensure_gazetteer
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        ensure_gazetteer(db)
+        counts = generate(db, args.workers, args.customers, args.jobs, args.seed)
+    finally:
+        db.close()
+    print('Done. ' + ', '.join(f'{k}: {v}' for k, v in counts.items()))
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import google.generativeai as genai
+import pytest
+import ai
+import ai_client
+from ai_client import AIClient, AIUnavailable, AITimeout, AIBusy, CircuitBreaker
+from model_backends import GeminiBackend
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """generateContent that plays back scripted faults: a list of (status, delay) per request."""
+    script = []
+    hits = 0
+    in_flight = [0, 0]  # current, max
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        cls = type(self)
+        with cls.lock:
+            cls.hits += 1
+            cls.in_flight[0] += 1
+            cls.in_flight[1] = max(cls.in_flight)
+            status, delay = cls.script.pop(0) if cls.script else (200, 0)
+        try:
+            time.sleep(delay)
+            if status == 200:
+                body = {'candidates': [{'content': {'parts': [{'text': json.dumps({'skill_type': 'Plumber'})}],
+                                                    'role': 'model'}, 'finishReason': 'STOP', 'index': 0}]}
+            else:
+                body = {'error': {'code': status, 'message': 'injected fault', 'status': 'UNAVAILABLE'}}
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with cls.lock:
+                cls.in_flight[0] -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubGemini.script, StubGemini.hits, StubGemini.in_flight = [], 0, [0, 0]
+    genai.configure(api_key='test-key', transport='rest',
+                    client_options={'api_endpoint': f'http://127.0.0.1:{server.server_port}'})
+    monkeypatch.setattr(ai_client, 'BACKOFF_BASE', 0.01)
+    yield StubGemini, genai.GenerativeModel('gemini-2.5-flash')
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(model, **kwargs):
+    kwargs.setdefault('breaker', CircuitBreaker(failures=3, reset_after=0.5))
+    return AIClient(GeminiBackend(model, genai), **kwargs)
+
+
+def test_transient_errors_are_retried(stub):
+    server, model = stub
+    server.script = [(503, 0), (429, 0)]
+    response = make_client(model, retries=2).generate_content('hello', timeout=5)
+    assert json.loads(response.text) == {'skill_type': 'Plumber'}
+    assert server.hits == 3
+
+
+def test_bad_requests_are_not_retried_and_do_not_open_the_circuit(stub):
+    server, model = stub
+    server.script = [(400, 0)] * 5
+    client = make_client(model, retries=2)
+    for _ in range(4):
+        with pytest.raises(Exception) as info:
+            client.generate_content('hello', timeout=5)
+        assert not isinstance(info.value, AIUnavailable)
+    assert server.hits == 4
+    assert client.breaker.state == 'closed'
+
+
+def test_slow_calls_time_out(stub):
+    server, model = stub
+    server.script = [(200, 1.0)]
+    started = time.perf_counter()
+    with pytest.raises(AITimeout):
+        make_client(model, retries=0).generate_content('hello', timeout=0.2)
+    assert time.perf_counter() - started < 0.8
+
+
+def test_circuit_opens_fails_fast_and_recovers(stub):
+    server, model = stub
+    server.script = [(503, 0)] * 3
+    client = make_client(model, retries=5)
+    with pytest.raises(AIUnavailable):
+        client.generate_content('hello', timeout=5)
+    assert server.hits == 3  # stopped retrying once the breaker opened
+    assert client.breaker.state == 'open'
+
+    started = time.perf_counter()
+    for _ in range(20):
+        with pytest.raises(AIUnavailable):
+            client.generate_content('hello', timeout=5)
+    assert time.perf_counter() - started < 0.1
+    assert server.hits == 3
+
+    time.sleep(0.6)  # half-open: one trial call closes it again
+    assert json.loads(client.generate_content('hello', timeout=5).text)['skill_type'] == 'Plumber'
+    assert client.breaker.state == 'closed'
+
+
+def test_concurrency_is_bounded(stub):
+    server, model = stub
+    server.script = [(200, 0.2)] * 6
+    client = make_client(model, max_concurrency=2, queue_timeout=5)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda _: client.generate_content('hello', timeout=5), range(6)))
+    assert len(results) == 6
+    assert server.in_flight[1] == 2
+
+    server.script = [(200, 0.5)] * 2
+    busy = make_client(model, max_concurrency=1, queue_timeout=0.05)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(busy.generate_content, 'hello', timeout=5)
+        time.sleep(0.1)
+        with pytest.raises(AIBusy):
+            busy.generate_content('hello', timeout=5)
+        first.result()
+
+
+def test_extract_profile_falls_back_quickly_when_the_circuit_is_open(stub, monkeypatch):
+    server, model = stub
+    client = make_client(model)
+    client.breaker.record_failure()
+    client.breaker.record_failure()
+    client.breaker.record_failure()
+    monkeypatch.setattr(ai, 'model', model)
+    monkeypatch.setattr(ai, 'client', client)
+
+    started = time.perf_counter()
+    profile = ai.extract_profile('I fix pipes in Pune', 'Hindi')
+    assert time.perf_counter() - started < 0.1
+    assert profile['skill_type'] == 'Other' and profile['bio_english'] == 'I fix pipes in Pune'
+    assert server.hits == 0
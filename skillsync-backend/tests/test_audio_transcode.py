@@ -0,0 +1,144 @@
+import io
+import math
+import os
+import struct
+import wave
+from datetime import datetime, timedelta
+import pytest
+from fastapi import UploadFile
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import AudioRendition, Blob, Worker
+from blob_store import blob_path, collect_garbage
+import audio_transcode
+from audio_transcode import sniff_audio_format, audio_extension, pcm_stats, playback_url, generate_rendition
+
+engine = create_engine('sqlite://')
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+def tone(seconds=1.0, rate=16000, amplitude=0.5) -> bytes:
+    n = int(seconds * rate)
+    return b''.join(struct.pack('<h', int(amplitude * 32767 * math.sin(2 * math.pi * 440 * i / rate)))
+                    for i in range(n))
+
+def wav_file(pcm: bytes, rate=16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+def test_sniff_audio_format():
+    assert sniff_audio_format(b'\x1a\x45\xdf\xa3\x9f\x42\x86\x81') == 'webm'
+    assert sniff_audio_format(b'OggS\x00\x02') == 'ogg'
+    assert sniff_audio_format(wav_file(b'')[:12]) == 'wav'
+    assert sniff_audio_format(b'\x00\x00\x00\x20ftypM4A ') == 'm4a'
+    assert sniff_audio_format(b'ID3\x04\x00') == 'mp3'
+    assert sniff_audio_format(b'\xff\xfb\x90\x64') == 'mp3'
+    assert sniff_audio_format(b'hello world!') is None
+
+def test_audio_extension_ignores_misleading_names():
+    webm = UploadFile(io.BytesIO(b'\x1a\x45\xdf\xa3' + b'\x00' * 20), filename='voice.mp3')
+    assert audio_extension(webm) == 'webm'
+    assert webm.file.tell() == 0
+    assert audio_extension(UploadFile(io.BytesIO(b'unknown bytes'), filename='a.aac')) == 'aac'
+    assert audio_extension(UploadFile(io.BytesIO(b'unknown bytes'), filename=None)) == 'mp3'
+
+def test_pcm_stats():
+    stats = pcm_stats(tone(2.0, amplitude=0.5))
+    assert stats['duration_seconds'] == 2.0
+    assert stats['peak_dbfs'] == pytest.approx(-6.0, abs=0.1)
+    # A sine's RMS is 3 dB under its peak
+    assert stats['loudness_dbfs'] == pytest.approx(-9.0, abs=0.1)
+    assert pcm_stats(b'\x00\x00' * 100) == {'duration_seconds': 0.006, 'loudness_dbfs': None, 'peak_dbfs': None}
+    assert pcm_stats(b'')['duration_seconds'] == 0
+
+def test_playback_url_prefers_rendition_and_gc_drops_it(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    source, opus = blob_path('aa' * 32, 'webm'), blob_path('bb' * 32, 'opus')
+    assert playback_url(db, None) is None
+    assert playback_url(db, source) == '/' + source
+    assert playback_url(db, 'uploads/audio/legacy.mp3') == '/uploads/audio/legacy.mp3'
+
+    old = datetime.utcnow() - timedelta(days=1)
+    db.add_all([
+        Blob(sha256='aa' * 32, path=source, size=1000, ref_count=0, created_at=old),
+        Blob(sha256='bb' * 32, path=opus, size=100, ref_count=1, created_at=old),
+        AudioRendition(source_sha256='aa' * 32, path=opus, codec='opus', bitrate_kbps=16,
+                       duration_seconds=1.0, size=100, source_size=1000),
+    ])
+    db.commit()
+    assert playback_url(db, source) == '/' + opus
+
+    # The source goes first; the rendition row with it, and then the Opus blob
+    assert collect_garbage(db)['deleted'] == 1
+    assert db.query(AudioRendition).count() == 0
+    assert collect_garbage(db)['deleted'] == 1
+    assert db.query(Blob).count() == 0
+    db.close()
+
+@pytest.mark.skipif(audio_transcode.FFMPEG is None, reason='ffmpeg not installed')
+def test_transcode_to_opus(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    original = wav_file(tone(3.0, rate=48000, amplitude=0.25), rate=48000)
+    source = blob_path('cc' * 32, 'wav')
+    os.makedirs(os.path.dirname(source))
+    with open(source, 'wb') as f:
+        f.write(original)
+    db.add(Worker(id='t1', phone='9000000701', voice_bio_path=source))
+    db.commit()
+
+    rendition = generate_rendition(db, source)
+    assert rendition.path.endswith('.opus') and os.path.exists(rendition.path)
+    assert rendition.size * 10 < len(original)
+    assert rendition.duration_seconds == pytest.approx(3.0, abs=0.05)
+    assert rendition.loudness_dbfs == pytest.approx(-15.0, abs=1.0)
+    assert generate_rendition(db, source).path == rendition.path
+    assert playback_url(db, source) == '/' + rendition.path
+    db.close()
+
+def test_dropped_originals_keep_their_rendition(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    transcodes = []
+    def fake_transcode(source_path, out_path, kbps=16):
+        transcodes.append(source_path)
+        with open(out_path, 'wb') as f:
+            f.write(b'OggS opus of ' + source_path.encode())
+        return {'duration_seconds': 3.0, 'loudness_dbfs': -18.0, 'peak_dbfs': -3.0}
+    monkeypatch.setattr(audio_transcode, 'FFMPEG', 'ffmpeg')
+    monkeypatch.setattr(audio_transcode, 'transcode', fake_transcode)
+    monkeypatch.setattr(audio_transcode, 'KEEP_ORIGINAL_AUDIO', False)
+    db = SessionLocal()
+    source = blob_path('dd' * 32, 'webm')
+    os.makedirs(os.path.dirname(source))
+    with open(source, 'wb') as f:
+        f.write(b'webm voice bio')
+    db.add_all([Worker(id='t2', phone='9000000702', voice_bio_path=source),
+                Blob(sha256='dd' * 32, path=source, size=14, ref_count=1)])
+    db.commit()
+
+    opus = generate_rendition(db, source).path
+    assert db.query(Worker).get('t2').voice_bio_path == opus
+    old = datetime.utcnow() - timedelta(days=1)
+    db.query(Blob).update({'created_at': old, 'last_referenced_at': old})
+    db.commit()
+    assert collect_garbage(db)['deleted'] == 1 and not os.path.exists(source)
+
+    for _ in range(2):
+        assert audio_transcode.backfill(db)['failed'] == 0
+    assert transcodes == [source]
+    rendition = db.query(AudioRendition).one()
+    assert (rendition.path, rendition.duration_seconds) == (opus, 3.0)
+    assert playback_url(db, opus) == '/' + opus
+    assert collect_garbage(db)['deleted'] == 0 and os.path.exists(opus)
+    db.query(AudioRendition).delete()
+    db.query(Blob).delete()
+    db.query(Worker).delete()
+    db.commit()
+    db.close()
@@ -0,0 +1,64 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+import auth
+from auth import Principal, create_token, current_user, verify_token
+
+app = FastAPI()
+
+@app.get('/me')
+def me(user: Principal = Depends(current_user)):
+    return user._asdict()
+
+@pytest.fixture
+def decodes(monkeypatch):
+    monkeypatch.setattr(auth, '_verified', auth.OrderedDict())
+    calls = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, 'decode', lambda *args, **kwargs: calls.append(1) or decode(*args, **kwargs))
+    return calls
+
+def test_repeat_requests_skip_the_decode(decodes):
+    token = create_token('worker-1', 'worker')
+    client = TestClient(app)
+    for _ in range(3):
+        response = client.get('/me', headers={'Authorization': f'Bearer {token}'})
+        assert response.json() == {'id': 'worker-1', 'role': 'worker'}
+    assert len(decodes) == 1
+    verify_token(token)['sub'] = 'someone-else'  # callers get a copy, not the cached claims
+    assert verify_token(token)['sub'] == 'worker-1'
+
+def test_bad_and_missing_tokens_are_refused(decodes):
+    client = TestClient(app)
+    assert client.get('/me').status_code == 403
+    assert client.get('/me', headers={'Authorization': 'Bearer not-a-token'}).status_code == 401
+    forged = jwt.encode({'sub': 'worker-1', 'role': 'worker', 'exp': datetime.utcnow() + timedelta(hours=1)},
+                        'wrong-secret', algorithm=auth.JWT_ALGORITHM)
+    assert client.get('/me', headers={'Authorization': f'Bearer {forged}'}).status_code == 401
+    assert not auth._verified  # failures are never cached
+
+def test_cached_tokens_still_expire(decodes):
+    exp = int(time.time()) + 1
+    token = jwt.encode({'sub': 'customer-1', 'role': 'customer', 'exp': exp}, auth.JWT_SECRET,
+                       algorithm=auth.JWT_ALGORITHM)
+    assert verify_token(token)['sub'] == 'customer-1'
+    assert token in auth._verified
+    time.sleep(exp + 1.1 - time.time())
+    with pytest.raises(HTTPException) as refused:
+        verify_token(token)
+    assert refused.value.status_code == 401
+    assert token not in auth._verified
+
+def test_cache_keeps_the_most_recently_used_tokens(decodes, monkeypatch):
+    monkeypatch.setattr(auth, 'TOKEN_CACHE_SIZE', 2)
+    first, second, third = (create_token(f'worker-{i}', 'worker') for i in range(3))
+    verify_token(first)
+    verify_token(second)
+    verify_token(first)   # now more recent than second
+    verify_token(third)   # evicts second
+    assert list(auth._verified) == [first, third]
+    verify_token(second)
+    assert len(decodes) == 4
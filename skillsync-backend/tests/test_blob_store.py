@@ -0,0 +1,180 @@
+import os
+from datetime import datetime, timedelta
+from typing import List
+from fastapi import FastAPI, File, UploadFile, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import Blob, Worker, WorkerPhoto
+import blob_store
+from blob_store import store_uploads, collect_garbage, migrate_legacy, release, BLOB_ROOT
+
+engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+app = FastAPI()
+
+@app.post('/workers/{worker_id}/photos')
+async def upload(worker_id: str, photos: List[UploadFile] = File(...), db=Depends(get_db)):
+    saved = await store_uploads(db, photos, lambda _: 'jpg', 1024 * 1024)
+    for s in saved:
+        db.add(WorkerPhoto(worker_id=worker_id, file_path=s.path))
+    db.commit()
+    return [s.path for s in saved]
+
+client = TestClient(app)
+
+def age(db, days=1):
+    then = datetime.utcnow() - timedelta(days=days)
+    db.query(Blob).update({'created_at': then, 'last_referenced_at': then})
+    db.commit()
+
+def blob_files():
+    return [f for _, _, files in os.walk(BLOB_ROOT) for f in files]
+
+def test_identical_uploads_share_one_blob(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    db.add(Worker(id='b1', phone='9000000401'))
+    db.commit()
+
+    first = client.post('/workers/b1/photos', files=[('photos', ('a.jpg', b'same')), ('photos', ('b.jpg', b'same'))]).json()
+    again = client.post('/workers/b1/photos', files=[('photos', ('c.jpg', b'same')), ('photos', ('d.jpg', b'other'))]).json()
+    assert first[0] == first[1] == again[0] != again[1]
+    assert first[0].startswith(BLOB_ROOT + '/')
+    assert len(blob_files()) == 2
+    assert db.query(Blob).filter(Blob.path == first[0]).one().ref_count == 3
+
+    # Unreferenced blobs go only after the grace period
+    db.query(WorkerPhoto).filter(WorkerPhoto.file_path == again[1]).delete()
+    db.commit()
+    assert collect_garbage(db)['deleted'] == 0
+    age(db)
+    stats = collect_garbage(db, dry_run=True)
+    assert stats['deleted'] == 1 and len(blob_files()) == 2
+    stats = collect_garbage(db)
+    assert stats['deleted'] == 1 and blob_files() == [os.path.basename(first[0])]
+    release(db, first[0])
+    db.commit()
+    assert db.query(Blob).one().ref_count == 2
+    db.query(WorkerPhoto).delete()
+    db.query(Blob).delete()
+    db.commit()
+    db.close()
+
+def test_migrate_legacy_dedupes_and_repoints(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('uploads/photos')
+    for name in ('w_1.jpg', 'w_2.jpg'):
+        with open(f'uploads/photos/{name}', 'wb') as f:
+            f.write(b'legacy photo')
+    db = SessionLocal()
+    db.add(Worker(id='b2', phone='9000000402'))
+    db.add_all([WorkerPhoto(worker_id='b2', file_path='uploads/photos/w_1.jpg'),
+                WorkerPhoto(worker_id='b2', file_path='uploads/photos/w_2.jpg')])
+    db.commit()
+
+    stats = migrate_legacy(db)
+    assert (stats['files'], stats['duplicates']) == (2, 1)
+    paths = {p.file_path for p in db.query(WorkerPhoto).filter(WorkerPhoto.worker_id == 'b2')}
+    assert len(paths) == 1 and os.path.exists(paths.pop())
+    assert os.listdir('uploads/photos') == []
+    assert db.query(Blob).one().ref_count == 2
+    db.close()
+
+def test_gc_spares_old_blobs_that_are_referenced_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    db.query(WorkerPhoto).delete()
+    db.query(Blob).delete()
+    db.add(Worker(id='b3', phone='9000000403'))
+    db.commit()
+    path = client.post('/workers/b3/photos', files=[('photos', ('a.jpg', b'reused'))]).json()[0]
+    db.query(WorkerPhoto).delete()
+    db.commit()
+    age(db)
+
+    # Uploaded again: the grace period restarts even though the blob itself is a day old
+    client.post('/workers/b3/photos', files=[('photos', ('b.jpg', b'reused'))])
+    db.query(WorkerPhoto).delete()
+    db.commit()
+    assert collect_garbage(db)['deleted'] == 0 and os.path.exists(path)
+
+    # A reference taken after GC read the row is not overwritten by the recount
+    age(db)
+    db.query(Blob).update({'ref_count': 5})
+    db.commit()
+    other = SessionLocal()
+    original_count = blob_store.count_references
+    def count_then_upload(session):
+        refs = original_count(session)
+        blob_store.add_ref(other, blob_store.blob_sha(path), path, 6)
+        other.commit()
+        return refs
+    monkeypatch.setattr(blob_store, 'count_references', count_then_upload)
+    stats = collect_garbage(db)
+    assert (stats['recounted'], stats['deleted']) == (0, 0)
+    assert db.query(Blob).one().ref_count == 6
+    other.close()
+    db.query(Blob).delete()
+    db.commit()
+    db.close()
+
+def test_upload_rewrites_a_blob_collected_mid_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    db.add(Worker(id='b4', phone='9000000404'))
+    db.commit()
+    path = client.post('/workers/b4/photos', files=[('photos', ('a.jpg', b'raced'))]).json()[0]
+    # GC unlinks the file between the lookup and add_ref
+    original_add_ref = blob_store.add_ref
+    def collected_first(*args):
+        if os.path.exists(path):
+            os.unlink(path)
+        original_add_ref(*args)
+    monkeypatch.setattr(blob_store, 'add_ref', collected_first)
+    assert client.post('/workers/b4/photos', files=[('photos', ('b.jpg', b'raced'))]).json()[0] == path
+    with open(path, 'rb') as f:
+        assert f.read() == b'raced'
+    db.query(WorkerPhoto).delete()
+    db.query(Blob).delete()
+    db.commit()
+    db.close()
+
+def test_references_do_not_hold_the_write_lock(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    file_engine = create_engine(f'sqlite:///{tmp_path}/app.db', connect_args={'timeout': 0.1})
+    Base.metadata.create_all(bind=file_engine)
+    FileSession = sessionmaker(bind=file_engine)
+    other_writer = create_engine(f'sqlite:///{tmp_path}/app.db', connect_args={'timeout': 0.1})
+    db = FileSession()
+
+    async def upload_then_call_the_model(photos):
+        saved = await store_uploads(db, photos, lambda _: 'jpg', 1024 * 1024)
+        # The AI call would run here; another request must still be able to write
+        with other_writer.begin() as conn:
+            conn.execute(Worker.__table__.insert().values(id='b5', phone='9000000405'))
+        return saved
+
+    photo_app = FastAPI()
+
+    @photo_app.post('/photos')
+    async def upload(photos: List[UploadFile] = File(...)):
+        saved = await upload_then_call_the_model(photos)
+        blob_store.release_unused(db, [s.path for s in saved])  # the call failed
+        return [s.path for s in saved]
+
+    assert TestClient(photo_app).post('/photos', files=[('photos', ('a.jpg', b'locked?'))]).status_code == 200
+    assert db.query(Blob).one().ref_count == 0
+    assert db.query(Worker).filter(Worker.id == 'b5').count() == 1
+    db.close()
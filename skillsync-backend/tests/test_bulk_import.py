@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Worker, WorkerArea, WorkLedger
+from bulk_import import import_rows, validate_row, RowError, RejectWriter
+from trust_score import calculate_trust_score, calculate_trust_scores
+from datetime import date
+import pytest
+
+engine = create_engine('sqlite://')
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+def test_validate_row_normalises_and_rejects():
+    row = validate_row({'phone': '+91 98000 00011', 'skill_type': 'plumber', 'aadhaar_verified': 'yes'})
+    assert row['phone'] == '9800000011'  # the number OTP login uses
+    assert validate_row({'phone': '098000 00011'})['phone'] == '9800000011'
+    assert row['skill_type'] == 'Plumber'
+    assert row['aadhaar_verified'] is True
+    with pytest.raises(RowError):
+        validate_row({'phone': '123'})
+    with pytest.raises(RowError):
+        validate_row({'phone': '+44 7700 900123'})
+    with pytest.raises(RowError):
+        validate_row({'phone': '9800000011', 'location_lat': '11.2'})
+
+def test_import_rows_upserts_on_phone(tmp_path):
+    db = SessionLocal()
+    rejects = RejectWriter(str(tmp_path / 'rejects.csv'))
+    rows = [
+        {'name': 'Asha', 'phone': '9800000021', 'skill_type': 'Mason', 'location_area': 'Calicut bch'},
+        {'name': 'Bad', 'phone': 'x'},
+        {'name': 'Vinod', 'phone': '9800000022', 'trust_score': '85'},
+    ]
+    result = import_rows(db, rows, chunk_size=2, rejects=rejects)
+    rejects.close()
+    assert (result['inserted'], result['updated'], result['rejected']) == (2, 0, 1)
+    assert 'phone: invalid number' in (tmp_path / 'rejects.csv').read_text()
+
+    vinod = db.query(Worker).filter(Worker.phone == '9800000022').first()
+    assert (vinod.trust_score, vinod.trust_badge, vinod.language) == (85, 'Green', 'hi')
+    asha = db.query(Worker).filter(Worker.phone == '9800000021').first()
+    assert db.query(WorkerArea).filter(WorkerArea.worker_id == asha.id).count() == 1
+
+    result = import_rows(db, [{'phone': '9800000021', 'daily_rate': '700'}])
+    assert (result['inserted'], result['updated']) == (0, 1)
+    db.refresh(asha)
+    assert (asha.name, asha.daily_rate) == ('Asha', 700)
+    db.close()
+
+def test_batch_trust_scores_match_single():
+    db = SessionLocal()
+    import_rows(db, [{'name': 'Ravi', 'phone': '9800000031', 'aadhaar_verified': '1'}])
+    ravi = db.query(Worker).filter(Worker.phone == '9800000031').first()
+    for rating in (5, 4):
+        db.add(WorkLedger(worker_id=ravi.id, customer_id='c', job_request_id='j',
+                          job_type='Mason', rating=rating, completed_date=date.today()))
+    db.commit()
+    batch = calculate_trust_scores([ravi.id], db)[ravi.id]
+    assert batch == calculate_trust_score(ravi.id, db)
+    db.close()
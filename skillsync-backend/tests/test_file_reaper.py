@@ -0,0 +1,84 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+import ai
+import file_reaper
+from ai_client import AIClient
+from file_reaper import scratch_path, reap, schedule_delete, sweep_orphans, sweep_scratch, UPLOAD_PREFIX
+from model_backends import StubBackend
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    backend = StubBackend(latency_ms=0, jitter_ms=0)
+    monkeypatch.setattr(ai, 'model', backend)
+    monkeypatch.setattr(ai, 'client', AIClient(backend))
+    monkeypatch.setattr(file_reaper, 'SCRATCH_DIR', str(tmp_path / 'scratch'))
+    monkeypatch.setattr(file_reaper, 'REAPER_BATCH_DELAY', 0.05)
+    return backend
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_transcription_returns_before_the_upload_is_deleted(stub, tmp_path, monkeypatch):
+    audio = tmp_path / 'bio.webm'
+    audio.write_bytes(b'fake voice note')
+
+
+    transcripts = [ai.voice_to_text(str(audio), 'Hindi') for _ in range(3)]
+    assert transcripts[0] == transcripts[2] and 'rupees' in transcripts[0]
+    assert stub.stats['delete_file'] == 0  # deletes are batched after the responses
+    assert os.listdir(file_reaper.SCRATCH_DIR) == []
+    wait_for(lambda: stub.stats['delete_file'] == 3)
+    assert stub.list_files() == [] and file_reaper.pending() == []
+
+
+def test_failed_deletes_are_retried_then_dropped(stub, tmp_path, monkeypatch):
+    (tmp_path / 'a.wav').write_bytes(b'a')
+    name = stub.upload_file(str(tmp_path / 'a.wav')).name
+    failures = []
+
+    def flaky_delete(name):
+        failures.append(name)
+        raise ConnectionError('network down')
+    monkeypatch.setattr(stub, 'delete_file', flaky_delete)
+
+    assert reap({name: 0, 'files/gone': 0}) == {name: 1, 'files/gone': 1}
+    assert reap({name: file_reaper.REAPER_MAX_ATTEMPTS - 1}) == {}
+    del stub.delete_file
+    assert reap({name: 1, 'files/already-deleted': 0}) == {}  # 404 counts as done
+    assert stub.list_files() == []
+
+
+def test_startup_sweeps_orphans_and_stale_scratch(stub, tmp_path):
+    (tmp_path / 'a.wav').write_bytes(b'a')
+    old = stub.upload_file(str(tmp_path / 'a.wav'), display_name=UPLOAD_PREFIX + 'voice')
+    recent = stub.upload_file(str(tmp_path / 'a.wav'), display_name=UPLOAD_PREFIX + 'voice')
+    foreign = stub.upload_file(str(tmp_path / 'a.wav'), display_name='someone-else')
+    old.create_time = foreign.create_time = datetime.now(timezone.utc) - timedelta(hours=2)
+
+    assert sweep_orphans() == 1
+    assert {f.name for f in stub.list_files()} == {recent.name, foreign.name}
+
+    stale, fresh = scratch_path('.wav'), scratch_path('.wav')
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+    assert sweep_scratch() == 1
+    assert os.listdir(file_reaper.SCRATCH_DIR) == [os.path.basename(fresh)]
+
+
+def test_failed_deletes_leave_the_shared_client_alone(stub, tmp_path, monkeypatch):
+    def broken_delete(name):
+        raise ConnectionError('network down')
+    monkeypatch.setattr(stub, 'delete_file', broken_delete)
+
+    for _ in range(3):
+        reap({f'files/{i}': 0 for i in range(10)})
+    assert ai.client.breaker.state == 'closed'
+    assert file_reaper._client() is not ai.client and file_reaper._client().breaker.state == 'open'
+    assert ai.client.generate_content('hello').text
@@ -0,0 +1,51 @@
+import hashlib
+import os
+from typing import List
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from file_uploads import save_upload, save_uploads, safe_extension, RequestSizeLimitMiddleware
+
+def make_app(tmp_path, max_file, max_request):
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=max_request)
+
+    @app.post('/upload')
+    async def upload(files: List[UploadFile] = File(...)):
+        pending = [(f, str(tmp_path / f'{i}.{safe_extension(f.filename, "bin")}')) for i, f in enumerate(files)]
+        saved = await save_uploads(pending, max_file)
+        return [s._asdict() for s in saved]
+
+    @app.post('/one')
+    async def one(file: UploadFile = File(...)):
+        return (await save_upload(file, str(tmp_path / 'one.bin'), max_file))._asdict()
+
+    return TestClient(app)
+
+def test_save_upload_hashes_and_renames(tmp_path):
+    client = make_app(tmp_path, 1024, 10_000)
+    data = b'x' * 700
+    r = client.post('/upload', files=[('files', ('a.JPG', data)), ('files', ('b', b'yz'))])
+    assert r.status_code == 200
+    first, second = r.json()
+    assert first['sha256'] == hashlib.sha256(data).hexdigest() and first['size'] == 700
+    assert first['path'].endswith('0.jpg') and second['path'].endswith('1.bin')
+    assert sorted(os.listdir(tmp_path)) == ['0.jpg', '1.bin']
+
+def test_oversized_file_leaves_nothing_behind(tmp_path):
+    client = make_app(tmp_path, 1024, 10_000)
+    r = client.post('/upload', files=[('files', ('ok.jpg', b'a' * 10)), ('files', ('big.jpg', b'b' * 2000))])
+    assert r.status_code == 413
+    assert os.listdir(tmp_path) == []
+    assert client.post('/one', files={'file': ('empty.bin', b'')}).status_code == 400
+
+def test_request_size_limit(tmp_path):
+    client = make_app(tmp_path, 100_000, 5_000)
+    r = client.post('/one', files={'file': ('big.bin', b'c' * 6000)})
+    assert r.status_code == 413
+    assert 'Request too large' in r.json()['detail']
+
+    def chunks():
+        for _ in range(10):
+            yield b'd' * 1000
+    r = client.post('/one', content=chunks(), headers={'content-type': 'multipart/form-data; boundary=xyz'})
+    assert r.status_code == 413
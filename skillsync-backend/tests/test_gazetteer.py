@@ -0,0 +1,85 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Worker, WorkerArea
+from gazetteer import normalize_area, similarity, resolve_area, match_area_ids, index_worker_area, area_id_for
+from geocoding import load_gazetteer, geocode, locate_worker
+
+engine = create_engine('sqlite://')
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+def test_normalize_area_expands_aliases():
+    assert normalize_area('Calicut Bch.') == 'kozhikode beach'
+    assert normalize_area('  Kozhikode   BEACH ') == 'kozhikode beach'
+
+def test_similarity_of_variants():
+    assert similarity('Calicut Beach', 'Kozhikode beach') == 1.0
+    assert similarity('Mavoor Road', 'Mavur Rd') > 0.3
+    assert similarity('Feroke', 'Vatakara') < 0.3
+
+def test_spellings_resolve_to_one_area():
+    db = SessionLocal()
+    a = resolve_area(db, 'Calicut Beach')
+    b = resolve_area(db, 'Kozhikode beach')
+    c = resolve_area(db, 'Kozhikode Beachh')
+    assert a.id == b.id == c.id
+    assert a.id in match_area_ids(db, 'calicut bch')
+    db.close()
+
+def test_long_area_names_keep_distinct_ids():
+    prefix = 'near the old bus stand behind the government higher secondary school '
+    a, b = area_id_for(prefix + 'east gate'), area_id_for(prefix + 'west gate')
+    assert a != b and len(a) == len(b) == 64
+    assert area_id_for('kozhikode beach') == 'kozhikode-beach'
+
+def test_index_worker_area_links_worker():
+    db = SessionLocal()
+    worker = Worker(id='w1', phone='9000000101', location_area='Palayam',
+                    location_lat=11.245, location_lng=75.77)
+    db.add(worker)
+    db.flush()
+    area = index_worker_area(db, worker)
+    db.commit()
+    link = db.query(WorkerArea).filter(WorkerArea.worker_id == 'w1').first()
+    assert link.area_id == area.id
+    assert area.location_lat == 11.245
+    assert area.id in match_area_ids(db, 'palayam')
+    db.close()
+
+def test_geocode_from_gazetteer_file():
+    db = SessionLocal()
+    assert load_gazetteer(db) > 0
+    assert geocode(db, 'Calicut') == (11.2588, 75.7804)
+    assert geocode(db, 'Vadakara') == geocode(db, 'Vatakara')
+    assert geocode(db, 'Atlantis') is None
+    worker = Worker(id='w2', phone='9000000102', location_area='Feroke')
+    db.add(worker)
+    db.flush()
+    locate_worker(db, worker)
+    assert (worker.location_lat, worker.location_lng) == (11.1797, 75.8405)
+    db.close()
+
+def test_relocating_a_worker_replaces_stale_coordinates():
+    db = SessionLocal()
+    load_gazetteer(db)
+    worker = Worker(id='w3', phone='9000000103', location_area='Feroke')
+    db.add(worker)
+    db.flush()
+    locate_worker(db, worker)
+    assert worker.location_source == 'geocoded'
+
+    worker.location_area = 'Calicut'
+    locate_worker(db, worker, area_changed=True)
+    assert (worker.location_lat, worker.location_lng, worker.location_source) == (11.2588, 75.7804, 'geocoded')
+
+    worker.location_lat, worker.location_lng = 11.25, 75.79  # a GPS fix from the app
+    locate_worker(db, worker, gps=True)
+    assert worker.location_source == 'gps'
+    locate_worker(db, worker)  # re-indexing alone leaves a GPS fix alone
+    assert (worker.location_lat, worker.location_lng) == (11.25, 75.79)
+
+    worker.location_area = 'Atlantis'  # moved somewhere the gazetteer does not know: no stale point
+    locate_worker(db, worker, area_changed=True)
+    assert (worker.location_lat, worker.location_lng, worker.location_source) == (None, None, None)
+    db.close()
@@ -0,0 +1,125 @@
+import io
+import os
+import pytest
+from typing import List
+from fastapi import FastAPI, File, UploadFile, Depends, Header
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import Blob, PhotoVariant, Worker, WorkerPhoto
+from blob_store import store_uploads, collect_garbage, blob_sha
+import image_variants
+from image_variants import generate_variants, photo_response, add_thumbnails, VARIANTS
+
+Image = pytest.importorskip('PIL.Image')
+
+engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+app = FastAPI()
+
+@app.post('/workers/{worker_id}/photos')
+async def upload(worker_id: str, photos: List[UploadFile] = File(...), db=Depends(get_db)):
+    saved = await store_uploads(db, photos, lambda _: 'jpg', 20 * 1024 * 1024)
+    ids = []
+    for s in saved:
+        wp = WorkerPhoto(worker_id=worker_id, file_path=s.path)
+        db.add(wp)
+        db.flush()
+        ids.append(wp.id)
+    db.commit()
+    return {'ids': ids, 'paths': [s.path for s in saved]}
+
+@app.get('/workers/photos/{photo_id}')
+def get_photo(photo_id: str, size: str = 'card', format: str = None,
+              accept: str = Header(None), db=Depends(get_db)):
+    return photo_response(db, photo_id, size, format, accept)
+
+client = TestClient(app)
+
+def camera_photo(width=3000, height=2000) -> bytes:
+    # Noise-free gradients compress too well to be realistic; mix in some texture
+    image = Image.effect_noise((width, height), 40).convert('RGB')
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=92)
+    return buf.getvalue()
+
+def test_variants_are_rendered_and_served(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    db.add(Worker(id='v1', phone='9000000501'))
+    db.commit()
+    original = camera_photo()
+    uploaded = client.post('/workers/v1/photos', files=[('photos', ('cam.jpg', original))]).json()
+    photo_id, path = uploaded['ids'][0], uploaded['paths'][0]
+
+    # Before rendering the original is served, uncached, and rendering is queued
+    monkeypatch.setattr(image_variants, 'schedule_variants', lambda paths: [])
+    res = client.get(f'/workers/photos/{photo_id}?size=thumb', headers={'Accept': 'image/webp'})
+    assert res.status_code == 200 and res.content == original
+    assert res.headers['cache-control'] == 'no-cache'
+
+    assert generate_variants(db, path) == len(VARIANTS) * 2
+    assert generate_variants(db, path) == 0
+
+    thumb = client.get(f'/workers/photos/{photo_id}?size=thumb', headers={'Accept': 'image/webp,*/*'})
+    assert thumb.headers['content-type'] == 'image/webp'
+    assert thumb.headers['vary'] == 'Accept'
+    assert Image.open(io.BytesIO(thumb.content)).size == (160, 107)
+    # An order of magnitude smaller is the point; in practice it is far more
+    assert len(thumb.content) * 10 < len(original)
+
+    jpeg = client.get(f'/workers/photos/{photo_id}?size=full')
+    assert jpeg.headers['content-type'] == 'image/jpeg'
+    assert max(Image.open(io.BytesIO(jpeg.content)).size) == 1600
+    assert client.get(f'/workers/photos/{photo_id}?size=original').content == original
+    assert client.get(f'/workers/photos/{photo_id}?size=huge').status_code == 400
+    assert client.get('/workers/photos/missing').status_code == 404
+
+def test_small_photos_are_not_upscaled_and_duplicates_render_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    small = camera_photo(300, 200)
+    first = client.post('/workers/v2/photos', files=[('photos', ('a.jpg', small))]).json()
+    second = client.post('/workers/v3/photos', files=[('photos', ('b.jpg', small))]).json()
+    assert first['paths'] == second['paths']
+    generate_variants(db, first['paths'][0])
+    assert generate_variants(db, second['paths'][0]) == 0
+    sha256 = blob_sha(first['paths'][0])
+    sizes = {(v.variant, v.width) for v in db.query(PhotoVariant).filter(
+        PhotoVariant.source_sha256 == sha256, PhotoVariant.format == 'webp')}
+    assert sizes == {('thumb', 160), ('card', 300), ('full', 300)}
+
+def test_search_results_get_one_thumbnail_each(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    first = client.post('/workers/s1/photos', files=[('photos', ('a.jpg', camera_photo(200, 200)))]).json()
+    client.post('/workers/s1/photos', files=[('photos', ('b.jpg', camera_photo(210, 200)))])
+    results = add_thumbnails(db, [{'id': 's1'}, {'id': 'nobody'}])
+    assert results[0]['photo_url'] == f'/api/workers/photos/{first["ids"][0]}?size=thumb'
+    assert results[1]['photo_url'] is None
+
+def test_garbage_collection_removes_variants(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = SessionLocal()
+    path = client.post('/workers/g1/photos', files=[('photos', ('a.jpg', camera_photo(400, 300)))]).json()['paths'][0]
+    generate_variants(db, path)
+    files = [v.path for v in db.query(PhotoVariant).filter(PhotoVariant.source_sha256 == blob_sha(path))]
+    assert files and all(os.path.exists(f) for f in files)
+
+    db.query(WorkerPhoto).filter(WorkerPhoto.file_path == path).delete()
+    db.commit()
+    collect_garbage(db, grace_seconds=-1)
+    assert db.query(Blob).filter(Blob.path == path).count() == 0
+    assert not any(os.path.exists(f) for f in files)
+    assert db.query(PhotoVariant).filter(PhotoVariant.source_sha256 == blob_sha(path)).count() == 0
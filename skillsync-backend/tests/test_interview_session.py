@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import ai
+import interview_session
+import ai_client
+from ai_client import AIClient
+from model_backends import StubBackend
+from src.routers.ai_call import router, QUESTION_KEYS
+from streaming_transcription import to_wav
+
+np = pytest.importorskip('numpy')
+
+app = FastAPI()
+app.include_router(router)
+
+def voice(seconds) -> bytes:
+    t = np.arange(int(seconds * 16000)) / 16000
+    buzz = 0.1 * sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 6))
+    return to_wav((buzz * 32767).astype('<i2').tobytes())
+
+@pytest.fixture
+def stub(monkeypatch):
+    backend = StubBackend(latency_ms=0, audio_ms=200, jitter_ms=0)  # 200 ms per second of audio
+    monkeypatch.setattr(ai, 'model', backend)
+    monkeypatch.setattr(ai, 'client', AIClient(backend, max_concurrency=8))
+    monkeypatch.setattr(ai, 'schedule_delete', backend.delete_file)
+    monkeypatch.setattr(interview_session, 'CONCURRENCY', 4)
+    monkeypatch.setattr(interview_session, '_slots', threading.BoundedSemaphore(4))
+    return backend
+
+def post_session(recordings: dict, **data):
+    files = [('audio', (f'{key}.wav', audio, 'audio/wav')) for key, audio in recordings.items()]
+    form = {'language': 'Hindi', 'question_keys': list(recordings), **data}
+    return TestClient(app).post('/api/ai-call/session', files=files, data=form)
+
+def test_interview_takes_about_as_long_as_its_slowest_answer(stub):
+    response = post_session({key: voice(1.0) for key in QUESTION_KEYS[:4]},
+                            answers=json.dumps({'daily_rate': '600', 'aadhaar_last4': '1234'}))
+    assert response.status_code == 200
+    body = response.json()
+    assert [q['status'] for q in body['questions'].values()] == ['ok'] * 4
+    slowest = max(q['ms'] for q in body['questions'].values())
+    assert slowest >= 200
+    assert body['timings']['transcribe_ms'] < slowest + 150  # side by side, not 800 ms in a row
+    assert list(body['answers']) == QUESTION_KEYS[:5] + ['aadhaar_last4']  # question order, typed answers included
+    assert body['profile']['skill_type'] and body['profile']['name'] == body['answers']['name']
+    assert stub.stats['generate_content'] == 5  # four transcriptions, one extraction
+
+def test_answers_beyond_the_concurrency_limit_wait_their_turn(stub, tmp_path):
+    recordings = {}
+    for key in QUESTION_KEYS:
+        recordings[key] = str(tmp_path / f'{key}.wav')
+        (tmp_path / f'{key}.wav').write_bytes(voice(1.0))
+    started = time.perf_counter()
+    results = interview_session.transcribe_answers(recordings, 'Hindi', concurrency=4)
+    elapsed = time.perf_counter() - started
+    assert list(results) == QUESTION_KEYS
+    assert [r['status'] for r in results.values()] == ['ok'] * len(QUESTION_KEYS)
+    assert stub.stats['max_in_flight'] == 4
+    assert 0.4 <= elapsed < 0.7  # two rounds of 200 ms, not eight
+
+def test_failed_answers_are_reported_without_sinking_the_interview(stub):
+    silence = to_wav(bytes(32000))
+    response = post_session({'name': voice(1.0), 'skill': silence, 'about': b'not audio'})
+    assert response.status_code == 200
+    questions = response.json()['questions']
+    assert questions['name']['status'] == 'ok'
+    assert questions['skill']['status'] == 'no_speech'
+    assert set(response.json()['answers']) <= {'name', 'about'}
+
+def test_bad_sessions_are_rejected(stub):
+    assert post_session({'favourite_colour': voice(0.5)}).status_code == 400
+    response = TestClient(app).post('/api/ai-call/session', data={'language': 'Hindi', 'question_keys': ['name', 'skill']},
+                                    files=[('audio', ('name.wav', voice(0.5), 'audio/wav'))])
+    assert response.status_code == 400
+    assert post_session({'name': voice(0.5)}, answers='[1, 2]').status_code == 400
+
+def test_concurrent_sessions_share_slots_instead_of_shedding_answers(stub, tmp_path, monkeypatch):
+    assert interview_session.SESSION_SLOTS < ai_client.MAX_CONCURRENCY
+    monkeypatch.setattr(interview_session, '_slots', threading.BoundedSemaphore(3))
+    monkeypatch.setattr(ai, 'client', AIClient(stub, max_concurrency=4, queue_timeout=0.05))
+    recordings = {}
+    for key in QUESTION_KEYS[:4]:
+        recordings[key] = str(tmp_path / f'{key}.wav')
+        (tmp_path / f'{key}.wav').write_bytes(voice(1.0))
+    results = []
+    sessions = [threading.Thread(target=lambda: results.append(interview_session.transcribe_answers(recordings, 'Hindi')))
+                for _ in range(2)]
+    for t in sessions:
+        t.start()
+    for t in sessions:
+        t.join()
+    assert [r['status'] for session in results for r in session.values()] == ['ok'] * 8
+    assert stub.stats['max_in_flight'] == 3
+
+def test_answers_lost_to_an_outage_fail_the_session(stub, monkeypatch):
+    monkeypatch.setattr(ai, 'voice_to_text', lambda path, language: ai.OUTAGE_MESSAGE)
+    response = post_session({'name': voice(0.5), 'skill': voice(0.5)})
+    assert response.status_code == 503 and response.headers['Retry-After']
+    assert response.json()['detail']['unavailable'] == ['name', 'skill']
+    assert stub.stats['generate_content'] == 0  # no profile extracted from what was left
@@ -0,0 +1,30 @@
+import random
+import pytest
+from load_test import percentile, parse_flows, Stats
+from synthetic_data import generate_workers, load_centroids
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7.0], 95) == 7.0
+    assert percentile([], 50) == 0.0
+
+def test_parse_flows():
+    assert parse_flows('search=3,job') == {'search': 3.0, 'job': 1.0}
+    with pytest.raises(Exception):
+        parse_flows('checkout=1')
+
+def test_stats_report_counts_errors():
+    stats = Stats()
+    stats.record('GET /x', 0.010, True)
+    stats.record('GET /x', 0.030, False)
+    row = stats.report()['endpoints']['GET /x']
+    assert (row['requests'], row['errors'], row['max_ms']) == (2, 1, 30.0)
+
+def test_generated_workers_are_valid_and_deterministic():
+    a = list(generate_workers(random.Random(3), 50, load_centroids()))
+    b = list(generate_workers(random.Random(3), 50, load_centroids()))
+    assert a == b
+    assert len({w['phone'] for w in a}) == 50
+    assert any('location_lat' not in w for w in a)
@@ -0,0 +1,148 @@
+import asyncio
+import io
+import os
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import media
+from media import MediaFiles, MediaResponse, parse_range, measure, IMMUTABLE
+from database import Base, get_db
+from models import Worker, WorkerPhoto
+from blob_store import blob_path
+
+SHA = 'ab' * 32
+AUDIO = bytes(range(256)) * 40
+
+def make_client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('uploads/audio')
+    app = FastAPI()
+    app.mount('/uploads', MediaFiles(directory='uploads'), name='uploads')
+    return TestClient(app)
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def test_parse_range():
+    assert parse_range('bytes=0-9', 100) == (0, 9)
+    assert parse_range('bytes=90-', 100) == (90, 99)
+    assert parse_range('bytes=-10', 100) == (90, 99)
+    assert parse_range('bytes=50-500', 100) == (50, 99)
+    assert parse_range('bytes=100-', 100) == 'invalid'
+    assert parse_range('bytes=0-1,5-6', 100) is None
+    assert parse_range('pages=1', 100) is None
+
+def test_content_addressed_media_is_immutable(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    path = blob_path(SHA, 'webm')
+    write(path, AUDIO)
+
+    res = client.get('/' + path)
+    assert res.content == AUDIO
+    assert res.headers['etag'] == f'"{SHA}"'
+    assert res.headers['cache-control'] == IMMUTABLE
+    assert res.headers['accept-ranges'] == 'bytes'
+    again = client.get('/' + path, headers={'If-None-Match': f'W/"{SHA}"'})
+    assert again.status_code == 304 and again.content == b''
+
+def test_legacy_files_get_content_etags_and_revalidate(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    write('uploads/audio/old.mp3', b'old audio')
+    res = client.get('/uploads/audio/old.mp3')
+    assert res.headers['cache-control'] == 'no-cache'
+    etag = res.headers['etag']
+    assert client.get('/uploads/audio/old.mp3', headers={'If-None-Match': etag}).status_code == 304
+
+    write('uploads/audio/old.mp3', b'new audio!')
+    os.utime('uploads/audio/old.mp3', ns=(1, 1))
+    changed = client.get('/uploads/audio/old.mp3', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.content == b'new audio!'
+    assert client.get('/uploads/audio/missing.mp3').status_code == 404
+
+def test_byte_ranges_for_audio_seeking(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    path = '/' + blob_path(SHA, 'webm')
+    write(path[1:], AUDIO)
+
+    part = client.get(path, headers={'Range': 'bytes=1000-1999'})
+    assert part.status_code == 206
+    assert part.content == AUDIO[1000:2000]
+    assert part.headers['content-range'] == f'bytes 1000-1999/{len(AUDIO)}'
+    assert part.headers['content-length'] == '1000'
+    assert client.get(path, headers={'Range': 'bytes=-16'}).content == AUDIO[-16:]
+
+    unsatisfiable = client.get(path, headers={'Range': f'bytes={len(AUDIO)}-'})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers['content-range'] == f'bytes */{len(AUDIO)}'
+    # A stale If-Range means the client's partial copy is useless: send everything
+    stale = client.get(path, headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+    assert stale.status_code == 200 and stale.content == AUDIO
+    head = client.head(path, headers={'Range': 'bytes=0-9'})
+    assert head.status_code == 206 and head.content == b''
+
+def run_response(response, extensions):
+    scope = {'type': 'http', 'method': 'GET', 'headers': [(b'range', b'bytes=10-19')],
+             'extensions': extensions}
+    messages = []
+    async def send(message):
+        messages.append(message)
+    asyncio.run(response(scope, None, send))
+    return messages
+
+def test_zero_copy_sends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('uploads/a.bin', AUDIO)
+
+    messages = run_response(MediaResponse('uploads/a.bin'), {'http.response.zerocopysend': {}})
+    assert messages[0]['status'] == 206
+    assert (messages[1]['type'], messages[1]['offset'], messages[1]['count']) == ('http.response.zerocopysend', 10, 10)
+
+    # pathsend can only carry a whole file, so a range falls back to reading
+    messages = run_response(MediaResponse('uploads/a.bin'), {'http.response.pathsend': {}})
+    assert messages[1]['type'] == 'http.response.body' and messages[1]['body'] == AUDIO[10:20]
+
+    monkeypatch.setattr(media, 'ACCEL_PREFIX', '/protected')
+    messages = run_response(MediaResponse('uploads/a.bin'), {})
+    headers = dict(messages[0]['headers'])
+    assert headers[b'x-accel-redirect'] == b'/protected/uploads/a.bin'
+    assert messages[1]['body'] == b''
+
+def test_repeated_profile_browse(tmp_path, monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    from routers.workers import router as workers_router
+    from image_variants import generate_variants
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('uploads')
+
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    db.add(Worker(id='m1', phone='9000000601', voice_bio_path=blob_path('cd' * 32, 'webm')))
+    write(blob_path('cd' * 32, 'webm'), AUDIO * 10)
+    for i in range(3):
+        buf = io.BytesIO()
+        Image.effect_noise((2000, 1500), 30 + i).convert('RGB').save(buf, 'JPEG', quality=90)
+        path = blob_path(f'{i:02d}' * 32, 'jpg')
+        write(path, buf.getvalue())
+        db.add(WorkerPhoto(worker_id='m1', file_path=path))
+        db.commit()
+        generate_variants(db, path)
+
+    app = FastAPI()
+    app.include_router(workers_router, prefix='/api/workers')
+    app.mount('/uploads', MediaFiles(directory='uploads'), name='uploads')
+    app.dependency_overrides[get_db] = lambda: SessionLocal()
+
+    results = measure(app, 'm1')
+    no_cache, cached = results['no_cache'], results['browser_cache']
+    assert no_cache['first_visit'] == no_cache['repeat_visit']
+    assert no_cache['first_visit'][0] == 5  # profile, three photos, voice bio
+    # On the repeat visit only the profile JSON goes over the wire
+    assert cached['repeat_visit'][0] == 1
+    assert cached['repeat_visit'][1] * 20 < no_cache['repeat_visit'][1]
@@ -0,0 +1,46 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from metrics import Registry, Counter, Histogram, MetricsMiddleware, HTTP_REQUESTS, HTTP_LATENCY, track_ai, AI_CALLS
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+@app.get('/things/{thing_id}')
+def get_thing(thing_id: str):
+    return {'id': thing_id}
+
+client = TestClient(app)
+
+def test_exposition_format():
+    registry = Registry()
+    hits = registry.register(Counter('demo_total', 'Demo counter.', ('kind',)))
+    latency = registry.register(Histogram('demo_seconds', 'Demo latency.', (), buckets=(0.1, 1.0)))
+    hits.inc('a"b')
+    latency.observe(value=0.05)
+    latency.observe(value=3)
+    text = registry.expose()
+    assert '# TYPE demo_total counter' in text
+    assert 'demo_total{kind="a\\"b"} 1' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1.0"} 1' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in text
+    assert 'demo_seconds_count 2' in text
+
+def test_middleware_labels_by_route_template():
+    before = HTTP_REQUESTS.get('GET', '/things/{thing_id}', 200)
+    client.get('/things/1')
+    client.get('/things/2')
+    client.get('/nowhere')
+    assert HTTP_REQUESTS.get('GET', '/things/{thing_id}', 200) == before + 2
+    assert HTTP_REQUESTS.get('GET', 'unmatched', 404) >= 1
+    assert ('GET', '/things/{thing_id}') in HTTP_LATENCY.values
+
+def test_track_ai_counts_errors():
+    @track_ai
+    def flaky_model_call():
+        raise RuntimeError('quota')
+    try:
+        flaky_model_call()
+    except RuntimeError:
+        pass
+    assert AI_CALLS.get('flaky_model_call', 'error') == 1
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import ai
+import ai_client
+from ai_client import AIClient, CircuitBreaker
+from model_backends import StubBackend
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def stub_ai(monkeypatch):
+    def install(backend, **kwargs):
+        monkeypatch.setattr(ai, 'model', backend)
+        monkeypatch.setattr(ai, 'client', AIClient(backend, **kwargs))
+        return backend
+    monkeypatch.setattr(ai_client, 'BACKOFF_BASE', 0.001)
+    return install
+
+
+def test_outputs_are_deterministic_and_shaped_like_gemini(stub_ai, tmp_path):
+    stub_ai(StubBackend(latency_ms=0, image_ms=0, jitter_ms=0))
+    profile = ai.extract_profile('I am an electrician with 12 years of experience in Bandra. I charge 700 rupees.', 'Hindi')
+    assert profile['skill_type'] == 'Electrician'
+    assert (profile['experience_years'], profile['daily_rate'], profile['work_areas']) == (12, 700, ['Bandra'])
+
+    paths = []
+    for i, color in enumerate(['red', 'green', 'blue']):
+        paths.append(str(tmp_path / f'{i}.jpg'))
+        Image.new('RGB', (200, 150), color).save(paths[-1])
+    complaint = ai.analyze_complaint_photo(paths[0])
+    assert complaint == ai.analyze_complaint_photo(paths[0])
+    assert set(complaint) == {'issue_type', 'confidence_score', 'suggested_worker_skill', 'description_for_worker'}
+
+    batch = ai.analyze_photo_batch(paths, 'complaint')
+    assert batch[0] == dict(index=1, **complaint)
+    tags = ai.analyze_photo_batch(paths, 'portfolio')
+    assert [r['index'] for r in tags] == [1, 2, 3] and all(r['tags'] for r in tags)
+
+
+def test_transcription_round_trip(stub_ai, tmp_path):
+    backend = stub_ai(StubBackend(latency_ms=0, jitter_ms=0))
+    audio = tmp_path / 'bio.wav'
+    audio.write_bytes(b'RIFF fake audio')
+    uploaded = ai.client.upload_file(str(audio))
+    assert ai.client.get_file(uploaded.name).state.name == 'ACTIVE'
+    transcript = ai.client.generate_content([uploaded, 'Transcribe exactly what is spoken.']).text
+    profile = ai.extract_profile(transcript, 'Hindi')
+    assert profile['skill_type'].lower() in transcript and profile['daily_rate']
+    ai.client.delete_file(uploaded.name)
+    assert backend.stats['upload_file'] == backend.stats['delete_file'] == 1
+
+
+def test_injected_errors_trip_the_breaker_and_fall_back(stub_ai):
+    backend = stub_ai(StubBackend(latency_ms=0, jitter_ms=0, error_rate=1.0),
+                      retries=1, breaker=CircuitBreaker(failures=4, reset_after=60))
+    for _ in range(5):
+        assert ai.extract_profile('I am a mason', 'Tamil')['skill_type'] == 'Other'
+    assert backend.stats['errors'] == 4  # two calls of two attempts, then the circuit is open
+    assert ai.client.breaker.state == 'open'
+
+
+def test_latency_and_queueing(stub_ai):
+    backend = stub_ai(StubBackend(latency_ms=100, jitter_ms=0), max_concurrency=2, queue_timeout=5)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda i: ai.extract_profile(f'painter {i} years', 'Hindi'), range(6)))
+    assert [r['experience_years'] for r in results] == list(range(6))
+    assert backend.stats['max_in_flight'] == 2
+    assert time.perf_counter() - started >= 0.3
@@ -0,0 +1,37 @@
+import io
+import pytest
+from model_images import prepare_for_model, prepare_many, measure
+
+Image = pytest.importorskip('PIL.Image')
+
+def phone_photo(path, size=(4000, 3000), orientation=None):
+    img = Image.effect_noise((size[0] // 4, size[1] // 4), 30).convert('RGB').resize(size)
+    exif = Image.Exif()
+    exif[0x8825] = {2: (12.0, 58.0, 30.0)}  # GPS latitude
+    exif[0x010F] = 'PhoneMaker'
+    if orientation:
+        exif[0x0112] = orientation
+    img.save(path, 'JPEG', quality=92, exif=exif)
+    return str(path)
+
+def test_prepared_image_is_small_and_has_no_metadata(tmp_path):
+    path = phone_photo(tmp_path / 'a.jpg')
+    part = prepare_for_model(path)
+    assert part['mime_type'] == 'image/jpeg'
+    img = Image.open(io.BytesIO(part['data']))
+    assert img.size == (1024, 768)
+    assert not img.getexif()
+    assert 'exif' not in img.info
+
+    row = measure([path])[0]
+    assert row['after_bytes'] * 4 < row['before_bytes']
+
+def test_orientation_is_applied_before_stripping(tmp_path):
+    path = phone_photo(tmp_path / 'sideways.jpg', orientation=6)  # rotated 90° clockwise
+    assert Image.open(io.BytesIO(prepare_for_model(path)['data'])).size == (768, 1024)
+
+def test_small_and_non_jpeg_images(tmp_path):
+    Image.new('RGBA', (300, 200), (255, 0, 0, 128)).save(tmp_path / 'logo.png')
+    small = phone_photo(tmp_path / 'small.jpg', size=(640, 480))
+    parts = prepare_many([str(tmp_path / 'logo.png'), small])
+    assert [Image.open(io.BytesIO(p['data'])).size for p in parts] == [(300, 200), (640, 480)]
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from metrics import OTP_EXPIRED
+from models import OTPCode
+import auth
+import otp_store
+import rate_limit
+from src.routers.ai_call import router
+
+engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+app = FastAPI()
+app.include_router(router)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(otp_store, 'SessionLocal', SessionLocal)
+    monkeypatch.setattr(otp_store, 'SWEEP_SLACK_SECONDS', 0)
+    monkeypatch.setattr(rate_limit, 'store', rate_limit.MemoryBuckets())
+    yield otp_store
+    db = SessionLocal()
+    db.query(OTPCode).delete()
+    db.commit()
+    db.close()
+
+def count_codes() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(OTPCode).count()
+    finally:
+        db.close()
+
+def test_codes_expire_and_resending_replaces(store):
+    auth.send_otp('9000000001')
+    code = store.get('login', '9000000001')['code']
+    assert auth.verify_otp('9000000001', code)
+    assert not auth.verify_otp('9000000001', '12345')
+    assert store.get('aadhaar', '9000000001') is None  # purposes are kept apart
+
+    store.put('login', '9000000001', 'resent')
+    assert not auth.verify_otp('9000000001', code)
+    assert auth.verify_otp('9000000001', ' resent ')
+
+    store.put('login', '9000000002', '654321', ttl=-1)
+    assert store.get('login', '9000000002') is None
+    assert not auth.verify_otp('9000000002', '654321')
+
+def test_codes_work_once_and_die_after_too_many_guesses(store, monkeypatch):
+    monkeypatch.setattr(otp_store, 'OTP_MAX_ATTEMPTS', 3)
+    store.put('login', '9000000501', '111111')
+    assert store.verify('login', '9000000501', '111111')
+    assert not store.verify('login', '9000000501', '111111')  # used up
+    assert store.get('login', '9000000501') is None
+
+    store.put('login', '9000000502', '222222')
+    assert not store.verify('login', '9000000502', '000000')
+    assert not store.verify('login', '9000000502', '')
+    assert store.get('login', '9000000502') is not None
+    assert not store.verify('login', '9000000502', '000001')  # third wrong guess
+    assert store.get('login', '9000000502') is None
+    assert not store.verify('login', '9000000502', '222222')
+
+    store.put('login', '9000000502', '333333')  # a new code starts a fresh count
+    assert not store.verify('login', '9000000502', '000000')
+    assert store.verify('login', '9000000502', '333333')
+
+def test_expired_codes_are_swept(store):
+    before, waiting = OTP_EXPIRED.get(), store.pending()
+    for i in range(20):
+        store.put('login', f'90000001{i:02d}', '111111', ttl=1)
+    store.put('login', '9000000200', '222222', ttl=60)
+    assert count_codes() == 21
+    deadline = time.time() + 5
+    while count_codes() > 1 and time.time() < deadline:
+        time.sleep(0.1)
+    assert count_codes() == 1
+    assert OTP_EXPIRED.get() - before == 20
+    assert store.pending() == waiting + 1  # of these, only the 60 s code is still waiting
+    assert store.verify('login', '9000000200', '222222')
+
+def test_verify_works_in_another_process(tmp_path, monkeypatch):
+    file_engine = create_engine(f'sqlite:///{tmp_path}/skillsync.db')
+    Base.metadata.create_all(bind=file_engine)
+    monkeypatch.setattr(otp_store, 'SessionLocal', sessionmaker(bind=file_engine))
+    otp_store.put('login', '9000000301', '424242')
+
+    # A second worker process: its database.py opens ./skillsync.db in its own working directory
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    verify = ("import sys, auth; "
+              "sys.exit(0 if auth.verify_otp('9000000301', '424242') and not auth.verify_otp('9000000301', '1') else 1)")
+    assert subprocess.run([sys.executable, '-c', verify], cwd=tmp_path, env=env, capture_output=True).returncode == 0
+    file_engine.dispose()
+
+def test_aadhaar_otp_endpoints(store):
+    client = TestClient(app)
+    otp = client.post('/api/ai-call/generate-otp', json={'phone': '9000000401', 'aadhaar_last4': '1234'}).json()['demo_otp']
+    assert client.post('/api/ai-call/verify-otp', json={'phone': '9000000401', 'otp': '0'}).json()['verified'] is False
+    assert client.post('/api/ai-call/verify-otp', json={'phone': '9000000401', 'otp': otp}).json()['verified'] is True
+    assert store.get('aadhaar', '9000000401')['data'] == {'aadhaar_last4': '1234', 'verified': True}
+    assert client.post('/api/ai-call/verify-otp', json={'phone': '9000000401', 'otp': otp}).status_code == 400
+
+    store.put('aadhaar', '9000000401', otp, ttl=-1)
+    assert client.post('/api/ai-call/verify-otp', json={'phone': '9000000401', 'otp': otp}).status_code == 400
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import threading
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import WorkerPhoto, JobRequest
+import ai
+import photo_analysis
+from photo_analysis import pending_photos, run_pending
+
+Image = pytest.importorskip('PIL.Image')
+analyze_photo_batch = ai.analyze_photo_batch  # before the fixture stubs it
+
+# A file, not one shared in-memory connection: batches commit from several threads at once
+engine = create_engine(f'sqlite:///{tempfile.mkdtemp()}/photos.db', connect_args={'check_same_thread': False})
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+def make_photo(path, color):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new('RGB', (64, 48), color).save(path, 'JPEG')
+    return path
+
+@pytest.fixture
+def fake_model(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(photo_analysis, 'SessionLocal', SessionLocal)
+    monkeypatch.setattr(ai, 'model', object())
+    calls = []
+    in_flight = [0, 0]  # current, max
+    lock = threading.Lock()
+
+    def analyze_photo_batch(paths, task):
+        with lock:
+            calls.append((task, list(paths)))
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        try:
+            if task == 'portfolio':
+                return [{'index': i, 'tags': ['Plumbing', os.path.basename(p)]} for i, p in enumerate(paths, 1)]
+            return [{'index': i, 'issue_type': 'pipe_burst', 'description_for_worker': 'Burst pipe'}
+                    for i, _ in enumerate(paths, 1)]
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    monkeypatch.setattr(ai, 'analyze_photo_batch', analyze_photo_batch)
+    yield calls, in_flight
+    db = SessionLocal()
+    db.query(WorkerPhoto).delete()
+    db.query(JobRequest).delete()
+    db.commit()
+
+def test_pending_photos_are_analysed_in_batches(fake_model):
+    calls, in_flight = fake_model
+    db = SessionLocal()
+    paths = [make_photo(f'uploads/p{i}.jpg', (i * 20, 0, 0)) for i in range(10)]
+    for path in paths:
+        db.add(WorkerPhoto(worker_id='w1', file_path=path))
+    db.add(WorkerPhoto(worker_id='w2', file_path=paths[0]))  # same blob, analysed once
+    db.add(JobRequest(customer_id='c1', worker_id='w1', complaint_photo_path=make_photo('uploads/leak.jpg', 'blue')))
+    db.commit()
+
+    stats = run_pending(batch_size=4, concurrency=2)
+    assert stats == {'images': 11, 'batches': 4, 'analysed': 11, 'failed_batches': 0}
+    assert sorted(len(paths) for task, paths in calls if task == 'portfolio') == [2, 4, 4]
+    assert in_flight[1] <= 2
+
+    assert {p.ai_tags for p in db.query(WorkerPhoto).filter(WorkerPhoto.file_path == paths[0])} == {'plumbing,p0.jpg'}
+    job = db.query(JobRequest).one()
+    assert (job.ai_issue_type, job.ai_description) == ('pipe_burst', 'Burst pipe')
+    assert pending_photos(db) == {'portfolio': [], 'complaint': []}
+    assert run_pending()['batches'] == 0
+
+def test_failed_batches_stay_pending_and_broken_images_are_skipped(fake_model, monkeypatch):
+    calls, _ = fake_model
+    db = SessionLocal()
+    good = make_photo('uploads/good.jpg', 'red')
+    os.makedirs('uploads', exist_ok=True)
+    with open('uploads/broken.jpg', 'wb') as f:
+        f.write(b'not an image')
+    db.add_all([WorkerPhoto(worker_id='w1', file_path=good), WorkerPhoto(worker_id='w1', file_path='uploads/broken.jpg')])
+    db.commit()
+
+    def unavailable(paths, task):
+        raise RuntimeError('quota exceeded')
+    monkeypatch.setattr(ai, 'analyze_photo_batch', unavailable)
+    assert run_pending()['failed_batches'] == 1
+    assert pending_photos(db)['portfolio'] == ['uploads/broken.jpg', good]
+
+    monkeypatch.setattr(ai, 'analyze_photo_batch', lambda paths, task: [{'tags': ['tiling']} for _ in paths])
+    assert run_pending()['analysed'] == 2
+    db.expire_all()
+    tags = {p.file_path: p.ai_tags for p in db.query(WorkerPhoto)}
+    assert tags == {good: 'tiling', 'uploads/broken.jpg': ''}
+
+def test_failing_complaint_photos_are_given_up_on(fake_model, monkeypatch):
+    calls, _ = fake_model
+    db = SessionLocal()
+    os.makedirs('uploads', exist_ok=True)
+    with open('uploads/blurry.jpg', 'wb') as f:
+        f.write(b'not an image')
+    db.add_all([JobRequest(customer_id='c1', worker_id='w1', complaint_photo_path=make_photo('uploads/leak.jpg', 'blue')),
+                JobRequest(customer_id='c2', worker_id='w1', complaint_photo_path='uploads/blurry.jpg')])
+    db.commit()
+
+    def unavailable(paths, task):
+        calls.append((task, list(paths)))
+        raise RuntimeError('model rejects this image')
+    monkeypatch.setattr(ai, 'analyze_photo_batch', unavailable)
+    for _ in range(photo_analysis.MAX_ATTEMPTS + 2):
+        run_pending()
+    assert calls == [('complaint', ['uploads/leak.jpg'])] * photo_analysis.MAX_ATTEMPTS
+    assert pending_photos(db) == {'portfolio': [], 'complaint': []}
+    assert {job.ai_issue_type for job in db.query(JobRequest)} == {None}
+
+def test_nothing_runs_without_a_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai, 'model', None)
+    assert run_pending() == {'images': 0, 'batches': 0, 'analysed': 0, 'failed_batches': 0}
+
+def test_an_open_breaker_costs_no_attempts(fake_model, monkeypatch):
+    from ai_client import AIClient, CircuitBreaker
+    from model_backends import StubBackend
+    db = SessionLocal()
+    db.add(JobRequest(customer_id='c1', worker_id='w1', complaint_photo_path=make_photo('uploads/leak.jpg', 'blue')))
+    db.commit()
+
+    breaker = CircuitBreaker(failures=1, reset_after=60)
+    breaker.record_failure()
+    monkeypatch.setattr(ai, 'client', AIClient(StubBackend(latency_ms=0, jitter_ms=0), breaker=breaker))
+    monkeypatch.setattr(ai, 'Image', Image)
+    monkeypatch.setattr(ai, 'analyze_photo_batch', analyze_photo_batch)
+    for _ in range(photo_analysis.MAX_ATTEMPTS + 1):
+        assert run_pending()['failed_batches'] == 1
+    assert pending_photos(db)['complaint'] == ['uploads/leak.jpg']
+    assert db.query(JobRequest).one().analysis_attempts == 0
@@ -0,0 +1,62 @@
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from profiling import ProfilingMiddleware, timed_ai, start_profile, stop_profile
+
+engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+SessionLocal = sessionmaker(bind=engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+app = FastAPI()
+app.add_middleware(ProfilingMiddleware, debug_headers=True)
+
+@timed_ai
+def fake_model_call():
+    return 'ok'
+
+@app.get('/items/{n}')
+def items(n: int, db=Depends(get_db)):
+    # one query per item, the pattern the middleware should flag
+    values = [db.execute(text('SELECT :i'), {'i': i}).scalar() for i in range(n)]
+    fake_model_call()
+    return {'values': values}
+
+client = TestClient(app)
+
+def test_headers_count_sql_and_ai():
+    r = client.get('/items/2')
+    assert r.status_code == 200
+    assert r.headers['x-sql-queries'] == '2'
+    assert 'ai;dur=' in r.headers['server-timing'] and 'desc="1 calls"' in r.headers['server-timing']
+    assert 'x-n-plus-one' not in r.headers
+
+def test_repeated_statement_is_flagged(capsys):
+    r = client.get('/items/8')
+    assert r.headers['x-n-plus-one'] == '8'
+    out = capsys.readouterr().out
+    assert '"route": "/items/{n}"' in out
+    assert '[WARNING] N+1 on GET /items/{n}: 8x SELECT ?' in out
+
+def test_start_profile_outside_http():
+    start_profile()
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    assert stop_profile().to_dict()['sql'] == 1
+
+def test_nested_ai_calls_count_once():
+    @timed_ai
+    def outer():
+        return fake_model_call() + fake_model_call()
+
+    start_profile()
+    outer()
+    profile = stop_profile()
+    assert profile.ai_count == 1
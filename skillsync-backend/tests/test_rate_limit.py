@@ -0,0 +1,143 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base, get_db
+from metrics import RATE_LIMITED
+import auth
+import otp_store
+import rate_limit
+from routers import auth_router, ivr
+from src.routers import ai_call
+
+engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+queries = []
+event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+
+def override_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+app = FastAPI()
+app.include_router(auth_router.router, prefix='/api/auth')
+app.include_router(ai_call.router)
+app.include_router(ivr.router, prefix='/api/ivr')
+app.dependency_overrides[get_db] = override_db
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(otp_store, 'SessionLocal', SessionLocal)
+    monkeypatch.setattr(rate_limit, 'store', rate_limit.SQLiteBuckets(str(tmp_path / 'ratelimit.db')))
+    queries.clear()
+    return TestClient(app)
+
+def test_otp_burst_gets_429_with_retry_after(client):
+    before = RATE_LIMITED.get('otp')
+    sends = [client.post('/api/auth/send-otp', json={'phone': '9100000001', 'role': 'worker'}) for _ in range(4)]
+    assert [r.status_code for r in sends] == [200, 200, 200, 429]
+    assert 1 <= int(sends[-1].headers['Retry-After']) <= 100  # 3 per 300 s: one token back every 100 s
+    assert RATE_LIMITED.get('otp') - before == 1
+    # Another phone from the same client still has its own bucket, and Aadhaar OTPs share the phone's
+    assert client.post('/api/auth/send-otp', json={'phone': '9100000002', 'role': 'worker'}).status_code == 200
+    assert client.post('/api/ai-call/generate-otp', json={'phone': '9100000001', 'aadhaar_last4': '1234'}).status_code == 429
+
+def test_ip_bucket_limits_many_phones(client, monkeypatch):
+    monkeypatch.setitem(rate_limit.LIMITS, ('otp', 'ip'), (5, 5 / 300))
+    codes = [client.post('/api/ai-call/generate-otp', json={'phone': f'91000001{i:02d}', 'aadhaar_last4': '1'}).status_code
+             for i in range(7)]
+    assert codes == [200] * 5 + [429] * 2
+
+def test_spoofed_forwarded_for_stays_in_one_ip_bucket(client, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'PROXY_HOPS', 1)
+    monkeypatch.setitem(rate_limit.LIMITS, ('otp', 'ip'), (3, 3 / 300))
+    # The proxy appends the address it saw; everything to its left comes from the client
+    codes = [client.post('/api/ai-call/generate-otp', json={'phone': f'91000003{i:02d}', 'aadhaar_last4': '1'},
+                         headers={'X-Forwarded-For': f'10.9.{i}.1, 203.0.113.7'}).status_code
+             for i in range(5)]
+    assert codes == [200] * 3 + [429] * 2
+    other = client.post('/api/ai-call/generate-otp', json={'phone': '9100000399', 'aadhaar_last4': '1'},
+                        headers={'X-Forwarded-For': '203.0.113.8'})
+    assert other.status_code == 200
+
+def test_refused_logins_never_reach_the_database(client, monkeypatch):
+    db = SessionLocal()
+    db.add(auth_router.Customer(id='c1', name='C', email='c@example.com', password_hash=auth.hash_password('right')))
+    db.commit()
+    db.close()
+    hashed = []
+    monkeypatch.setattr(auth_router, 'verify_password', lambda *args: hashed.append(1) or auth.verify_password(*args))
+    login = lambda password: client.post('/api/auth/customer/login', json={'email': 'c@example.com', 'password': password})
+    assert [login('wrong').status_code for _ in range(5)] == [401] * 5
+    seen = (len(queries), len(hashed))
+    assert seen[1] == 5
+    refused = login('right')  # even the right password waits once the email's bucket is empty
+    assert refused.status_code == 429 and 'Retry-After' in refused.headers
+    assert (len(queries), len(hashed)) == seen
+
+def test_tokens_refill_over_time(tmp_path):
+    buckets = rate_limit.SQLiteBuckets(str(tmp_path / 'ratelimit.db'))
+    bucket = [('otp:account:9100000201', 2, 0.5)]  # 2 tokens, one back every 2 s
+    assert buckets.take(bucket, 100.0) == 0
+    assert buckets.take(bucket, 100.0) == 0
+    assert buckets.take(bucket, 100.0) == pytest.approx(2.0)
+    assert buckets.take(bucket, 101.0) == pytest.approx(1.0)  # refused attempts are not charged
+    assert buckets.take(bucket, 102.0) == 0
+    assert buckets.take(bucket, 102.0) > 0
+
+def test_buckets_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'ratelimit.db')
+    spend = ("import sys, time, rate_limit; b = rate_limit.SQLiteBuckets(sys.argv[1]); "
+             "sys.exit(0 if all(b.take([('login:account:x', 3, 0.001)], time.time()) == 0 for _ in range(3)) else 1)")
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    assert subprocess.run([sys.executable, '-c', spend, path], cwd=tmp_path, env=env).returncode == 0
+    assert rate_limit.SQLiteBuckets(path).take([('login:account:x', 3, 0.001)], time.time()) > 0
+
+def test_full_buckets_are_swept(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'SWEEP_EVERY', 10)
+    buckets = rate_limit.SQLiteBuckets(str(tmp_path / 'ratelimit.db'))
+    for i in range(9):
+        buckets.take([(f'otp:ip:10.0.0.{i}', 3, 1.0)], 100.0)
+    buckets.take([('otp:ip:10.0.0.99', 3, 1.0)], 200.0)  # the tenth check; the first nine are full again by now
+    assert buckets._conn().execute('SELECT key FROM buckets').fetchall() == [('otp:ip:10.0.0.99',)]
+
+def ivr_at_otp_step(client, phone: str) -> str:
+    session_id = client.post('/api/ivr/start', json={'phone': phone}).json()['session_id']
+    for step in ({'digit': '5'}, {'voice_text': 'Test Worker'}):
+        client.post('/api/ivr/respond', json={'session_id': session_id, **step})
+    return session_id
+
+def test_ivr_otp_steps_share_the_limits(client, monkeypatch):
+    monkeypatch.setattr(otp_store, 'OTP_MAX_ATTEMPTS', 3)
+    phone = '9100000301'
+    aadhaar = lambda sid: client.post('/api/ivr/respond', json={'session_id': sid, 'digit': '1234'})
+    guess = lambda sid, code: client.post('/api/ivr/respond', json={'session_id': sid, 'digit': code})
+
+    session_id = ivr_at_otp_step(client, phone)
+    assert aadhaar(session_id).json()['current_state'] == 'OTP_VERIFY'
+    states = [guess(session_id, '000000').json()['current_state'] for _ in range(3)]
+    assert states == ['OTP_VERIFY', 'OTP_VERIFY', 'AADHAAR']  # the third wrong guess burns the code
+    assert otp_store.get('login', phone) is None
+
+    # Two more codes are allowed, then the phone's send bucket (3 per 300 s) is empty, same as /api/auth/send-otp
+    assert aadhaar(session_id).status_code == 200
+    assert client.post('/api/auth/send-otp', json={'phone': phone, 'role': 'worker'}).status_code == 200
+    other = ivr_at_otp_step(client, phone)
+    refused = aadhaar(other)
+    assert refused.status_code == 429 and 'Retry-After' in refused.headers
+
+    # Guesses draw from the phone's login bucket (5 per 300 s): three spent above, two left
+    assert [guess(session_id, '000001').status_code for _ in range(3)] == [200, 200, 429]
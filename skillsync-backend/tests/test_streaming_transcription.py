@@ -0,0 +1,121 @@
+import asyncio
+import json
+import math
+import struct
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import ai
+import streaming_transcription
+from ai_client import AIClient
+from audio_transcode import FFMPEG
+from model_backends import StubBackend
+from streaming_transcription import Segmenter, normalise, peak, PCM_RATE
+from src.routers.ai_call import router
+
+app = FastAPI()
+app.include_router(router)
+
+def speech(seconds, amplitude=0.3) -> bytes:
+    n = int(seconds * PCM_RATE)
+    return b''.join(struct.pack('<h', int(amplitude * 32767 * math.sin(2 * math.pi * 220 * i / PCM_RATE)))
+                    for i in range(n))
+
+def pause(seconds) -> bytes:
+    return bytes(int(seconds * PCM_RATE) * 2)
+
+def wav_file(pcm: bytes) -> bytes:
+    return streaming_transcription.to_wav(pcm)
+
+@pytest.fixture
+def stub(monkeypatch):
+    backend = StubBackend(latency_ms=0, audio_ms=0, jitter_ms=0)
+    monkeypatch.setattr(ai, 'model', backend)
+    monkeypatch.setattr(ai, 'client', AIClient(backend))
+    return backend
+
+def test_segments_are_cut_in_pauses():
+    answer = speech(4.0) + pause(0.3) + speech(3.0) + pause(0.4) + speech(2.0)
+    segmenter = Segmenter(segment_seconds=5)
+    segments = segmenter.feed(answer[:len(answer) // 2]) + segmenter.feed(answer[len(answer) // 2:])
+    assert len(segments) == 2
+    assert 4.0 <= len(segments[0]) / 2 / PCM_RATE <= 4.3  # inside the first pause, not at 5.0 s
+    assert sum(map(len, segments)) + len(segmenter.flush()) == len(answer)
+
+    quiet = speech(1.0, amplitude=0.05)
+    assert abs(peak(normalise(quiet)) - 0.95 * 32767) < 2
+
+def test_stream_returns_partials_then_final(stub):
+    answer = speech(4.0) + pause(0.3) + speech(4.5) + pause(0.3) + speech(2.0) + pause(2.0) + speech(1.0)
+    with TestClient(app).websocket_connect('/api/ai-call/voice-answer/stream?language=Tamil&question_key=skill&format=pcm16') as ws:
+        step = PCM_RATE // 2  # 0.25 s chunks
+        for i in range(0, len(answer), step):
+            ws.send_bytes(answer[i:i + step])
+        first = partial = ws.receive_json()
+        assert first['type'] == 'partial' and first['transcript']
+        while partial['transcript'].count('I am a') < 3:  # the three complete segments, before the end of speech
+            partial = ws.receive_json()
+        assert stub.stats['generate_content'] == 3
+        ws.send_text(json.dumps({'type': 'stop'}))
+        messages = [ws.receive_json()]
+        while messages[-1]['type'] == 'partial':
+            messages.append(ws.receive_json())
+    final = messages[-1]
+    assert final['type'] == 'final' and final['question_key'] == 'skill'
+    assert final['transcript'].startswith(first['transcript'])
+    assert final['transcript'].count('I am a') == 4  # cuts at about 4.1, 8.9 and 12.5 s, then the tail
+    assert stub.stats['generate_content'] == 4  # only the tail was left after the end of speech
+
+def test_silence_is_not_sent(stub):
+    with TestClient(app).websocket_connect('/api/ai-call/voice-answer/stream?format=pcm16') as ws:
+        ws.send_bytes(pause(6.0))
+        ws.send_text(json.dumps({'type': 'stop'}))
+        final = ws.receive_json()
+    assert final == {'type': 'final', 'question_key': '', 'transcript': '', 'finish_ms': final['finish_ms']}
+    assert stub.stats['generate_content'] == 0
+
+def test_fast_clients_queue_behind_their_own_segments(monkeypatch):
+    running, most = [0], [0]
+    lock = threading.Lock()
+
+    def transcribe_segment(wav, language):
+        with lock:
+            running[0] += 1
+            most[0] = max(most[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return 'words'
+
+    monkeypatch.setattr(ai, 'transcribe_segment', transcribe_segment)
+
+    async def stream():
+        transcription = streaming_transcription.TranscriptionStream('Hindi', fmt='pcm16', segment_seconds=2)
+        await transcription.feed((speech(1.7) + pause(0.3)) * 12)  # a dozen segments in one chunk
+        transcript = await transcription.finish()
+        return len(transcription.tasks), transcript
+
+    segments, transcript = asyncio.run(stream())
+    assert segments >= 10 and transcript.count('words') == segments
+    assert most[0] == streaming_transcription.SEGMENT_CONCURRENCY
+
+def test_errors_are_reported_on_the_socket(stub, monkeypatch):
+    with TestClient(app).websocket_connect('/api/ai-call/voice-answer/stream?format=flac') as ws:
+        assert ws.receive_json()['type'] == 'error'
+    monkeypatch.setattr(ai, 'model', None)
+    with TestClient(app).websocket_connect('/api/ai-call/voice-answer/stream?format=pcm16') as ws:
+        assert ws.receive_json()['detail'].startswith('AI service unavailable')
+
+@pytest.mark.skipif(FFMPEG is None, reason='ffmpeg not installed')
+def test_compressed_chunks_are_decoded_on_the_fly(stub):
+    data = wav_file(speech(6.0) + pause(0.2) + speech(1.0))
+    with TestClient(app).websocket_connect('/api/ai-call/voice-answer/stream?format=wav') as ws:
+        for i in range(0, len(data), 4096):
+            ws.send_bytes(data[i:i + 4096])
+        ws.send_text(json.dumps({'type': 'stop'}))
+        messages = [ws.receive_json()]
+        while messages[-1]['type'] == 'partial':
+            messages.append(ws.receive_json())
+    assert messages[-1]['type'] == 'final' and messages[-1]['transcript'].count('I am a') == 2
@@ -0,0 +1,67 @@
+import json
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import Worker
+from trust_score import calculate_trust_score
+from tracing import TracingMiddleware, BackgroundExporter, FileExporter, span, summarize
+
+engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+SessionLocal = sessionmaker(bind=engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def make_client(path):
+    exporter = BackgroundExporter(FileExporter(str(path)))
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, exporter=exporter)
+
+    @app.post('/workers/{worker_id}/score')
+    def score(worker_id: str, db=Depends(get_db)):
+        with span('stage.upload', bytes=10):
+            pass
+        return calculate_trust_score(worker_id, db)
+
+    return TestClient(app), exporter
+
+def test_request_produces_nested_spans(tmp_path):
+    db = SessionLocal()
+    db.add(Worker(id='t1', phone='9000000301', name='Trace Worker'))
+    db.commit()
+    db.close()
+
+    path = tmp_path / 'traces.jsonl'
+    client, exporter = make_client(path)
+    parent = '0af7651916cd43dd8448eb211c80319c'
+    r = client.post('/workers/t1/score', headers={'traceparent': f'00-{parent}-b7ad6b7169203331-01'})
+    assert r.status_code == 200
+    exporter.flush()
+
+    spans = json.loads(path.read_text())['resourceSpans'][0]['scopeSpans'][0]['spans']
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s['name'], []).append(s)
+    root = by_name['POST /workers/{worker_id}/score'][0]
+    trust = by_name['calculate_trust_score'][0]
+    assert root['parentSpanId'] == 'b7ad6b7169203331'
+    assert {s['traceId'] for s in spans} == {parent}
+    assert trust['parentSpanId'] == root['spanId']
+    assert by_name['stage.upload'][0]['parentSpanId'] == root['spanId']
+    assert all(q['parentSpanId'] == trust['spanId'] for q in by_name['db.query'])
+    assert len(by_name['db.query']) >= 4
+
+    summary = summarize(str(path))
+    assert summary['db.query']['count'] == len(by_name['db.query'])
+
+def test_span_is_noop_outside_a_trace():
+    with span('nothing') as s:
+        assert s is None
@@ -0,0 +1,116 @@
+import asyncio
+import wave
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import ai
+from ai_client import AIClient
+from metrics import VAD_CLIPS
+from model_backends import StubBackend
+from src.routers.ai_call import router
+from streaming_transcription import to_wav
+from vad import NoSpeechDetected, speech_regions, trim_pcm, PCM_RATE
+
+np = pytest.importorskip('numpy')
+
+app = FastAPI()
+app.include_router(router)
+rng = np.random.default_rng(7)
+
+def pcm(samples) -> bytes:
+    return (np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes()
+
+def voice(seconds, amplitude=0.3):
+    """Voiced sound: a 150 Hz buzz with harmonics, swelling at a syllable rate of 4 Hz."""
+    t = np.arange(int(seconds * PCM_RATE)) / PCM_RATE
+    buzz = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 6))
+    return amplitude * buzz / 2.3 * (0.6 + 0.4 * np.abs(np.sin(2 * np.pi * 4 * t)))
+
+def room(seconds, dbfs=-60):
+    return rng.normal(0, 10 ** (dbfs / 20), int(seconds * PCM_RATE))
+
+@pytest.fixture
+def stub(monkeypatch):
+    backend = StubBackend(latency_ms=0, audio_ms=0, jitter_ms=0)
+    monkeypatch.setattr(ai, 'model', backend)
+    monkeypatch.setattr(ai, 'client', AIClient(backend))
+    monkeypatch.setattr(ai, 'schedule_delete', backend.delete_file)
+    return backend
+
+@pytest.mark.parametrize('audio', [
+    np.zeros(3 * PCM_RATE),
+    room(3.0),
+    room(3.0, dbfs=-30),  # loud hiss: energy, but no voicing
+    np.concatenate([room(1.0), room(0.04, dbfs=-6), room(2.0)]),  # a tap on the microphone
+], ids=['digital silence', 'quiet room', 'hiss', 'tap'])
+def test_clips_without_speech_are_rejected(audio):
+    with pytest.raises(NoSpeechDetected):
+        trim_pcm(pcm(audio), 'test')
+
+def test_speech_is_kept_and_long_pauses_are_shortened():
+    audio = np.concatenate([room(1.0), voice(1.5) + room(1.5), room(3.0), voice(1.0) + room(1.0), room(1.0)])
+    regions = speech_regions(pcm(audio))
+    assert len(regions) == 2
+    assert abs(regions[0][0] / PCM_RATE - 0.8) < 0.05 and abs(regions[0][1] / PCM_RATE - 2.7) < 0.05
+
+    trimmed = trim_pcm(pcm(audio), 'test')
+    # 2.5 s of speech, 0.2 s of hangover either side of each region, and one 0.3 s gap
+    assert abs(len(trimmed) / 2 / PCM_RATE - (2.5 + 4 * 0.2 + 0.3)) < 0.05
+
+    whole = pcm(voice(2.0) + room(2.0))
+    assert trim_pcm(whole, 'test') == whole
+
+def test_silent_recordings_never_reach_the_model(stub, tmp_path, monkeypatch):
+    silent, spoken = tmp_path / 'tap.wav', tmp_path / 'answer.wav'
+    silent.write_bytes(to_wav(pcm(room(4.0))))
+    spoken.write_bytes(to_wav(pcm(np.concatenate([room(2.0), voice(2.0) + room(2.0), room(2.0)]))))
+    before = VAD_CLIPS.get('voice_to_text', 'no_speech')
+
+    with pytest.raises(NoSpeechDetected):
+        ai.voice_to_text(str(silent), 'Hindi')
+    with open(silent, 'rb') as f:
+        response = TestClient(app).post('/api/ai-call/voice-answer', files={'audio': ('tap.wav', f, 'audio/wav')},
+                                        data={'phone': '9999999999', 'language': 'Hindi', 'question_key': 'skill'})
+    assert response.status_code == 422
+    assert stub.stats['upload_file'] == stub.stats['generate_content'] == 0
+    assert VAD_CLIPS.get('voice_to_text', 'no_speech') == before + 2
+
+    uploaded = []
+    def upload_file(path, display_name=None):
+        with wave.open(path) as w:
+            uploaded.append(w.getnframes() / PCM_RATE)
+        return StubBackend.upload_file(stub, path, display_name)
+    monkeypatch.setattr(stub, 'upload_file', upload_file, raising=False)
+    assert ai.voice_to_text(str(spoken), 'Hindi')
+    assert stub.stats['generate_content'] == 1
+    assert uploaded[0] < 2.5  # the 2 s spoken, not the whole 6 s recording
+
+def test_voice_answers_are_transcribed_off_the_event_loop(stub, tmp_path, monkeypatch):
+    def voice_to_text(path, language):
+        try:
+            asyncio.get_running_loop()
+            return 'event loop'
+        except RuntimeError:
+            return 'worker thread'
+    monkeypatch.setattr(ai, 'voice_to_text', voice_to_text)
+    response = TestClient(app).post('/api/ai-call/voice-answer', files={'audio': ('a.wav', to_wav(pcm(voice(1.0))))},
+                                    data={'phone': '9999999999', 'language': 'Hindi', 'question_key': 'skill'})
+    assert response.json()['transcript'] == 'worker thread'
+
+def test_vad_runs_before_normalisation(stub, tmp_path, monkeypatch):
+    # Peak-normalised, this hiss would be loud enough to count as speech
+    hiss = tmp_path / 'hiss.wav'
+    hiss.write_bytes(to_wav(pcm(room(3.0, dbfs=-55))))
+    with pytest.raises(NoSpeechDetected):
+        ai.voice_to_text(str(hiss), 'Hindi')
+
+    peaks = []
+    def upload_file(path, display_name=None):
+        with wave.open(path) as w:
+            peaks.append(np.abs(np.frombuffer(w.readframes(w.getnframes()), dtype='<i2')).max() / 32767)
+        return StubBackend.upload_file(stub, path, display_name)
+    monkeypatch.setattr(stub, 'upload_file', upload_file, raising=False)
+    spoken = tmp_path / 'quiet.wav'
+    spoken.write_bytes(to_wav(pcm(np.concatenate([room(1.0), voice(2.0, amplitude=0.05), room(1.0)]))))
+    assert ai.voice_to_text(str(spoken), 'Hindi')
+    assert abs(peaks[0] - 0.95) < 0.01
@@ -0,0 +1,53 @@
+import pytest
+import ai
+import file_reaper
+from ai_client import AIClient
+from model_backends import StubBackend
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    backend = StubBackend(latency_ms=0, jitter_ms=0)
+    monkeypatch.setattr(ai, 'model', backend)
+    monkeypatch.setattr(ai, 'client', AIClient(backend))
+    monkeypatch.setattr(file_reaper, 'SCRATCH_DIR', str(tmp_path / 'scratch'))
+
+    monkeypatch.setattr(ai, 'schedule_delete', backend.delete_file)
+    audio = tmp_path / 'bio.wav'
+    audio.write_bytes(b'RIFF' + bytes(64000))
+    return backend, str(audio)
+
+
+def test_fused_mode_makes_one_model_call(stub):
+    backend, audio = stub
+    result = ai.voice_to_profile(audio, 'Hindi')
+    assert backend.stats['generate_content'] == 1
+    assert backend.list_files() == []
+    profile = result['profile']
+    assert profile['skill_type'].lower() in result['transcript']
+    assert set(profile) == {'skill_type', 'experience_years', 'work_areas', 'specializations', 'daily_rate', 'bio_english'}
+
+    # Same answer as the two-step path, for one call instead of two
+    transcript = ai.voice_to_text(audio, 'Hindi')
+    assert transcript == result['transcript']
+    assert ai.extract_profile(transcript, 'Hindi') == profile
+    assert backend.stats['generate_content'] == 3
+
+
+def test_invalid_reply_falls_back_to_two_calls_on_the_same_upload(stub, monkeypatch):
+    backend, audio = stub
+    answer = backend._answer
+    monkeypatch.setattr(backend, '_answer', lambda prompt, images, files:
+                        '{"transcript": "I lay tiles", "profile": {"experience_years": "many"}}'
+                        if '"profile"' in prompt else answer(prompt, images, files))
+    result = ai.voice_to_profile(audio, 'Tamil')
+    assert 'rupees' in result['transcript'] and result['profile']['daily_rate']
+    assert backend.stats['generate_content'] == 3
+    assert backend.stats['upload_file'] == 1
+
+
+def test_two_step_mode(stub, monkeypatch):
+    backend, audio = stub
+    monkeypatch.setattr(ai, 'VOICE_PROFILE_MODE', 'two_step')
+    assert ai.voice_to_profile(audio, 'Hindi')['profile']['skill_type'] != 'Other'
+    assert backend.stats['generate_content'] == 2
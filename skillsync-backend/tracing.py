@@ -0,0 +1,389 @@
+"""
+Lightweight request tracing.
+
+With tracing on, every HTTP request becomes a trace. The root span is the
+handler ("POST /api/workers/{worker_id}/voice-bio"). Child spans cover each
+SQL statement and the stages of the AI pipelines in ai.py (audio
+preprocessing, Gemini upload, waiting for the uploaded file to become
+ACTIVE, generation, file cleanup) as well as calculate_trust_score. Finished
+traces are written in OTLP/JSON, one ExportTraceServiceRequest per line, either
+to a local file or POSTed to an OTLP/HTTP endpoint. Export happens on a
+background thread, off the request path.
+
+Settings (environment or .env):
+  TRACE_EXPORT=file|otlp    enable tracing (off by default)
+  TRACE_FILE=traces.jsonl   output for TRACE_EXPORT=file
+  TRACE_OTLP_ENDPOINT       default http://localhost:4318/v1/traces
+  TRACE_SAMPLE_RATE=1.0     fraction of requests traced
+
+An incoming W3C traceparent header is honoured, so a client-side trace can
+be continued.
+
+Run from the skillsync-backend directory:
+    python tracing.py collector --port 4318 --out traces.jsonl   # OTLP stand-in
+    python tracing.py summary traces.jsonl                        # per-stage p50/p95/p99
+"""
+import argparse
+import json
+import math
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+TRACE_EXPORT = os.getenv('TRACE_EXPORT', '').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+SERVICE_NAME = 'skillsync-backend'
+MAX_STATEMENT_CHARS = 500
+
+_current_span = ContextVar('current_span', default=None)
+
+
+class Trace:
+    def __init__(self, trace_id: str = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+
+
+class Span:
+    __slots__ = ('name', 'trace', 'span_id', 'parent_id', 'kind', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name: str, trace: Trace, parent_id: str = None, kind: int = 1, attributes: dict = None):
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind  # OTLP SpanKind: 1 internal, 2 server, 3 client
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.time_ns()
+            self.trace.spans.append(self)
+
+    def to_otlp(self) -> dict:
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1},
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        return data
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span of the current one; does nothing outside a traced request."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace, parent.span_id, attributes=attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def traced(name: str = None):
+    """Decorator form of span(), named after the function by default."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ── SQL ──────────────────────────────────────────────────────────────────────
+
+_hooks_installed = False
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span('db.query', parent.trace, parent.span_id, kind=3, attributes={
+        'db.system': conn.dialect.name,
+        'db.statement': ' '.join(statement.split())[:MAX_STATEMENT_CHARS],
+    })
+    if executemany:
+        child.set('db.executemany', True)
+    conn.info.setdefault('trace_spans', []).append(child)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        spans.pop().finish()
+
+def _handle_error(exception_context):
+    spans = exception_context.connection.info.get('trace_spans') if exception_context.connection else None
+    if spans:
+        failed = spans.pop()
+        failed.error = str(exception_context.original_exception)[:MAX_STATEMENT_CHARS]
+        failed.finish()
+
+def install_sql_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _hooks_installed = True
+
+
+# ── Export ───────────────────────────────────────────────────────────────────
+
+def otlp_document(spans: list) -> dict:
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'skillsync.tracing'}, 'spans': [s.to_otlp() for s in spans]}],
+    }]}
+
+
+class FileExporter:
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+
+    def export(self, document: dict):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(document) + '\n')
+
+
+class OTLPExporter:
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, timeout: float = 5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, document: dict):
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(document).encode(),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+
+class BackgroundExporter:
+    """Hands finished traces to the real exporter on a daemon thread."""
+
+    def __init__(self, exporter, max_queue: int = 10_000):
+        self.exporter = exporter
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def submit(self, trace: Trace):
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5):
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        while True:
+            trace = self.queue.get()
+            try:
+                self.exporter.export(otlp_document(trace.spans))
+            except Exception as e:
+                print(f'[WARNING] Trace export failed: {e}')
+            finally:
+                self.queue.task_done()
+
+
+def make_exporter(kind: str = TRACE_EXPORT):
+    if kind == 'file':
+        return BackgroundExporter(FileExporter())
+    if kind == 'otlp':
+        return BackgroundExporter(OTLPExporter())
+    raise ValueError(f'Unknown TRACE_EXPORT {kind!r}, expected file or otlp')
+
+
+# ── Middleware ───────────────────────────────────────────────────────────────
+
+def _parse_traceparent(headers: list):
+    for key, value in headers:
+        if key == b'traceparent':
+            parts = value.decode('latin-1').split('-')
+            if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                return parts[1], parts[2]
+    return None, None
+
+
+class TracingMiddleware:
+    """Plain ASGI middleware opening the root span of each sampled request."""
+
+    def __init__(self, app, exporter=None, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.app = app
+        self.exporter = exporter or make_exporter()
+        self.sample_rate = sample_rate
+        install_sql_hooks()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or random.random() >= self.sample_rate:
+            return await self.app(scope, receive, send)
+
+        trace_id, parent_id = _parse_traceparent(scope.get('headers', []))
+        root = Span(f"{scope['method']} {scope['path']}", Trace(trace_id), parent_id, kind=2, attributes={
+            'http.method': scope['method'],
+            'http.target': scope['path'],
+        })
+        token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                root.set('http.status_code', message['status'])
+                if message['status'] >= 500:
+                    root.error = f"HTTP {message['status']}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            _current_span.reset(token)
+            route = getattr(scope.get('route'), 'path', None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+                root.set('http.route', route)
+            root.finish()
+            self.exporter.submit(root.trace)
+
+
+# ── Collector stand-in and summary ───────────────────────────────────────────
+
+def run_collector(port: int, out: str):
+    """Accept OTLP/HTTP JSON on /v1/traces and append each request to a file."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                document = json.loads(body)
+            except ValueError:
+                self.send_error(400, 'expected OTLP JSON')
+                return
+            with lock, open(out, 'a') as f:
+                f.write(json.dumps(document) + '\n')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, *args):
+            pass
+
+    print(f'[OK] OTLP collector stand-in on http://localhost:{port}/v1/traces -> {out}')
+    ThreadingHTTPServer(('', port), Handler).serve_forever()
+
+
+def _percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(1, math.ceil(p / 100 * len(sorted_values))) - 1]
+
+
+def summarize(path: str) -> dict:
+    """{span name: {count, p50_ms, p95_ms, p99_ms, max_ms, total_ms}} over every trace in the file."""
+    durations = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get('resourceSpans', []):
+                for scope in resource.get('scopeSpans', []):
+                    for s in scope.get('spans', []):
+                        ms = (int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])) / 1e6
+                        durations[s['name']].append(ms)
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            'count': len(values),
+            'p50_ms': round(_percentile(values, 50), 2),
+            'p95_ms': round(_percentile(values, 95), 2),
+            'p99_ms': round(_percentile(values, 99), 2),
+            'max_ms': round(values[-1], 2),
+            'total_ms': round(sum(values), 2),
+        }
+    return dict(sorted(summary.items(), key=lambda item: -item[1]['p99_ms']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SkillSync trace tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    collector = commands.add_parser('collector', help='run a local OTLP/HTTP JSON collector stand-in')
+    collector.add_argument('--port', type=int, default=4318)
+    collector.add_argument('--out', default='traces.jsonl')
+    summary = commands.add_parser('summary', help='per-span latency percentiles from a trace file')
+    summary.add_argument('path', nargs='?', default=TRACE_FILE)
+    args = parser.parse_args()
+
+    if args.command == 'collector':
+        run_collector(args.port, args.out)
+    else:
+        print(f"{'span':<50}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for name, row in summarize(args.path).items():
+            print(f"{name:<50}{row['count']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                  f"{row['p99_ms']:>10}{row['max_ms']:>10}")
@@ -1,41 +1,29 @@
+from sqlalchemy import func, case, bindparam
 from sqlalchemy.orm import Session
 from models import Worker, WorkLedger, Call, EmergencyIncident
+from metrics import TRUST_RECOMPUTES
+from tracing import traced
 
-def calculate_trust_score(worker_id: str, db: Session) -> dict:
-    worker = db.query(Worker).filter(Worker.id == worker_id).first()
-    if not worker:
-        return {
-            'total_score': 0,
-            'badge': 'Red',
-            'breakdown': {
-                'aadhaar': 0,
-                'reviews': 0,
-                'signoffs': 0,
-                'response_rate': 0,
-                'completeness': 0,
-                'emergency_deduction': 0
-            }
-        }
+def trust_badge(total: int) -> str:
+    return 'Green' if total >= 80 else 'Yellow' if total >= 50 else 'Red'
 
+def _score(worker, ledger_count: int, avg_rating, calls_total: int,
+           calls_responded: int, open_emergencies: int) -> dict:
     # Aadhaar score — max 20
     aadhaar_score = 20 if worker.aadhaar_verified else 0
 
     # Review score — max 25
-    ledger_entries = db.query(WorkLedger).filter(WorkLedger.worker_id == worker_id).all()
-    if ledger_entries:
-        avg_rating = sum(e.rating for e in ledger_entries) / len(ledger_entries)
+    if ledger_count:
         review_score = round(avg_rating / 5 * 25)
     else:
         review_score = 0
 
     # Signoff score — max 25
-    signoff_score = min(len(ledger_entries), 25)
+    signoff_score = min(ledger_count, 25)
 
     # Response rate score — max 15
-    calls = db.query(Call).filter(Call.worker_id == worker_id).all()
-    if calls:
-        responded = sum(1 for c in calls if c.worker_responded is True)
-        response_score = round((responded / len(calls)) * 15)
+    if calls_total:
+        response_score = round((calls_responded / calls_total) * 15)
     else:
         response_score = 15  # give benefit of doubt if no calls yet
 
@@ -51,23 +39,14 @@ def calculate_trust_score(worker_id: str, db: Session) -> dict:
     completeness_score = min(sum(2 for f in fields if f is not None), 10)
 
     # Emergency deduction
-    emergencies = db.query(EmergencyIncident).filter(
-        EmergencyIncident.worker_id == worker_id,
-        EmergencyIncident.status == 'open'
-    ).count()
-    emergency_deduction = emergencies * 5
+    emergency_deduction = open_emergencies * 5
 
     # Total
     total = (aadhaar_score + review_score + signoff_score +
              response_score + completeness_score - emergency_deduction)
     total = max(0, min(100, total))
 
-    badge = 'Green' if total >= 80 else 'Yellow' if total >= 50 else 'Red'
-
-    # Persist to DB
-    worker.trust_score = total
-    worker.trust_badge = badge
-    db.commit()
+    badge = trust_badge(total)
 
     return {
         'total_score': total,
@@ -80,4 +59,94 @@ def calculate_trust_score(worker_id: str, db: Session) -> dict:
             'completeness': completeness_score,
             'emergency_deduction': emergency_deduction
         }
-    }
\ No newline at end of file
+    }
+
+@traced()
+def calculate_trust_score(worker_id: str, db: Session) -> dict:
+    worker = db.query(Worker).filter(Worker.id == worker_id).first()
+    if not worker:
+        return {
+            'total_score': 0,
+            'badge': 'Red',
+            'breakdown': {
+                'aadhaar': 0,
+                'reviews': 0,
+                'signoffs': 0,
+                'response_rate': 0,
+                'completeness': 0,
+                'emergency_deduction': 0
+            }
+        }
+
+    ledger_entries = db.query(WorkLedger).filter(WorkLedger.worker_id == worker_id).all()
+    avg_rating = sum(e.rating for e in ledger_entries) / len(ledger_entries) if ledger_entries else None
+
+    calls = db.query(Call).filter(Call.worker_id == worker_id).all()
+    responded = sum(1 for c in calls if c.worker_responded is True)
+
+    emergencies = db.query(EmergencyIncident).filter(
+        EmergencyIncident.worker_id == worker_id,
+        EmergencyIncident.status == 'open'
+    ).count()
+
+    result = _score(worker, len(ledger_entries), avg_rating, len(calls), responded, emergencies)
+    TRUST_RECOMPUTES.inc('single')
+
+    # Persist to DB
+    worker.trust_score = result['total_score']
+    worker.trust_badge = result['badge']
+    db.commit()
+
+    return result
+
+@traced()
+def calculate_trust_scores(worker_ids: list, db: Session, persist: bool = True) -> dict:
+    """
+    Batch version of calculate_trust_score: one grouped query per table for
+    the whole id list instead of four queries per worker. Returns
+    {worker_id: result}. With persist=True scores are written back with a
+    single executemany UPDATE; the caller commits.
+    """
+    if not worker_ids:
+        return {}
+    workers = db.query(
+        Worker.id, Worker.aadhaar_verified, Worker.name, Worker.skill_type, Worker.bio_text,
+        Worker.experience_years, Worker.location_lat, Worker.daily_rate
+    ).filter(Worker.id.in_(worker_ids)).all()
+
+    ledger = {
+        wid: (n, avg) for wid, n, avg in db.query(
+            WorkLedger.worker_id, func.count(WorkLedger.id), func.avg(WorkLedger.rating)
+        ).filter(WorkLedger.worker_id.in_(worker_ids)).group_by(WorkLedger.worker_id)
+    }
+    calls = {
+        wid: (n, responded or 0) for wid, n, responded in db.query(
+            Call.worker_id, func.count(Call.id),
+            func.sum(case((Call.worker_responded.is_(True), 1), else_=0))
+        ).filter(Call.worker_id.in_(worker_ids)).group_by(Call.worker_id)
+    }
+    emergencies = dict(db.query(
+        EmergencyIncident.worker_id, func.count(EmergencyIncident.id)
+    ).filter(
+        EmergencyIncident.worker_id.in_(worker_ids),
+        EmergencyIncident.status == 'open'
+    ).group_by(EmergencyIncident.worker_id).all())
+
+    results = {}
+    for w in workers:
+        ledger_count, avg_rating = ledger.get(w.id, (0, None))
+        calls_total, calls_responded = calls.get(w.id, (0, 0))
+        results[w.id] = _score(w, ledger_count, avg_rating, calls_total,
+                               calls_responded, emergencies.get(w.id, 0))
+
+    TRUST_RECOMPUTES.inc('batch', amount=len(results))
+    if persist and results:
+        table = Worker.__table__
+        stmt = table.update().where(table.c.id == bindparam('b_id')).values(
+            trust_score=bindparam('b_score'), trust_badge=bindparam('b_badge')
+        )
+        db.execute(stmt, [
+            {'b_id': wid, 'b_score': r['total_score'], 'b_badge': r['badge']}
+            for wid, r in results.items()
+        ])
+    return results
@@ -0,0 +1,185 @@
+"""
+Local voice activity detection, run before any audio reaches the model.
+
+Many AI-call answers are accidental taps or a few seconds of room noise.
+Each of them still paid for preprocessing, a Gemini upload and a
+generate call, and came back as an empty or invented transcript. This
+stage looks at the decoded mono PCM first, before ai._preprocess_audio
+resamples and peak-normalises it (normalising would lift room noise over
+the absolute floor below):
+
+- The audio is split into FRAME_MS frames. For each frame it computes
+  RMS energy (dBFS) and the zero-crossing rate, in NumPy with no Python
+  loop over samples.
+- A frame counts as speech when its energy is both above an absolute
+  floor (MIN_SPEECH_DBFS) and NOISE_MARGIN_DB above the clip's own
+  noise floor (its 10th-percentile frame energy). Its zero-crossing rate
+  must also be below MAX_SPEECH_ZCR, which rejects hiss and clicks
+  unless they are loud.
+- The speech mask is widened by HANGOVER_MS on each side, so word edges
+  and short stops survive. Runs shorter than MIN_RUN_MS are dropped.
+
+A clip with less than MIN_SPEECH_SECONDS of speech raises
+NoSpeechDetected, so no model call is made. Otherwise the clip is cut
+down to its speech regions, with silences between them capped at
+MAX_GAP_MS, so less audio is uploaded and billed.
+
+skillsync_vad_clips_total{source,result} counts clips by outcome. Its
+result="no_speech" series is the number of model calls avoided.
+skillsync_vad_audio_seconds_total{kind} adds up the seconds received
+and the seconds sent on.
+
+Without NumPy the stage is skipped and every clip goes to the model as
+before.
+
+Run from the skillsync-backend directory:
+    python vad.py check answer1.wav answer2.wav ...     # speech seconds per clip, and which would be rejected
+"""
+import argparse
+import os
+import wave
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from metrics import VAD_CLIPS, VAD_SECONDS
+
+PCM_RATE = 16000
+FRAME_MS = 20
+MIN_SPEECH_DBFS = -45.0
+NOISE_MARGIN_DB = 10.0
+MAX_SPEECH_ZCR = 0.25      # crossings per sample; voiced speech sits well below this
+LOUD_DBFS = -20.0          # frames this loud count as speech whatever their zero-crossing rate
+HANGOVER_MS = 200
+MIN_RUN_MS = 100
+MIN_SPEECH_SECONDS = float(os.getenv('VAD_MIN_SPEECH_SECONDS', '0.3'))
+MAX_GAP_MS = 300
+
+
+class NoSpeechDetected(Exception):
+    """The clip has no speech in it; nothing was sent to the model."""
+
+
+def _as_samples(pcm) -> 'np.ndarray':
+    if isinstance(pcm, (bytes, bytearray, memoryview)):
+        return np.frombuffer(pcm, dtype='<i2', count=len(pcm) // 2).astype(np.float32) / 32768.0
+    return np.asarray(pcm, dtype=np.float32)
+
+
+def speech_regions(pcm, rate: int = PCM_RATE) -> list:
+    """[(start, end)] sample ranges that contain speech, for 16-bit PCM bytes or float samples."""
+    samples = _as_samples(pcm)
+    frame = rate * FRAME_MS // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+    floor = np.percentile(energy_db, 10)
+    speech = ((energy_db > MIN_SPEECH_DBFS) & (energy_db > floor + NOISE_MARGIN_DB)
+              & ((zcr < MAX_SPEECH_ZCR) | (energy_db > LOUD_DBFS)))
+    # A clip that is speech from end to end has no quiet frames to take a floor from
+    if floor > MIN_SPEECH_DBFS + NOISE_MARGIN_DB:
+        speech = (energy_db > MIN_SPEECH_DBFS) & ((zcr < MAX_SPEECH_ZCR) | (energy_db > LOUD_DBFS))
+
+    # Drop short blips, then widen what is left by the hangover
+    runs = _runs(speech)
+    keep = np.zeros(n_frames, dtype=bool)
+    min_run = MIN_RUN_MS // FRAME_MS
+    hangover = HANGOVER_MS // FRAME_MS
+    for start, end in runs:
+        if end - start >= min_run:
+            keep[max(0, start - hangover):min(n_frames, end + hangover)] = True
+    return [(start * frame, min(len(samples), end * frame)) for start, end in _runs(keep)]
+
+
+def _runs(mask) -> list:
+    """[(start, end)] of the True runs in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def _speech_pieces(total: int, regions: list, source: str, rate: int) -> list:
+    """
+    [(start, end)] sample ranges to keep, in order, where (None, n) stands
+    for n samples of silence. Raises NoSpeechDetected when there is too
+    little speech to transcribe.
+    """
+    speech = sum(end - start for start, end in regions)
+    VAD_SECONDS.inc('received', amount=total / rate)
+    if speech < MIN_SPEECH_SECONDS * rate:
+        VAD_CLIPS.inc(source, 'no_speech')
+        raise NoSpeechDetected(f'{speech / rate:.2f}s of speech in {total / rate:.1f}s of audio')
+
+    max_gap = rate * MAX_GAP_MS // 1000
+    pieces = []
+    last_end = None
+    for start, end in regions:
+        if last_end is not None:
+            gap = start - last_end
+            pieces.append((None, max_gap) if gap > max_gap else (last_end, start))
+        pieces.append((start, end))
+        last_end = end
+    return pieces
+
+
+def _count_sent(source: str, sent: int, total: int, rate: int):
+    VAD_CLIPS.inc(source, 'trimmed' if sent < total else 'kept')
+    VAD_SECONDS.inc('sent', amount=sent / rate)
+
+
+def trim_pcm(pcm: bytes, source: str, rate: int = PCM_RATE) -> bytes:
+    """
+    pcm cut down to its speech regions, with the silences between them
+    capped at MAX_GAP_MS. Raises NoSpeechDetected when there is too little
+    speech to transcribe. Without NumPy, pcm is returned unchanged.
+    """
+    if np is None:
+        return pcm
+    total = len(pcm) // 2
+    pieces = _speech_pieces(total, speech_regions(pcm, rate), source, rate)
+    trimmed = b''.join(bytes(end * 2) if start is None else pcm[start * 2:end * 2] for start, end in pieces)
+    _count_sent(source, len(trimmed) // 2, total, rate)
+    return trimmed
+
+
+def trim_samples(samples, source: str, rate: int):
+    """
+    trim_pcm for float samples at any rate, as decoded from a recording
+    before it is resampled or normalised. Level thresholds only mean
+    something on the audio as it was recorded.
+    """
+    if np is None:
+        return samples
+    samples = np.asarray(samples, dtype=np.float32)
+    pieces = _speech_pieces(len(samples), speech_regions(samples, rate), source, rate)
+    trimmed = np.concatenate([np.zeros(end, dtype=np.float32) if start is None else samples[start:end]
+                              for start, end in pieces])
+    _count_sent(source, len(trimmed), len(samples), rate)
+    return trimmed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local voice activity detection')
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help='speech seconds per clip, and which would be rejected')
+    check.add_argument('paths', nargs='+', help='16-bit mono WAV files')
+    args = parser.parse_args()
+
+    if np is None:
+        raise SystemExit('[ERROR] NumPy is required: pip install numpy')
+    rejected = 0
+    for path in args.paths:
+        with wave.open(path, 'rb') as w:
+            rate = w.getframerate()
+            pcm = w.readframes(w.getnframes())
+        speech = sum(end - start for start, end in speech_regions(pcm, rate)) / rate
+        keep = speech >= MIN_SPEECH_SECONDS
+        rejected += not keep
+        print(f'{os.path.basename(path):30} {len(pcm) / 2 / rate:6.1f}s audio {speech:6.1f}s speech  '
+              f'{"send" if keep else "reject"}')
+    print(f'Done. clips: {len(args.paths)}, model calls avoided: {rejected}')
@@ -1,6 +1,7 @@
 import React from 'react'
 import { useNavigate } from 'react-router-dom'
 import TrustBadge from './TrustBadge'
+import { mediaURL } from '../services/api'
 
 export default function WorkerCard({ worker, onHire }) {
   const navigate = useNavigate()
@@ -8,9 +9,20 @@ export default function WorkerCard({ worker, onHire }) {
     <div className="card hover:shadow-md transition-shadow cursor-pointer" onClick={() => navigate(`/worker/${worker.id}`)}>
       <div className="flex items-start justify-between">
         <div className="flex items-center gap-3">
-          <div className="w-12 h-12 rounded-full bg-orange-100 flex items-center justify-center text-xl font-bold text-orange-600">
-            {(worker.name || '?')[0].toUpperCase()}
-          </div>
+          {worker.photo_url ? (
+            <img
+              src={mediaURL(worker.photo_url)}
+              alt={worker.name || 'Worker'}
+              loading="lazy"
+              width={48}
+              height={48}
+              className="w-12 h-12 rounded-full object-cover bg-orange-100"
+            />
+          ) : (
+            <div className="w-12 h-12 rounded-full bg-orange-100 flex items-center justify-center text-xl font-bold text-orange-600">
+              {(worker.name || '?')[0].toUpperCase()}
+            </div>
+          )}
           <div>
             <h3 className="font-semibold text-gray-900">{worker.name || 'Unnamed Worker'}</h3>
             <p className="text-sm text-gray-500">{worker.skill_type} · {worker.experience_years || 0} yrs exp</p>
@@ -1,6 +1,6 @@
 ﻿import React, { useState, useRef, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom'
-import { getQuestions, extractProfile, saveProfile } from '../services/api'
+import { getQuestions, extractProfile, saveProfile, streamVoiceAnswer } from '../services/api'
 import toast from 'react-hot-toast'
 
 const LANGUAGES = [
@@ -304,7 +304,13 @@ export default function AICallPage() {
 
   // ── SpeechRecognition: capture worker's voice ───────────────────────────────
   function startListening(lang) {
+    setSpokenText('')
     const SR = window.SpeechRecognition || window.webkitSpeechRecognition
+    if (!SR && window.MediaRecorder && navigator.mediaDevices?.getUserMedia) {
+      // No speech recognition in this browser — transcribe on the server while the worker speaks
+      startStreaming(lang)
+      return
+    }
     if (!SR) {
       // Browser doesn't support it — fall through to typing
       setVoiceStage('typing')
@@ -361,6 +367,42 @@ export default function AICallPage() {
     try { rec.start() } catch { setVoiceStage('typing') }
   }
 
+  // ── Server-side streaming transcription (browsers without SpeechRecognition) ─
+  async function startStreaming(lang) {
+    recognitionRef.current?.abort()
+    let cancelled = false
+    const pending = { abort: () => { cancelled = true }, stop: () => {} }
+    recognitionRef.current = pending
+    let mic
+    try {
+      mic = await navigator.mediaDevices.getUserMedia({ audio: true })
+    } catch {
+      setVoiceStage('typing')
+      setTimeout(() => answerRef.current?.focus(), 100)
+      return
+    }
+    if (cancelled || recognitionRef.current !== pending) { mic.getTracks().forEach(t => t.stop()); return }
+    const release = () => mic.getTracks().forEach(t => t.stop())
+    const stream = streamVoiceAnswer(mic, lang, questions[current]?.key || '', (text) => setSpokenText(text))
+    // Same interface as a SpeechRecognition, so the existing abort() calls and the Done button work for both
+    recognitionRef.current = {
+      abort: () => { stream.abort(); release() },
+      stop: () => { stream.stop().catch(() => {}).finally(release) },
+    }
+    try {
+      const text = await stream.done
+      setSpokenText(text)
+      setEditText(text)
+      setVoiceStage('confirming')
+    } catch (err) {
+      release()
+      if (err.name === 'AbortError') return
+      setVoiceStage('typing')
+      toast.error('Could not transcribe your answer — please type it in English')
+      setTimeout(() => answerRef.current?.focus(), 100)
+    }
+  }
+
   // ── Submit an answer and advance ────────────────────────────────────────────
   async function submitAnswer(text) {
     if (!text.trim()) { toast.error('Answer cannot be empty'); return }
@@ -690,7 +732,13 @@ export default function AICallPage() {
                   <div className="flex flex-col items-center gap-3 py-3">
                     <MicPulse />
                     <p className="text-red-300 text-xs font-semibold animate-pulse">Listening — speak in {language}…</p>
+                    {spokenText && <p className="text-gray-300 text-xs text-center px-2">{spokenText}</p>}
                     <div className="flex gap-2 mt-1">
+                      <button
+                        onClick={() => recognitionRef.current?.stop()}
+                        className="text-xs bg-gray-700 border border-gray-600 text-gray-300 px-3 py-1.5 rounded-lg hover:bg-gray-600 transition-colors">
+                        ✓ Done
+                      </button>
                       <button
                         onClick={() => { recognitionRef.current?.abort(); setVoiceStage('typing'); setTimeout(() => answerRef.current?.focus(), 100) }}
                         className="text-xs bg-gray-700 border border-gray-600 text-gray-300 px-3 py-1.5 rounded-lg hover:bg-gray-600 transition-colors">
@@ -99,7 +99,6 @@ export default function WorkerSearch() {
   const filtered = useMemo(() => {
     let list = [...workers]
     if (skill)       list = list.filter(w => !skill || w.skill_type === skill)
-    if (location)    list = list.filter(w => !location || (w.location_area && w.location_area.toLowerCase().includes(location.toLowerCase())))
     if (minPrice)    list = list.filter(w => (w.daily_rate || 0) >= Number(minPrice))
     if (maxPrice)    list = list.filter(w => (w.daily_rate || 999999) <= Number(maxPrice))
     if (maxDist)     list = list.filter(w => w.distance_km == null || w.distance_km <= Number(maxDist))
@@ -29,6 +29,8 @@ export const getWorker      = (id)          => api.get(`/workers/${id}`)
 export const updateWorker   = (id, data)    => api.put(`/workers/${id}`, data)
 export const getTrustScore  = (id)          => api.get(`/workers/${id}/trust-score`)
 export const getWorkerLedger= (id)          => api.get(`/workers/${id}/ledger`)
+// Photo URLs from the API (e.g. worker.photo_url) are paths on the backend
+export const mediaURL       = (path)        => (import.meta.env.VITE_API_URL || '') + path
 export const uploadPhotos   = (id, form)    => api.post(`/workers/${id}/photos`, form, {
   headers: { 'Content-Type': 'multipart/form-data' }
 })
@@ -76,4 +78,38 @@ export const transcribeVoice= (phone, language, questionKey, audioBlob) => {
   })
 }
 
+// Streams MediaRecorder chunks while the worker is speaking. onPartial(text) gets the
+// transcript so far; stop() ends the recording and resolves with the final transcript,
+// abort() drops it (done rejects with an AbortError).
+export const streamVoiceAnswer = (mediaStream, language, questionKey, onPartial) => {
+  const origin = import.meta.env.VITE_API_URL || window.location.origin
+  const params = new URLSearchParams({ language, question_key: questionKey, format: 'webm' })
+  const ws = new WebSocket(`${origin.replace(/^http/, 'ws')}/api/ai-call/voice-answer/stream?${params}`)
+  const recorder = new MediaRecorder(mediaStream, { mimeType: 'audio/webm' })
+  let resolveFinal, rejectFinal
+  const done = new Promise((resolve, reject) => { resolveFinal = resolve; rejectFinal = reject })
+  ws.onmessage = (event) => {
+    const msg = JSON.parse(event.data)
+    if (msg.type === 'partial') onPartial?.(msg.transcript)
+    else if (msg.type === 'final') resolveFinal(msg.transcript)
+    else if (msg.type === 'error') rejectFinal(new Error(msg.detail))
+  }
+  ws.onclose = () => rejectFinal(new Error('Transcription connection closed'))
+  ws.onopen = () => recorder.start(250)
+  recorder.ondataavailable = (e) => {
+    if (e.data.size && ws.readyState === WebSocket.OPEN) ws.send(e.data)
+  }
+  const stop = () => {
+    recorder.onstop = () => ws.send(JSON.stringify({ type: 'stop' }))
+    recorder.stop()
+    return done
+  }
+  const abort = () => {
+    rejectFinal(new DOMException('Recording aborted', 'AbortError'))
+    if (recorder.state !== 'inactive') recorder.stop()
+    ws.close()
+  }
+  return { stop, abort, done }
+}
+
 export default api
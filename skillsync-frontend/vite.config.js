@@ -9,6 +9,7 @@ export default defineConfig(({ command }) => ({
       '/api': {
         target: 'http://127.0.0.1:8000',
         changeOrigin: true,
+        ws: true,
       }
     }
   }